@@ -1,23 +1,102 @@
+import asyncio
 import datetime
+import email.utils
 import os
+import threading
 import time
 
+import httpx
 import litellm
 from functools import wraps
 from wandb.sdk.data_types.trace_tree import Trace
-from tenacity import retry, retry_if_exception_type, retry_if_not_exception_type, stop_after_attempt, wait_fixed
+from tenacity import (
+    retry,
+    retry_if_exception_type,
+    retry_if_not_exception_type,
+    stop_after_attempt,
+    wait_exponential_jitter,
+)
+
+from cover_agent.Profiler import Profiler
+from cover_agent.RateLimiter import RateLimiter
+from cover_agent.ResponseCache import ResponseCache
+from cover_agent.settings.config_loader import get_settings
+from cover_agent.StreamSink import StreamSink, get_stream_sink
+
 MODEL_RETRIES = 3
 
+# Used to estimate the number of tokens of a prompt for the rate limiter, before the call reports the actual number
+CHARS_PER_TOKEN = 4
+
+
+def retry_after_seconds(exception: BaseException):
+    """
+    Get the delay requested by the `Retry-After` (or `retry-after-ms`) header of the response of a failed call.
+
+    Returns:
+        float: The delay in seconds, or None if the response has no such header.
+    """
+    headers = getattr(exception, "litellm_response_headers", None)
+    if not headers:
+        try:
+            headers = exception.response.headers
+        except Exception:
+            return None
+    if not headers:
+        return None
+    try:
+        if headers.get("retry-after-ms") is not None:
+            return float(headers["retry-after-ms"]) / 1000
+        retry_after = headers.get("retry-after")
+        if retry_after is None:
+            return None
+        try:
+            return max(float(retry_after), 0.0)
+        except ValueError:
+            # An HTTP date
+            return max(email.utils.parsedate_to_datetime(retry_after).timestamp() - time.time(), 0.0)
+    except Exception:
+        return None
+
+
+def wait_before_retry(retry_state) -> float:
+    """
+    Wait as long as the provider asked with `Retry-After`, or back off exponentially with jitter otherwise.
+    """
+    max_wait = get_settings().get("llm.retry_max_wait_seconds", 60)
+    exception = retry_state.outcome.exception() if retry_state.outcome else None
+    retry_after = retry_after_seconds(exception) if exception is not None else None
+    if retry_after is not None:
+        return min(retry_after, max_wait)
+    return wait_exponential_jitter(initial=1, max=max_wait)(retry_state)
+
 
 def conditional_retry(func):
+    if asyncio.iscoroutinefunction(func):
+        @wraps(func)
+        async def async_wrapper(self, *args, **kwargs):
+            if not self.enable_retry:
+                return await func(self, *args, **kwargs)
+
+            @retry(
+                stop=stop_after_attempt(get_settings().get("llm.max_retries", MODEL_RETRIES)),
+                wait=wait_before_retry
+            )
+            async def retry_wrapper():
+                return await func(self, *args, **kwargs)
+
+            return await retry_wrapper()
+
+        return async_wrapper
+
     @wraps(func)
     def wrapper(self, *args, **kwargs):
         if not self.enable_retry:
             return func(self, *args, **kwargs)
 
         @retry(
-            stop=stop_after_attempt(MODEL_RETRIES),
-            wait=wait_fixed(1)
+            stop=stop_after_attempt(get_settings().get("llm.max_retries", MODEL_RETRIES)),
+            wait=wait_before_retry
         )
         def retry_wrapper():
             return func(self, *args, **kwargs)
@@ -26,40 +105,113 @@ def conditional_retry(func):
 
     return wrapper
 
+
+class LLMEventLoop:
+    """
+    A single, long-lived event loop (running in a daemon thread) on which all asynchronous LLM calls are executed.
+
+    Running every asynchronous call on the same loop lets all the AICaller instances share one pooled HTTP session
+    (`litellm.aclient_session`) and one concurrency limit, and keeps connections alive between batches.
+    """
+    _loop = None
+    _thread = None
+    _semaphore = None
+    _lock = threading.Lock()
+
+    @classmethod
+    def get_loop(cls) -> asyncio.AbstractEventLoop:
+        if cls._loop is None:  # Check without acquiring the lock for performance
+            with cls._lock:
+                if cls._loop is None:
+                    loop = asyncio.new_event_loop()
+                    thread = threading.Thread(target=loop.run_forever, name="cover-agent-llm-loop", daemon=True)
+                    thread.start()
+                    asyncio.run_coroutine_threadsafe(cls._init_session(), loop).result()
+                    cls._thread = thread
+                    cls._loop = loop
+        return cls._loop
+
+    @classmethod
+    async def _init_session(cls):
+        cls._semaphore = asyncio.Semaphore(get_settings().get("llm.max_concurrent_requests", 8))
+        if litellm.aclient_session is None:
+            litellm.aclient_session = httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=get_settings().get("llm.max_connections", 20),
+                    max_keepalive_connections=get_settings().get("llm.max_keepalive_connections", 10),
+                )
+            )
+
+    @classmethod
+    def semaphore(cls) -> asyncio.Semaphore:
+        return cls._semaphore
+
+    @classmethod
+    def run(cls, coro):
+        """
+        Run a coroutine on the shared loop from synchronous code, and wait for its result.
+        """
+        return asyncio.run_coroutine_threadsafe(coro, cls.get_loop()).result()
+
+    @classmethod
+    async def run_async(cls, coro):
+        """
+        Await a coroutine on the shared loop from any other (or the same) event loop.
+        """
+        loop = cls.get_loop()
+        if asyncio.get_running_loop() is loop:
+            return await coro
+        return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coro, loop))
+
+
 class AICaller:
-    def __init__(self, model: str, api_base: str = "", enable_retry=True):
+    def __init__(
+        self,
+        model: str,
+        api_base: str = "",
+        enable_retry=True,
+        stream_sink: StreamSink = None,
+        response_cache: ResponseCache = None,
+    ):
         """
         Initializes an instance of the AICaller class.
 
         Parameters:
             model (str): The name of the model to be used.
             api_base (str): The base API URL to use in case the model is set to Ollama or Hugging Face.
+            stream_sink (StreamSink, optional): Where the response text is rendered while it is generated. Defaults to the sink configured by `llm.stream_output`.
+            response_cache (ResponseCache, optional): A cache of previous responses to identical prompts. Defaults to None (no caching).
         """
         self.model = model
         self.api_base = api_base
         self.enable_retry = enable_retry
+        self.stream_sink = stream_sink or get_stream_sink()
+        self.response_cache = response_cache
+        # Prompt tokens read from the prompt cache of the provider, for the last call and for all the calls
+        self.last_cached_prompt_tokens = 0
+        self.total_cached_prompt_tokens = 0
+        self._cached_tokens_lock = threading.Lock()
 
-    @conditional_retry  # You can access self.enable_retry here
-    def call_model(self, prompt: dict, max_tokens=4096, stream=True):
+    def _build_completion_params(self, prompt: dict, max_tokens: int, stream: bool, response_format: dict = None):
         """
-        Call the language model with the provided prompt and retrieve the response.
-
-        Parameters:
-            prompt (dict): The prompt to be sent to the language model.
-            max_tokens (int, optional): The maximum number of tokens to generate in the response. Defaults to 4096.
-            stream (bool, optional): Whether to stream the response or not. Defaults to True.
+        Build the messages and completion parameters for a call to the language model.
 
         Returns:
-            tuple: A tuple containing the response generated by the language model, the number of tokens used from the prompt, and the total number of tokens in the response.
+            tuple: The completion parameters, the messages, and whether the response will be streamed.
         """
         if "system" not in prompt or "user" not in prompt:
             raise KeyError(
                 "The prompt dictionary must contain 'system' and 'user' keys."
             )
+        # Calls of some prompt types can be routed to another model, see `_route`
+        route = self._route(prompt)
+        model = route.get("model") or self.model
+        max_tokens = route.get("max_tokens") or max_tokens
+
         if prompt["system"] == "":
-            messages = [{"role": "user", "content": prompt["user"]}]
+            messages = [{"role": "user", "content": self._user_content(prompt, model)}]
         else:
-            if self.model in ["o1-preview", "o1-mini"]:
+            if model in ["o1-preview", "o1-mini"]:
                 # o1 doesn't accept a system message so we add it to the prompt
                 messages = [
                     {"role": "user", "content": prompt["system"] + "\n" + prompt["user"]},
@@ -67,12 +219,12 @@ class AICaller:
             else:
                 messages = [
                     {"role": "system", "content": prompt["system"]},
-                    {"role": "user", "content": prompt["user"]},
+                    {"role": "user", "content": self._user_content(prompt, model)},
                 ]
 
         # Default completion parameters
         completion_params = {
-            "model": self.model,
+            "model": model,
             "messages": messages,
             "stream": stream,  # Use the stream parameter passed to the method
             "temperature": 0.2,
@@ -80,7 +232,7 @@ class AICaller:
         }
 
         # Model-specific adjustments
-        if self.model in ["o1-preview", "o1-mini"]:
+        if model in ["o1-preview", "o1-mini"]:
             stream = False  # o1 doesn't support streaming
             completion_params["temperature"] = 1
             completion_params["stream"] = False  # o1 doesn't support streaming
@@ -89,48 +241,146 @@ class AICaller:
 
         # API base exception for OpenAI Compatible, Ollama, and Hugging Face models
         if (
-            "ollama" in self.model
-            or "huggingface" in self.model
-            or self.model.startswith("openai/")
+            "ollama" in model
+            or "huggingface" in model
+            or model.startswith("openai/")
         ):
-            completion_params["api_base"] = self.api_base
+            completion_params["api_base"] = route.get("api_base") or self.api_base
+
+        if route.get("timeout"):
+            completion_params["timeout"] = route["timeout"]
+
+        # Structured output, for the models that support it (the response is parsed as usual otherwise)
+        if response_format is not None and self._supports_response_format(model):
+            completion_params["response_format"] = response_format
+
+        return completion_params, messages, stream
+
+    @staticmethod
+    def _route(prompt: dict) -> dict:
+        """
+        Get the routing of the calls of a prompt type (`prompt["prompt_type"]`, the name of its prompt template), from the
+        `[model_routing]` section of the configuration.
+
+        Returns:
+            dict: The "model", "max_tokens", "timeout" and "api_base" of the calls, when set. Unset values keep the
+                  defaults of the caller.
+        """
+        prompt_type = prompt.get("prompt_type")
+        if not prompt_type:
+            return {}
+        return get_settings().get(f"model_routing.{prompt_type}", None) or {}
+
+    def model_for(self, prompt_type: str) -> str:
+        """
+        Get the model that the calls of a prompt type are sent to, with the routing of `_route`.
+        """
+        return self._route({"prompt_type": prompt_type}).get("model") or self.model
+
+    def _user_content(self, prompt: dict, model: str):
+        """
+        Get the content of the user message, with its stable prefix (`prompt["cache_prefix"]`) marked as cacheable for the
+        providers that only cache prompts with explicit cache control.
 
+        Other providers (e.g. OpenAI) cache the longest prefix they have already seen automatically: the prompt is sent as
+        is, and the stable prefix coming first is enough.
+
+        Returns:
+            str or list: The user prompt, or its prefix and the rest as content blocks.
+        """
+        cache_prefix = prompt.get("cache_prefix")
+        if not cache_prefix or not prompt["user"].startswith(cache_prefix) or not self._supports_cache_control(model):
+            return prompt["user"]
+        return [
+            {"type": "text", "text": cache_prefix, "cache_control": {"type": "ephemeral"}},
+            {"type": "text", "text": prompt["user"][len(cache_prefix):]},
+        ]
+
+    @staticmethod
+    def _supports_response_format(model: str) -> bool:
         try:
-            response = litellm.completion(**completion_params)
-        except Exception as e:
-            print(f"Error calling LLM model: {e}")
-            raise e
-
-        if stream:
-            chunks = []
-            print("Streaming results from LLM model...")
-            try:
-                for chunk in response:
-                    print(chunk.choices[0].delta.content or "", end="", flush=True)
-                    chunks.append(chunk)
-                    time.sleep(
-                        0.01
-                    )  # Optional: Delay to simulate more 'natural' response pacing
+            return "response_format" in (litellm.get_supported_openai_params(model=model) or [])
+        except Exception:
+            return False
 
-            except Exception as e:
-                print(f"Error calling LLM model during streaming: {e}")
-                if self.enable_retry:
-                    raise e
-            model_response = litellm.stream_chunk_builder(chunks, messages=messages)
-            print("\n")
-            # Build the final response from the streamed chunks
-            content = model_response["choices"][0]["message"]["content"]
-            usage = model_response["usage"]
-            prompt_tokens = int(usage["prompt_tokens"])
-            completion_tokens = int(usage["completion_tokens"])
-        else:
-            # Non-streaming response is a CompletionResponse object
-            content = response.choices[0].message.content
-            print(f"Printing results from LLM model...\n{content}")
-            usage = response.usage
-            prompt_tokens = int(usage.prompt_tokens)
-            completion_tokens = int(usage.completion_tokens)
+    @staticmethod
+    def _supports_cache_control(model: str) -> bool:
+        try:
+            provider = litellm.get_llm_provider(model)[1]
+        except Exception:
+            # Models without a provider prefix, e.g. "claude-3-5-sonnet-20241022"
+            provider = "anthropic" if model.startswith("claude") else None
+        return provider in get_settings().get("llm.cache_control_providers", [])
+
+    def _record_cached_prompt_tokens(self, usage) -> int:
+        """
+        Record the number of prompt tokens that were read from the prompt cache of the provider.
+
+        litellm reports them as `usage.prompt_tokens_details.cached_tokens`, and Anthropic models also as
+        `usage.cache_read_input_tokens`. The usage is an object for complete responses, and a dictionary for responses
+        built from streamed chunks.
+
+        Returns:
+            int: The number of cached prompt tokens, 0 when the provider reports none.
+        """
+
+        def field(value, name):
+            if value is None:
+                return None
+            return value.get(name) if isinstance(value, dict) else getattr(value, name, None)
+
+        cached_tokens = field(field(usage, "prompt_tokens_details"), "cached_tokens")
+        if not isinstance(cached_tokens, int) or not cached_tokens:
+            cached_tokens = field(usage, "cache_read_input_tokens")
+        cached_tokens = cached_tokens if isinstance(cached_tokens, int) else 0
+        with self._cached_tokens_lock:
+            self.last_cached_prompt_tokens = cached_tokens
+            self.total_cached_prompt_tokens += cached_tokens
+        return cached_tokens
 
+    def _wait_for_rate_limit(self, messages: list):
+        """
+        Wait until the rate limits shared by all the calls allow this one, if rate limits are configured.
+
+        Returns:
+            tuple: The rate limiter (None when there are no rate limits), and the estimated number of prompt tokens.
+        """
+        rate_limiter = RateLimiter.get_rate_limiter()
+        if rate_limiter is None:
+            return None, 0
+        estimated_tokens = self._estimate_prompt_tokens(messages)
+        with Profiler.span("llm.queue"):
+            rate_limiter.acquire(estimated_tokens)
+        return rate_limiter, estimated_tokens
+
+    @staticmethod
+    def _estimate_prompt_tokens(messages: list) -> int:
+        characters = 0
+        for message in messages:
+            content = message["content"]
+            if isinstance(content, str):
+                characters += len(content)
+            else:
+                characters += sum(len(block.get("text", "")) for block in content)
+        return characters // CHARS_PER_TOKEN + 1
+
+    def _get_cached_response(self, completion_params: dict):
+        """
+        Look up the response to a completion request in the response cache.
+
+        Returns:
+            tuple: The cache key (None when caching is disabled) and the cached (response, prompt tokens, completion tokens), or None on a miss.
+        """
+        if self.response_cache is None:
+            return None, None
+        cache_key = ResponseCache.make_key(completion_params)
+        return cache_key, self.response_cache.get(cache_key)
+
+    def _cache_response(self, cache_key: str, model: str, content: str, prompt_tokens: int, completion_tokens: int):
+        if self.response_cache is not None and cache_key is not None:
+            self.response_cache.put(cache_key, model, content, prompt_tokens, completion_tokens)
+
+    def _log_to_wandb(self, prompt: dict, content: str):
         if "WANDB_API_KEY" in os.environ:
             try:
                 root_span = Trace(
@@ -147,6 +397,180 @@ class AICaller:
             except Exception as e:
                 print(f"Error logging to W&B: {e}")
 
+    @Profiler.timed("llm.call_model")
+    @conditional_retry  # You can access self.enable_retry here
+    def call_model(self, prompt: dict, max_tokens=4096, stream=True, stream_sink: StreamSink = None, response_format: dict = None):
+        """
+        Call the language model with the provided prompt and retrieve the response.
+
+        Parameters:
+            prompt (dict): The prompt to be sent to the language model.
+            max_tokens (int, optional): The maximum number of tokens to generate in the response. Defaults to 4096.
+            stream (bool, optional): Whether to stream the response or not. Defaults to True.
+            stream_sink (StreamSink, optional): Where the response text is written while it is generated, for this call only. Defaults to the sink of the caller.
+            response_format (dict, optional): The structured output the response is constrained to, for the models that support it. Defaults to None.
+
+        Returns:
+            tuple: A tuple containing the response generated by the language model, the number of tokens used from the prompt, and the total number of tokens in the response.
+        """
+        completion_params, messages, stream = self._build_completion_params(prompt, max_tokens, stream, response_format)
+        stream_sink = stream_sink or self.stream_sink
+
+        cache_key, cached_response = self._get_cached_response(completion_params)
+        if cached_response is not None:
+            # Nothing was read from the prompt cache of the provider
+            self._record_cached_prompt_tokens(None)
+            stream_sink.start()
+            stream_sink.write(cached_response[0])
+            stream_sink.end()
+            return cached_response
+
+        rate_limiter, estimated_tokens = self._wait_for_rate_limit(messages)
+
+        with Profiler.span("llm.completion"):
+            try:
+                response = litellm.completion(**completion_params)
+            except Exception as e:
+                print(f"Error calling LLM model: {e}")
+                raise e
+
+            if stream:
+                chunks = []
+                stream_sink.start()
+                try:
+                    for chunk in response:
+                        stream_sink.write(chunk.choices[0].delta.content or "")
+                        chunks.append(chunk)
+
+                except Exception as e:
+                    print(f"Error calling LLM model during streaming: {e}")
+                    if self.enable_retry:
+                        raise e
+                finally:
+                    stream_sink.end()
+                model_response = litellm.stream_chunk_builder(chunks, messages=messages)
+                # Build the final response from the streamed chunks
+                content = model_response["choices"][0]["message"]["content"]
+                usage = model_response["usage"]
+                prompt_tokens = int(usage["prompt_tokens"])
+                completion_tokens = int(usage["completion_tokens"])
+                self._record_cached_prompt_tokens(usage)
+            else:
+                # Non-streaming response is a CompletionResponse object
+                content = response.choices[0].message.content
+                stream_sink.start()
+                stream_sink.write(content)
+                stream_sink.end()
+                usage = response.usage
+                prompt_tokens = int(usage.prompt_tokens)
+                completion_tokens = int(usage.completion_tokens)
+                self._record_cached_prompt_tokens(usage)
+
+        if rate_limiter is not None:
+            rate_limiter.settle(estimated_tokens, prompt_tokens + completion_tokens)
+
+        self._log_to_wandb(prompt, content)
+        self._cache_response(cache_key, completion_params["model"], content, prompt_tokens, completion_tokens)
+
         # Returns: Response, Prompt token count, and Completion token count
         return content, prompt_tokens, completion_tokens
 
+    @Profiler.timed("llm.acall_model")
+    async def acall_model(self, prompt: dict, max_tokens=4096, stream=False, response_format: dict = None):
+        """
+        Asynchronous version of `call_model`, built on `litellm.acompletion`.
+
+        The call is executed on the shared LLMEventLoop, so all concurrent calls reuse the same pooled HTTP session
+        and are limited by the `llm.max_concurrent_requests` setting.
+
+        Parameters:
+            prompt (dict): The prompt to be sent to the language model.
+            max_tokens (int, optional): The maximum number of tokens to generate in the response. Defaults to 4096.
+            stream (bool, optional): Whether to stream the response or not. Defaults to False.
+            response_format (dict, optional): The structured output the response is constrained to, for the models that support it. Defaults to None.
+
+        Returns:
+            tuple: A tuple containing the response generated by the language model, the number of tokens used from the prompt, and the total number of tokens in the response.
+        """
+        return await LLMEventLoop.run_async(
+            self._acall_model(prompt, max_tokens=max_tokens, stream=stream, response_format=response_format)
+        )
+
+    @conditional_retry
+    async def _acall_model(self, prompt: dict, max_tokens=4096, stream=False, response_format: dict = None):
+        completion_params, messages, stream = self._build_completion_params(prompt, max_tokens, stream, response_format)
+
+        cache_key, cached_response = self._get_cached_response(completion_params)
+        if cached_response is not None:
+            # Nothing was read from the prompt cache of the provider
+            self._record_cached_prompt_tokens(None)
+            return cached_response
+
+        rate_limiter = RateLimiter.get_rate_limiter()
+        estimated_tokens = self._estimate_prompt_tokens(messages) if rate_limiter is not None else 0
+        semaphore = LLMEventLoop.semaphore()
+        with Profiler.span("llm.queue"):
+            if rate_limiter is not None:
+                await rate_limiter.acquire_async(estimated_tokens)
+            await semaphore.acquire()
+        try:
+            with Profiler.span("llm.completion"):
+                try:
+                    response = await litellm.acompletion(**completion_params)
+                except Exception as e:
+                    print(f"Error calling LLM model: {e}")
+                    raise e
+
+                if stream:
+                    chunks = []
+                    try:
+                        async for chunk in response:
+                            chunks.append(chunk)
+                    except Exception as e:
+                        print(f"Error calling LLM model during streaming: {e}")
+                        if self.enable_retry:
+                            raise e
+                    model_response = litellm.stream_chunk_builder(chunks, messages=messages)
+                    content = model_response["choices"][0]["message"]["content"]
+                    usage = model_response["usage"]
+                    prompt_tokens = int(usage["prompt_tokens"])
+                    completion_tokens = int(usage["completion_tokens"])
+                    self._record_cached_prompt_tokens(usage)
+                else:
+                    content = response.choices[0].message.content
+                    usage = response.usage
+                    prompt_tokens = int(usage.prompt_tokens)
+                    completion_tokens = int(usage.completion_tokens)
+                    self._record_cached_prompt_tokens(usage)
+        finally:
+            semaphore.release()
+
+        if rate_limiter is not None:
+            rate_limiter.settle(estimated_tokens, prompt_tokens + completion_tokens)
+
+        self._log_to_wandb(prompt, content)
+        self._cache_response(cache_key, completion_params["model"], content, prompt_tokens, completion_tokens)
+
+        return content, prompt_tokens, completion_tokens
+
+    async def acall_model_batch(self, prompts: list, max_tokens=4096) -> list:
+        """
+        Send several prompts to the language model concurrently.
+
+        Parameters:
+            prompts (list): The prompts to be sent to the language model.
+            max_tokens (int, optional): The maximum number of tokens to generate in each response. Defaults to 4096.
+
+        Returns:
+            list: For each prompt, in order, either the (response, prompt tokens, completion tokens) tuple, or the exception raised by the call.
+        """
+        return await asyncio.gather(
+            *[self.acall_model(prompt, max_tokens=max_tokens) for prompt in prompts],
+            return_exceptions=True,
+        )
+
+    def call_model_batch(self, prompts: list, max_tokens=4096) -> list:
+        """
+        Synchronous wrapper around `acall_model_batch`, for use from non-async code.
+        """
+        return LLMEventLoop.run(self.acall_model_batch(prompts, max_tokens=max_tokens))
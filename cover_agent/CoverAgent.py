@@ -1,4 +1,5 @@
 import datetime
+import hashlib
 import os
 import shutil
 import sys
@@ -7,8 +8,12 @@ import wandb
 from typing import List
 
 from cover_agent.CustomLogger import CustomLogger
+from cover_agent.Profiler import Profiler
+from cover_agent.PytestWorker import PytestWorker
 from cover_agent.PromptBuilder import adapt_test_command_for_a_single_test_via_ai
+from cover_agent.RateLimiter import RateLimiter
 from cover_agent.ReportGenerator import ReportGenerator
+from cover_agent.ResponseCache import create_response_cache
 from cover_agent.UnitTestGenerator import UnitTestGenerator
 from cover_agent.UnitTestValidator import UnitTestValidator
 from cover_agent.UnitTestDB import UnitTestDB
@@ -30,6 +35,17 @@ class CoverAgent:
         self._validate_paths()
         self._duplicate_test_file()
 
+        # Optional timing of the hot paths of the run
+        if getattr(args, "profile_output", None):
+            Profiler.enable()
+
+        # Optional warm pytest worker, used for every run of a pytest test command
+        if getattr(args, "pytest_worker", False):
+            PytestWorker.enable()
+
+        # Optional cache of LLM responses, shared by every LLM caller of this run
+        self.response_cache = create_response_cache(args)
+
         # To run only a single test file, we need to modify the test command
         self.parse_command_to_run_only_a_single_test(args)
 
@@ -46,6 +62,9 @@ class CoverAgent:
             llm_model=args.model,
             api_base=args.api_base,
             use_report_coverage_feature_flag=args.use_report_coverage_feature_flag,
+            response_cache=self.response_cache,
+            source_skeleton=getattr(args, "source_skeleton", False),
+            structured_output=getattr(args, "structured_output", False),
         )
 
         self.test_validator = UnitTestValidator(
@@ -64,7 +83,11 @@ class CoverAgent:
             use_report_coverage_feature_flag=args.use_report_coverage_feature_flag,
             diff_coverage=args.diff_coverage,
             comparison_branch=args.branch,
-            num_attempts=args.run_tests_multiple_times
+            num_attempts=args.run_tests_multiple_times,
+            response_cache=self.response_cache,
+            per_test_coverage=getattr(args, "per_test_coverage", False),
+            test_db=self.test_db,
+            builtin_diff_coverage=getattr(args, "builtin_diff_coverage", False),
         )
 
     def parse_command_to_run_only_a_single_test(self, args):
@@ -80,7 +103,9 @@ class CoverAgent:
                 except ValueError:
                     print(f"Failed to adapt test command for running a single test: {test_command}")
             else:
-                new_command_line = adapt_test_command_for_a_single_test_via_ai(args, test_file_relative_path, test_command)
+                new_command_line = adapt_test_command_for_a_single_test_via_ai(
+                    args, test_file_relative_path, test_command, response_cache=self.response_cache
+                )
         if new_command_line:
             args.test_command_original = test_command
             args.test_command = new_command_line
@@ -142,6 +167,15 @@ class CoverAgent:
         3. Run the initial test suite analysis.
         
         """
+        self._init_wandb()
+
+        # Run initial test suite analysis
+        self.test_validator.initial_test_suite_analysis(test_db=self.test_db)
+        failed_test_runs, language, test_framework, coverage_report = self.test_validator.get_coverage()
+
+        return failed_test_runs, language, test_framework, coverage_report
+
+    def _init_wandb(self):
         # Check if user has exported the WANDS_API_KEY environment variable
         if "WANDB_API_KEY" in os.environ:
             # Initialize the Weights & Biases run
@@ -150,13 +184,67 @@ class CoverAgent:
             run_name = f"{self.args.model}_" + time_and_date
             wandb.init(project="cover-agent", name=run_name)
 
-        # Run initial test suite analysis
-        self.test_validator.initial_test_suite_analysis()
-        failed_test_runs, language, test_framework, coverage_report = self.test_validator.get_coverage()
+    def _get_run_key(self) -> str:
+        """
+        Identify this run in the checkpoints table: the same source file, output test file and model resume the same run.
+        """
+        run_identity = "|".join(
+            [
+                os.path.abspath(self.args.source_file_path),
+                os.path.abspath(self.args.test_file_output_path),
+                self.args.model,
+            ]
+        )
+        return hashlib.sha256(run_identity.encode("utf-8")).hexdigest()
 
-        return failed_test_runs, language, test_framework, coverage_report
+    def save_checkpoint(self, iteration_count: int):
+        """
+        Save the state of the run after an iteration, so that it can be resumed with --resume.
+        """
+        with open(self.args.test_file_output_path, "r") as f:
+            test_file_content = f.read()
+        state = {
+            "validator": self.test_validator.get_checkpoint_state(),
+            "generator_input_token_count": self.test_gen.total_input_token_count,
+            "generator_output_token_count": self.test_gen.total_output_token_count,
+            "generator_cached_input_token_count": self.test_gen.ai_caller.total_cached_prompt_tokens,
+            "validator_cached_input_token_count": self.test_validator.ai_caller.total_cached_prompt_tokens,
+        }
+        self.test_db.save_checkpoint(self._get_run_key(), iteration_count, state, test_file_content)
+
+    def resume_from_checkpoint(self, checkpoint: dict):
+        """
+        Restore the state of an interrupted run, instead of running the initial analysis and coverage again.
+
+        Parameters:
+            checkpoint (dict): The checkpoint saved by `save_checkpoint`.
 
-    def run_test_gen(self, failed_test_runs: List, language: str, test_framework: str, coverage_report: str):
+        Returns:
+            tuple: The failed test runs, language, testing framework and coverage report to continue the test generation with.
+        """
+        self._init_wandb()
+        with open(self.args.test_file_output_path, "w") as f:
+            f.write(checkpoint["test_file_content"])
+        state = checkpoint["state"]
+        self.test_validator.restore_checkpoint_state(state["validator"])
+        self.test_gen.total_input_token_count = state["generator_input_token_count"]
+        self.test_gen.total_output_token_count = state["generator_output_token_count"]
+        # Checkpoints saved by older versions do not have the cached token counts
+        self.test_gen.ai_caller.total_cached_prompt_tokens = state.get("generator_cached_input_token_count", 0)
+        self.test_validator.ai_caller.total_cached_prompt_tokens = state.get("validator_cached_input_token_count", 0)
+        self.logger.info(
+            f"Resuming from the checkpoint after iteration {checkpoint['iteration_count']} (Current Coverage: {round(self.test_validator.current_coverage * 100, 2)}%)"
+        )
+        return (
+            self.test_validator.failed_test_runs,
+            self.test_validator.language,
+            self.test_validator.testing_framework,
+            self.test_validator.code_coverage_report,
+        )
+
+    def run_test_gen(
+        self, failed_test_runs: List, language: str, test_framework: str, coverage_report: str, iteration_count: int = 0
+    ):
         """
         Run the test generation process.
 
@@ -173,23 +261,45 @@ class CoverAgent:
         9. Provide metrics on total token usage.
         10. Generate a report.
         11. Finish the Weights & Biases run if it was initialized.
+
+        The state of the run is checkpointed after every iteration, and the checkpoint is deleted once the loop is over.
+        `iteration_count` is the number of iterations already completed, when resuming an interrupted run.
         """
-        # Initialize variables to track progress
-        iteration_count = 0
 
         # Loop until desired coverage is reached or maximum iterations are met
         while iteration_count < self.args.max_iterations:
             # Log the current coverage
             self.log_coverage()
 
-            # Generate new tests
-            generated_tests_dict = self.test_gen.generate_tests(failed_test_runs, language, test_framework, coverage_report)
-
-            # Loop through each new test and validate it
-            for generated_test in generated_tests_dict.get("new_tests", []):
-                # Validate the test and record the result
-                test_result = self.test_validator.validate_test(generated_test)
-
+            parallel_validation_workers = getattr(self.args, "parallel_validation_workers", 1)
+            batch_validation = getattr(self.args, "batch_validation", False)
+            if getattr(self.args, "stream_validation", False) and not batch_validation and parallel_validation_workers <= 1:
+                # Validate every new test as soon as it is complete in the streamed response, while the next ones are
+                # still being generated
+                test_results = (
+                    self.test_validator.validate_test(generated_test)
+                    for generated_test in self.test_gen.generate_tests_streaming(
+                        failed_test_runs, language, test_framework, coverage_report
+                    )
+                )
+            else:
+                # Generate new tests
+                with Profiler.span("agent.generate_tests"):
+                    generated_tests_dict = self.test_gen.generate_tests(failed_test_runs, language, test_framework, coverage_report)
+
+                # Loop through each new test and validate it
+                new_tests = generated_tests_dict.get("new_tests", [])
+                if batch_validation:
+                    # Validate all the tests together, with as few test runs as possible
+                    test_results = self.test_validator.validate_tests_in_batch(new_tests)
+                elif parallel_validation_workers > 1:
+                    # Validate the tests concurrently in isolated copies of the project
+                    test_results = self.test_validator.validate_tests_in_sandboxes(new_tests, parallel_validation_workers)
+                else:
+                    # Validate the tests one by one
+                    test_results = (self.test_validator.validate_test(generated_test) for generated_test in new_tests)
+
+            for test_result in test_results:
                 # Insert the test result into the database
                 test_result["prompt"] = self.test_gen.prompt["user"]
                 self.test_db.insert_attempt(test_result)
@@ -199,9 +309,14 @@ class CoverAgent:
 
             # Check if the desired coverage has been reached
             failed_test_runs, language, test_framework, coverage_report = self.test_validator.get_coverage()
+            self.save_checkpoint(iteration_count)
             if self.test_validator.current_coverage >= (self.test_validator.desired_coverage / 100):
                 break
 
+        # The run is complete, it will not be resumed
+        self.test_db.delete_checkpoint(self._get_run_key())
+        self.test_validator.cleanup_sandboxes()
+
         # Log the final coverage
         if self.test_validator.current_coverage >= (self.test_validator.desired_coverage / 100):
             self.logger.info(
@@ -226,9 +341,35 @@ class CoverAgent:
         self.logger.info(
             f"Total number of output tokens used for LLM model {self.test_gen.ai_caller.model}: {self.test_gen.total_output_token_count + self.test_validator.total_output_token_count}"
         )
+        cached_input_token_count = (
+            self.test_gen.ai_caller.total_cached_prompt_tokens + self.test_validator.ai_caller.total_cached_prompt_tokens
+        )
+        if cached_input_token_count:
+            # Counted in the input tokens above, but read from the prompt cache of the provider
+            self.logger.info(
+                f"Input tokens read from the prompt cache of the provider: {cached_input_token_count}"
+            )
+        rate_limiter = RateLimiter.get_rate_limiter()
+        if rate_limiter and rate_limiter.delayed_requests:
+            self.logger.info(
+                f"Rate limits (shared by all the agents of the process): {rate_limiter.delayed_requests} of {rate_limiter.requests} LLM calls waited, "
+                f"for {round(rate_limiter.total_wait_seconds, 2)} seconds in total"
+            )
+        if self.response_cache and self.response_cache.hits:
+            # Cached responses are counted in the totals above, but were not billed in this run
+            self.logger.info(
+                f"LLM response cache: {self.response_cache.hits} hits, {self.response_cache.misses} misses. "
+                f"Tokens served from the cache (not billed in this run): {self.response_cache.cached_prompt_tokens} input, {self.response_cache.cached_completion_tokens} output"
+            )
 
-        # Generate a report
-        self.test_db.dump_to_report(self.args.report_filepath)
+        # Generate a report, with the per-phase timings of the run when profiling
+        profile_output = getattr(self.args, "profile_output", None)
+        if profile_output:
+            Profiler.write_json(profile_output)
+            self.logger.info(f"Profile of the run written to {profile_output}")
+            self.test_db.dump_to_report(self.args.report_filepath, profile=Profiler.summary())
+        else:
+            self.test_db.dump_to_report(self.args.report_filepath)
 
         # Finish the Weights & Biases run if it was initialized
         if "WANDB_API_KEY" in os.environ:
@@ -246,5 +387,11 @@ class CoverAgent:
         self.logger.info(f"Desired Coverage: {self.test_validator.desired_coverage}%")
 
     def run(self):
-        failed_test_runs, language, test_framework, coverage_report = self.init()
-        self.run_test_gen(failed_test_runs, language, test_framework, coverage_report)
\ No newline at end of file
+        checkpoint = self.test_db.get_checkpoint(self._get_run_key()) if getattr(self.args, "resume", False) else None
+        if checkpoint:
+            failed_test_runs, language, test_framework, coverage_report = self.resume_from_checkpoint(checkpoint)
+            iteration_count = checkpoint["iteration_count"]
+        else:
+            failed_test_runs, language, test_framework, coverage_report = self.init()
+            iteration_count = 0
+        self.run_test_gen(failed_test_runs, language, test_framework, coverage_report, iteration_count=iteration_count)
\ No newline at end of file
@@ -1,4 +1,7 @@
+from cover_agent.CoveragePyData import CoveragePyData
+from cover_agent.CoverageReportIndex import CoverageReportIndex
 from cover_agent.CustomLogger import CustomLogger
+from cover_agent.Profiler import Profiler
 from typing import Literal, Tuple, Union, List
 import csv
 import json
@@ -12,9 +15,10 @@ class CoverageProcessor:
         self,
         file_path: str,
         src_file_path: str,
-        coverage_type: Literal["cobertura", "lcov", "jacoco"],
+        coverage_type: Literal["cobertura", "lcov", "jacoco", "coveragepy"],
         use_report_coverage_feature_flag: bool = False,
         diff_coverage_report_path: str = None,
+        diff_coverage_engine=None,
     ):
         """
         Initializes a CoverageProcessor object.
@@ -22,12 +26,14 @@ class CoverageProcessor:
         Args:
             file_path (str): The path to the coverage report file.
             src_file_path (str): The fully qualified path of the file for which coverage data is being processed.
-            coverage_type (Literal["cobertura", "lcov"]): The type of coverage report being processed.
+            coverage_type (Literal["cobertura", "lcov", "jacoco", "coveragepy"]): The type of coverage report being processed.
+            diff_coverage_engine (DiffCoverageEngine, optional): When given, the coverage of the source file is restricted to
+                the lines changed against the comparison branch. Defaults to None.
 
         Attributes:
             file_path (str): The path to the coverage report file.
             src_file_path (str): The fully qualified path of the file for which coverage data is being processed.
-            coverage_type (Literal["cobertura", "lcov"]): The type of coverage report being processed.
+            coverage_type (Literal["cobertura", "lcov", "jacoco", "coveragepy"]): The type of coverage report being processed.
             logger (CustomLogger): The logger object for logging messages.
 
         Returns:
@@ -39,7 +45,13 @@ class CoverageProcessor:
         self.logger = CustomLogger.get_logger(__name__)
         self.use_report_coverage_feature_flag = use_report_coverage_feature_flag
         self.diff_coverage_report_path = diff_coverage_report_path
+        self.diff_coverage_engine = diff_coverage_engine
 
+        # Lines of the source file covered by the whole test suite, as bitmaps (bit N is set for line N)
+        self.baseline_covered_bitmap = None
+        self.baseline_statements_bitmap = 0
+
+    @Profiler.timed("coverage.process_coverage_report")
     def process_coverage_report(
         self, time_of_test_command: int
     ) -> Tuple[list, list, float]:
@@ -77,6 +89,74 @@ class CoverageProcessor:
             file_mod_time_ms > time_of_test_command
         ), f"Fatal: The coverage report file was not updated after the test command. file_mod_time_ms: {file_mod_time_ms}, time_of_test_command: {time_of_test_command}. {file_mod_time_ms > time_of_test_command}"
 
+    def set_coverage_baseline(self, lines_covered: List[int], lines_missed: List[int]):
+        """
+        Record the coverage of the source file by the whole test suite, to later compare single-test runs against it.
+
+        Args:
+            lines_covered (List[int]): The line numbers covered by the test suite.
+            lines_missed (List[int]): The line numbers not covered by the test suite.
+        """
+        self.baseline_covered_bitmap = self._to_bitmap(lines_covered)
+        self.baseline_statements_bitmap = self.baseline_covered_bitmap | self._to_bitmap(lines_missed)
+
+    def new_covered_lines(self, lines_covered: List[int]) -> List[int]:
+        """
+        Find the lines covered by a single-test run that the baseline does not cover.
+
+        Args:
+            lines_covered (List[int]): The line numbers covered by the single-test run.
+
+        Returns:
+            List[int]: The newly covered line numbers, in increasing order.
+        """
+        new_lines_bitmap = self._to_bitmap(lines_covered) & ~self.baseline_covered_bitmap
+        return self._from_bitmap(new_lines_bitmap)
+
+    def merge_into_baseline(self, lines_covered: List[int]) -> float:
+        """
+        Add the lines covered by a single-test run to the baseline.
+
+        Args:
+            lines_covered (List[int]): The line numbers covered by the single-test run.
+
+        Returns:
+            float: The coverage percentage of the updated baseline.
+        """
+        lines_bitmap = self._to_bitmap(lines_covered)
+        self.baseline_covered_bitmap |= lines_bitmap
+        self.baseline_statements_bitmap |= lines_bitmap
+        return self.baseline_coverage_percentage()
+
+    def baseline_coverage(self) -> Tuple[list, list, float]:
+        """
+        Returns:
+            Tuple[list, list, float]: The covered and missed line numbers of the baseline, and its coverage percentage.
+        """
+        lines_covered = self._from_bitmap(self.baseline_covered_bitmap)
+        lines_missed = self._from_bitmap(self.baseline_statements_bitmap & ~self.baseline_covered_bitmap)
+        return lines_covered, lines_missed, self.baseline_coverage_percentage()
+
+    def baseline_coverage_percentage(self) -> float:
+        total_lines = self.baseline_statements_bitmap.bit_count()
+        return (self.baseline_covered_bitmap.bit_count() / total_lines) if total_lines > 0 else 0
+
+    @staticmethod
+    def _to_bitmap(lines: List[int]) -> int:
+        bitmap = 0
+        for line in lines:
+            bitmap |= 1 << line
+        return bitmap
+
+    @staticmethod
+    def _from_bitmap(bitmap: int) -> List[int]:
+        lines = []
+        while bitmap:
+            lowest_bit = bitmap & -bitmap
+            lines.append(lowest_bit.bit_length() - 1)
+            bitmap ^= lowest_bit
+        return lines
+
     def parse_coverage_report(self) -> Tuple[list, list, float]:
             """
             Parses a code coverage report to extract covered and missed line numbers for a specific file,
@@ -89,23 +169,34 @@ class CoverageProcessor:
                 if self.coverage_type == "cobertura":
                     return self.parse_coverage_report_cobertura()
                 elif self.coverage_type == "lcov":
-                    return self.parse_coverage_report_lcov()
+                    return self.parse_coverage_report_lcov(all_files=True)
                 elif self.coverage_type == "jacoco":
                     return self.parse_coverage_report_jacoco()
+                elif self.coverage_type == "coveragepy":
+                    return self.parse_coverage_report_coveragepy()
                 else:
                     raise ValueError(f"Unsupported coverage report type: {self.coverage_type}")
+            elif self.diff_coverage_engine is not None:
+                lines_covered, lines_missed, _ = self._parse_source_file_coverage()
+                return self.diff_coverage_engine.diff_coverage(self.src_file_path, lines_covered, lines_missed)
             else:
-                if self.coverage_type == "cobertura":
-                    # Default behavior is to parse out a single file from the report
-                    return self.parse_coverage_report_cobertura(filename=os.path.basename(self.src_file_path))
-                elif self.coverage_type == "lcov":
-                    return self.parse_coverage_report_lcov()
-                elif self.coverage_type == "jacoco":
-                    return self.parse_coverage_report_jacoco()
-                elif self.coverage_type == "diff_cover_json":
-                    return self.parse_json_diff_coverage_report()
-                else:
-                    raise ValueError(f"Unsupported coverage report type: {self.coverage_type}")
+                return self._parse_source_file_coverage()
+
+    def _parse_source_file_coverage(self) -> Tuple[list, list, float]:
+        # Coverage of the source file, from the coverage report
+        if self.coverage_type == "cobertura":
+            # Default behavior is to parse out a single file from the report
+            return self.parse_coverage_report_cobertura(filename=os.path.basename(self.src_file_path))
+        elif self.coverage_type == "lcov":
+            return self.parse_coverage_report_lcov()
+        elif self.coverage_type == "jacoco":
+            return self.parse_coverage_report_jacoco()
+        elif self.coverage_type == "coveragepy":
+            return self.parse_coverage_report_coveragepy(filename=self.src_file_path)
+        elif self.coverage_type == "diff_cover_json":
+            return self.parse_json_diff_coverage_report()
+        else:
+            raise ValueError(f"Unsupported coverage report type: {self.coverage_type}")
 
     def parse_coverage_report_cobertura(self, filename: str = None) -> Union[Tuple[list, list, float], dict]:
         """
@@ -122,24 +213,63 @@ class CoverageProcessor:
                 containing lists of covered and missed line numbers, and the coverage percentage 
                 as values.
         """
-        tree = ET.parse(self.file_path)
-        root = tree.getroot()
+        index = CoverageReportIndex.for_report(self.file_path, "cobertura")
+
+        if filename:
+            lines = index.lookup(filename)
+            if lines is None:
+                return [], [], 0.0  # Return empty lists if the file is not found
+            return self._with_coverage_percentage(*lines)
+        else:
+            coverage_data = {}
+            for cls_filename, lines in index.items():
+                coverage_data[cls_filename] = self._with_coverage_percentage(*lines)
+            return coverage_data
+
+    def parse_coverage_report_coveragepy(self, filename: str = None) -> Union[Tuple[list, list, float], dict]:
+        """
+        Parses the native data file of coverage.py (`.coverage`) to extract covered and missed line numbers for a specific
+        file or all measured files, and calculates the coverage percentage.
+
+        The data file only records the executed lines, so the statements of a file are found by parsing its source.
+
+        Args:
+            filename (str, optional): The path of the file to process. If None, processes all measured files.
+
+        Returns:
+            Union[Tuple[list, list, float], dict]: If filename is provided, returns a tuple containing lists of covered
+                and missed line numbers, and the coverage percentage. If filename is None, returns a dictionary with the
+                measured file paths as keys and such tuples as values.
+        """
+        executed = CoveragePyData(self.file_path).executed_lines()
 
         if filename:
-            for cls in root.findall(".//class"):
-                name_attr = cls.get("filename")
-                if name_attr and name_attr.endswith(filename):
-                    return self.parse_coverage_data_for_class(cls)
-            return [], [], 0.0  # Return empty lists if the file is not found
+            measured_path = CoveragePyData.find_file(executed, filename)
+            if measured_path is None:
+                return [], [], 0.0  # Return empty lists if the file is not found
+            source_path = measured_path if os.path.exists(measured_path) else filename
+            return self._coveragepy_lines(executed[measured_path], source_path)
         else:
             coverage_data = {}
-            for cls in root.findall(".//class"):
-                cls_filename = cls.get("filename")
-                if cls_filename:
-                    lines_covered, lines_missed, coverage_percentage = self.parse_coverage_data_for_class(cls)
-                    coverage_data[cls_filename] = (lines_covered, lines_missed, coverage_percentage)
+            for measured_path, executed_bitmap in executed.items():
+                # Files that no longer exist (e.g. temporary files) cannot be parsed
+                if os.path.exists(measured_path):
+                    coverage_data[measured_path] = self._coveragepy_lines(executed_bitmap, measured_path)
             return coverage_data
 
+    def _coveragepy_lines(self, executed_bitmap: int, source_path: str) -> Tuple[list, list, float]:
+        statements_bitmap = CoveragePyData.statement_lines(source_path)
+        return self._with_coverage_percentage(
+            self._from_bitmap(executed_bitmap & statements_bitmap),
+            self._from_bitmap(statements_bitmap & ~executed_bitmap),
+        )
+
+    @staticmethod
+    def _with_coverage_percentage(lines_covered: list, lines_missed: list) -> Tuple[list, list, float]:
+        total_lines = len(lines_covered) + len(lines_missed)
+        coverage_percentage = (len(lines_covered) / total_lines) if total_lines > 0 else 0
+        return lines_covered, lines_missed, coverage_percentage
+
     def parse_coverage_data_for_class(self, cls) -> Tuple[list, list, float]:
         """
         Parses coverage data for a single class.
@@ -166,38 +296,33 @@ class CoverageProcessor:
 
         return lines_covered, lines_missed, coverage_percentage
 
-    def parse_coverage_report_lcov(self):
+    def parse_coverage_report_lcov(self, all_files: bool = False) -> Union[Tuple[list, list, float], dict]:
+        """
+        Parses an LCOV tracefile to extract covered and missed line numbers for the source file or all files, and
+        calculates the coverage percentage.
 
-        lines_covered, lines_missed = [], []
-        filename = os.path.basename(self.src_file_path)
-        try: 
-            with open(self.file_path, "r") as file:
-                for line in file:
-                    line = line.strip()
-                    if line.startswith("SF:"):
-                        if line.endswith(filename):
-                            for line in file:
-                                line = line.strip()
-                                if line.startswith("DA:"):
-                                    line_number = line.replace("DA:", "").split(",")[0]
-                                    hits = line.replace("DA:", "").split(",")[1]
-                                    if int(hits) > 0:
-                                        lines_covered.append(int(line_number))
-                                    else:
-                                        lines_missed.append(int(line_number))
-                                elif line.startswith("end_of_record"):
-                                    break
+        The tracefile is indexed once (see `LcovReportIndex`), and the index is reused until the tracefile changes.
+
+        Args:
+            all_files (bool, optional): Process all the files of the tracefile instead of the source file. Defaults to False.
 
+        Returns:
+            Union[Tuple[list, list, float], dict]: A tuple containing lists of covered and missed line numbers of the source
+                file, and its coverage percentage; or, with all_files, a dictionary with the file names of the tracefile as
+                keys and such tuples as values.
+        """
+        try:
+            index = CoverageReportIndex.for_report(self.file_path, "lcov")
         except (FileNotFoundError, IOError) as e:
             self.logger.error(f"Error reading file {self.file_path}: {e}")
             raise
 
-        total_lines = len(lines_covered) + len(lines_missed)
-        coverage_percentage = (
-            (len(lines_covered) / total_lines) if total_lines > 0 else 0
-        )
-
-        return lines_covered, lines_missed, coverage_percentage
+        if all_files:
+            return {filename: self._with_coverage_percentage(*lines) for filename, lines in index.items()}
+        lines = index.lookup(os.path.basename(self.src_file_path))
+        if lines is None:
+            return [], [], 0
+        return self._with_coverage_percentage(*lines)
 
     def parse_coverage_report_jacoco(self) -> Tuple[list, list, float]:
         """
@@ -247,23 +372,13 @@ class CoverageProcessor:
         self, class_name: str
     ) -> tuple[list, list]:
         """Parses a JaCoCo XML code coverage report to extract covered and missed line numbers for a specific file."""
-        tree = ET.parse(self.file_path)
-        root = tree.getroot()
-        sourcefile = (
-                root.find(f".//sourcefile[@name='{class_name}.java']") or
-                root.find(f".//sourcefile[@name='{class_name}.kt']")
-        )
+        index = CoverageReportIndex.for_report(self.file_path, "jacoco")
+        lines = index.lookup(f"{class_name}.java") or index.lookup(f"{class_name}.kt")
 
-        if sourcefile is None:
+        if lines is None:
             return [], []
 
-        missed, covered = [], []
-        for line in sourcefile.findall('line'):
-            if line.attrib.get('mi') == '0':
-                covered += [int(line.attrib.get('nr', 0))]
-            else :
-                missed += [int(line.attrib.get('nr', 0))]
-
+        covered, missed = lines
         return missed, covered
 
     def parse_missed_covered_lines_jacoco_csv(
@@ -0,0 +1,167 @@
+import ast
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional
+
+try:
+    from coverage.python import PythonParser
+except ImportError:  # coverage.py is only needed in the environment of the project under test
+    PythonParser = None
+
+
+class CoveragePyData:
+    """
+    Reader of the native data file of coverage.py (`.coverage`), a SQLite database, used instead of an XML export.
+
+    The executed lines of every measured file are stored as "numbits" blobs (bit N of the blob is set when line N was
+    executed), per file and per measurement context (e.g. per test with `--cov-context=test`). With branch coverage,
+    executed arcs are stored instead, and the executed lines are their end points.
+
+    The data file does not list the statements of the files, so the statements are found by parsing the source files:
+    with coverage.py's own parser when coverage.py is installed, and otherwise with an approximation based on the `ast`
+    module.
+    """
+
+    MAX_CACHED_SOURCES = 64
+
+    _statements_cache = OrderedDict()
+    _statements_cache_lock = threading.Lock()
+
+    def __init__(self, data_file: str):
+        """
+        Parameters:
+            data_file (str): The path to the `.coverage` data file.
+        """
+        self.data_file = data_file
+
+    def executed_lines_by_context(self) -> Dict[str, Dict[str, int]]:
+        """
+        Returns:
+            dict: For every measured file, the bitmap of its executed lines (bit N is set for line N), by context.
+        """
+        # Opened read-only, as the data file may be rewritten by the next test run
+        connection = sqlite3.connect(f"file:{os.path.abspath(self.data_file)}?mode=ro", uri=True)
+        try:
+            has_arcs = connection.execute("SELECT value FROM meta WHERE key = 'has_arcs'").fetchone()
+            contexts = dict(connection.execute("SELECT id, context FROM context"))
+            files = dict(connection.execute("SELECT id, path FROM file"))
+            executed = {path: {} for path in files.values()}
+            if has_arcs and has_arcs[0] in ("1", "True", "true"):
+                for file_id, context_id, from_line, to_line in connection.execute(
+                    "SELECT file_id, context_id, fromno, tono FROM arc"
+                ):
+                    by_context = executed[files[file_id]]
+                    context = contexts.get(context_id, "")
+                    bitmap = by_context.get(context, 0)
+                    # Negative line numbers are the entry and exit points of code objects
+                    for line in (from_line, to_line):
+                        if line > 0:
+                            bitmap |= 1 << line
+                    by_context[context] = bitmap
+            else:
+                for file_id, context_id, numbits in connection.execute(
+                    "SELECT file_id, context_id, numbits FROM line_bits"
+                ):
+                    by_context = executed[files[file_id]]
+                    context = contexts.get(context_id, "")
+                    by_context[context] = by_context.get(context, 0) | int.from_bytes(numbits, "little")
+        finally:
+            connection.close()
+        return executed
+
+    def executed_lines(self) -> Dict[str, int]:
+        """
+        Returns:
+            dict: For every measured file, the bitmap of the lines executed in any context.
+        """
+        executed = {}
+        for path, by_context in self.executed_lines_by_context().items():
+            bitmap = 0
+            for context_bitmap in by_context.values():
+                bitmap |= context_bitmap
+            executed[path] = bitmap
+        return executed
+
+    @staticmethod
+    def find_file(paths, filename: str) -> Optional[str]:
+        """
+        Find a measured file given its path, or a suffix of its path made of whole path components (such as its base name).
+        """
+        if filename in paths:
+            return filename
+        absolute_path = os.path.abspath(filename)
+        if absolute_path in paths:
+            return absolute_path
+        for path in paths:
+            if path.endswith(os.sep + filename) or os.path.basename(path) == filename:
+                return path
+        return None
+
+    @classmethod
+    def statement_lines(cls, source_path: str) -> int:
+        """
+        Find the executable statements of a Python source file.
+
+        Returns:
+            int: The bitmap of the first lines of the statements (bit N is set for line N), excluding the lines excluded from
+                 coverage with "# pragma: no cover".
+        """
+        stat = os.stat(source_path)
+        signature = (stat.st_mtime_ns, stat.st_size)
+        with cls._statements_cache_lock:
+            cached = cls._statements_cache.get(source_path)
+            if cached is not None and cached[0] == signature:
+                cls._statements_cache.move_to_end(source_path)
+                return cached[1]
+
+        with open(source_path, "r", errors="replace") as f:
+            source = f.read()
+        if PythonParser is not None:
+            parser = PythonParser(text=source, filename=source_path, exclude=r"#\s*(pragma|PRAGMA)[:\s]?\s*(no|NO)\s*(cover|COVER)")
+            parser.parse_source()
+            statements = parser.statements
+        else:
+            statements = cls._ast_statement_lines(source)
+        bitmap = 0
+        for line in statements:
+            bitmap |= 1 << line
+
+        with cls._statements_cache_lock:
+            cls._statements_cache[source_path] = (signature, bitmap)
+            cls._statements_cache.move_to_end(source_path)
+            while len(cls._statements_cache) > cls.MAX_CACHED_SOURCES:
+                cls._statements_cache.popitem(last=False)
+        return bitmap
+
+    @staticmethod
+    def _ast_statement_lines(source: str) -> set:
+        # Approximation of coverage.py's statements: the first line of every statement, except docstrings and excluded code
+        tree = ast.parse(source)
+        source_lines = source.splitlines()
+        excluded = {
+            number
+            for number, line in enumerate(source_lines, start=1)
+            if "pragma: no cover" in line.lower()
+        }
+        statements = set()
+        for node in ast.walk(tree):
+            body = getattr(node, "body", None)
+            if isinstance(body, list) and body and isinstance(node, (ast.Module, ast.ClassDef, ast.FunctionDef, ast.AsyncFunctionDef)):
+                first = body[0]
+                is_docstring = (
+                    isinstance(first, ast.Expr) and isinstance(first.value, ast.Constant) and isinstance(first.value.value, str)
+                )
+                if is_docstring:
+                    excluded.add(first.lineno)
+            if not isinstance(node, ast.stmt):
+                continue
+            if node.lineno in excluded and isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef, ast.If, ast.For, ast.While, ast.With, ast.Try)):
+                # An excluded compound statement excludes its whole body
+                excluded.update(range(node.lineno, (node.end_lineno or node.lineno) + 1))
+            if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)) and node.decorator_list:
+                # Decorated definitions execute both their first decorator line and their "def" line
+                statements.add(node.decorator_list[0].lineno)
+            statements.add(node.lineno)
+        return statements - excluded
@@ -0,0 +1,233 @@
+import mmap
+import os
+import re
+import threading
+import xml.etree.ElementTree as ET
+from array import array
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+
+class CoverageReportIndex:
+    """
+    A filename -> (covered lines, missed lines) index of an XML coverage report, built in a single streaming pass.
+
+    The report is read with `ET.iterparse`, and every element is cleared as soon as it has been processed, so memory
+    usage is bounded by the size of the index rather than the size of the XML tree. Line numbers are kept in compact
+    `array('L')` buffers.
+
+    Indexes are cached by (path, mtime, size): as long as the report file is not rewritten, repeated lookups reuse the
+    same index instead of parsing the report again.
+    """
+
+    MAX_CACHED_REPORTS = 32
+
+    _cache = OrderedDict()
+    _cache_lock = threading.Lock()
+
+    def __init__(self, files: dict):
+        """
+        Parameters:
+            files (dict): The (covered, missed) line number arrays of every file, by file name, in report order.
+        """
+        self.files = files
+        self._by_basename = {}
+        for filename in files:
+            self._by_basename.setdefault(os.path.basename(filename), []).append(filename)
+
+    @classmethod
+    def for_report(cls, report_path: str, report_format: str) -> "CoverageReportIndex":
+        """
+        Get the index of a coverage report, building it only if the report changed since it was last indexed.
+
+        Parameters:
+            report_path (str): The path to the coverage report.
+            report_format (str): "cobertura", "jacoco" or "lcov".
+
+        Returns:
+            CoverageReportIndex: The index of the report.
+        """
+        stat = os.stat(report_path)
+        cache_key = (os.path.abspath(report_path), report_format)
+        signature = (stat.st_mtime_ns, stat.st_size)
+        with cls._cache_lock:
+            cached = cls._cache.get(cache_key)
+            if cached is not None and cached[0] == signature:
+                cls._cache.move_to_end(cache_key)
+                return cached[1]
+
+        if report_format == "cobertura":
+            index = cls(cls._index_cobertura(report_path))
+        elif report_format == "jacoco":
+            index = cls(cls._index_jacoco(report_path))
+        elif report_format == "lcov":
+            index = LcovReportIndex(report_path)
+        else:
+            raise ValueError(f"Unsupported coverage report type: {report_format}")
+
+        with cls._cache_lock:
+            cls._cache[cache_key] = (signature, index)
+            cls._cache.move_to_end(cache_key)
+            while len(cls._cache) > cls.MAX_CACHED_REPORTS:
+                cls._cache.popitem(last=False)
+        return index
+
+    @classmethod
+    def clear_cache(cls):
+        with cls._cache_lock:
+            cls._cache.clear()
+
+    def lookup(self, filename: str) -> Optional[Tuple[list, list]]:
+        """
+        Find the coverage of a file, given its full name in the report or a suffix of it made of whole path components
+        (such as its base name).
+
+        Returns:
+            Tuple[list, list]: The covered and missed line numbers, or None if no file of the report matches.
+        """
+        if filename in self.files:
+            return self._lines(filename)
+        candidates = self._by_basename.get(os.path.basename(filename), [])
+        for candidate in candidates:
+            if candidate.endswith(("/" + filename, os.sep + filename)):
+                return self._lines(candidate)
+        return None
+
+    def items(self):
+        """
+        Iterate over the (file name, (covered lines, missed lines)) pairs of the report, in report order.
+        """
+        for filename in self.files:
+            yield filename, self._lines(filename)
+
+    def _lines(self, filename: str) -> Tuple[list, list]:
+        covered, missed = self.files[filename]
+        return covered.tolist(), missed.tolist()
+
+    @staticmethod
+    def _index_cobertura(report_path: str) -> dict:
+        files = {}
+        current_lines = None
+        method_depth = 0
+        for event, elem in ET.iterparse(report_path, events=("start", "end")):
+            tag = elem.tag
+            if event == "start":
+                if tag == "class":
+                    filename = elem.get("filename")
+                    # Classes without a file name are skipped; several classes may share the same file
+                    current_lines = files.setdefault(filename, (array("L"), array("L"))) if filename else None
+                elif tag == "method":
+                    method_depth += 1
+                continue
+
+            if tag == "line":
+                # Lines listed under <method> elements repeat the lines of the class
+                if current_lines is not None and method_depth == 0:
+                    if int(elem.get("hits", 0)) > 0:
+                        current_lines[0].append(int(elem.get("number")))
+                    else:
+                        current_lines[1].append(int(elem.get("number")))
+                elem.clear()
+            elif tag == "method":
+                method_depth -= 1
+                elem.clear()
+            elif tag == "class":
+                current_lines = None
+                elem.clear()
+            elif tag == "package":
+                elem.clear()
+        return files
+
+    @staticmethod
+    def _index_jacoco(report_path: str) -> dict:
+        files = {}
+        package_name = ""
+        current_lines = None
+        for event, elem in ET.iterparse(report_path, events=("start", "end")):
+            tag = elem.tag
+            if event == "start":
+                if tag == "package":
+                    package_name = elem.get("name", "")
+                elif tag == "sourcefile":
+                    name = elem.get("name", "")
+                    filename = f"{package_name}/{name}" if package_name else name
+                    current_lines = files.setdefault(filename, (array("L"), array("L")))
+                continue
+
+            if tag == "line":
+                if current_lines is not None:
+                    if elem.get("mi") == "0":
+                        current_lines[0].append(int(elem.get("nr", 0)))
+                    else:
+                        current_lines[1].append(int(elem.get("nr", 0)))
+                elem.clear()
+            elif tag == "sourcefile":
+                current_lines = None
+                elem.clear()
+            elif tag in ("class", "package"):
+                # <class> elements only hold method counters, which are not needed
+                elem.clear()
+        return files
+
+
+class LcovReportIndex(CoverageReportIndex):
+    """
+    An index of the `SF:` records of an LCOV tracefile, by source file name.
+
+    Indexing memory-maps the tracefile and records the byte range of every record in a single scan, without decoding it.
+    The `DA:` lines of a record are only parsed when the record is looked up, by seeking to it and reading just its bytes,
+    so looking up one file of a very large tracefile does not read the records of the other files.
+
+    The tracefile is not kept mapped between lookups, as it may be truncated and rewritten by the next test run; an index
+    is only used while the tracefile is unchanged (see `CoverageReportIndex.for_report`).
+    """
+
+    _SOURCE_FILE_PATTERN = re.compile(rb"^[ \t]*SF:([^\r\n]*)", re.MULTILINE)
+
+    def __init__(self, report_path: str):
+        """
+        Parameters:
+            report_path (str): The path to the LCOV tracefile.
+        """
+        self.report_path = report_path
+        records = {}
+        with open(report_path, "rb") as f:
+            if os.fstat(f.fileno()).st_size > 0:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                    matches = list(self._SOURCE_FILE_PATTERN.finditer(data))
+                    for i, match in enumerate(matches):
+                        end = matches[i + 1].start() if i + 1 < len(matches) else len(data)
+                        filename = match.group(1).strip().decode(errors="replace")
+                        # A file may have several records, e.g. in merged tracefiles
+                        records.setdefault(filename, []).append((match.end(), end))
+        super().__init__(records)
+
+    def items(self):
+        """
+        Iterate over the (file name, (covered lines, missed lines)) pairs of the tracefile, in tracefile order, reading it
+        sequentially once.
+        """
+        with open(self.report_path, "rb") as f:
+            for filename in self.files:
+                yield filename, self._read_lines(f, filename)
+
+    def _lines(self, filename: str) -> Tuple[list, list]:
+        with open(self.report_path, "rb") as f:
+            return self._read_lines(f, filename)
+
+    def _read_lines(self, f, filename: str) -> Tuple[list, list]:
+        # Hits by line number, in order of appearance; a line is covered if any record of the file covers it
+        hits = {}
+        for start, end in self.files[filename]:
+            f.seek(start)
+            for line in f.read(end - start).splitlines():
+                line = line.strip()
+                if line.startswith(b"DA:"):
+                    fields = line[3:].split(b",")
+                    line_number = int(fields[0])
+                    hits[line_number] = max(hits.get(line_number, 0), int(fields[1]))
+                elif line.startswith(b"end_of_record"):
+                    break
+        covered = [line_number for line_number, count in hits.items() if count > 0]
+        missed = [line_number for line_number, count in hits.items() if count <= 0]
+        return covered, missed
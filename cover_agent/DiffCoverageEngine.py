@@ -0,0 +1,110 @@
+import os
+import re
+import shlex
+from typing import Dict, List, Tuple
+
+from cover_agent.CustomLogger import CustomLogger
+from cover_agent.Runner import Runner
+
+
+class DiffCoverageEngine:
+    """
+    Diff coverage computed in-process, used instead of running `diff-cover` after every test run.
+
+    The lines changed against the comparison branch do not change during a run, so they are read once from `git diff`,
+    between the merge base of the comparison branch and the working tree (committed, staged and unstaged changes). The
+    diff coverage of a file is then the intersection of its changed lines with the covered and missed lines of the
+    coverage report, which the coverage processor already keeps indexed.
+    """
+
+    _HUNK_PATTERN = re.compile(r"^@@ -\d+(?:,\d+)? \+(\d+)(?:,(\d+))? @@")
+
+    def __init__(self, repo_dir: str, comparison_branch: str = "main"):
+        """
+        Parameters:
+            repo_dir (str): A directory of the git repository.
+            comparison_branch (str, optional): The branch to compare the working tree against. Defaults to "main".
+        """
+        self.repo_dir = repo_dir
+        self.comparison_branch = comparison_branch
+        self.logger = CustomLogger.get_logger(__name__)
+        self._changed_lines = None
+
+    def changed_lines(self) -> Dict[str, int]:
+        """
+        Get the lines added or modified against the comparison branch, computed on the first call only.
+
+        Returns:
+            dict: The bitmap of the changed lines (bit N is set for line N) of every changed file, by absolute path.
+        """
+        if self._changed_lines is None:
+            toplevel = self._git("rev-parse --show-toplevel").strip()
+            merge_base = self._git(f"merge-base {shlex.quote(self.comparison_branch)} HEAD").strip()
+            diff = self._git(
+                f"-c core.quotePath=false diff --no-color --no-ext-diff --no-renames -U0 "
+                f"--src-prefix=a/ --dst-prefix=b/ {merge_base}"
+            )
+            self._changed_lines = {
+                os.path.join(toplevel, path): bitmap for path, bitmap in self.parse_diff(diff).items()
+            }
+            self.logger.info(
+                f"Diff coverage: {len(self._changed_lines)} files changed against {self.comparison_branch}"
+            )
+        return self._changed_lines
+
+    @classmethod
+    def parse_diff(cls, diff: str) -> Dict[str, int]:
+        """
+        Parse a unified diff, generated with `-U0`, into the bitmaps of the added lines of every file, by path.
+        """
+        changed = {}
+        current_path = None
+        for line in diff.splitlines():
+            if line.startswith("+++ "):
+                path = line[4:].rstrip("\t")
+                if path.startswith('"') and path.endswith('"'):
+                    path = path[1:-1]
+                # Deleted files have no lines left to cover
+                current_path = path[2:] if path.startswith("b/") else None
+            elif line.startswith("@@") and current_path is not None:
+                match = cls._HUNK_PATTERN.match(line)
+                if not match:
+                    continue
+                start = int(match.group(1))
+                count = int(match.group(2)) if match.group(2) is not None else 1
+                if count:
+                    # Bits start..start + count - 1
+                    changed[current_path] = changed.get(current_path, 0) | (((1 << count) - 1) << start)
+        return changed
+
+    def diff_coverage(
+        self, file_path: str, lines_covered: List[int], lines_missed: List[int]
+    ) -> Tuple[List[int], List[int], float]:
+        """
+        Restrict the coverage of a file to its changed lines.
+
+        Parameters:
+            file_path (str): The path of the file.
+            lines_covered (List[int]): The covered lines of the file, from the coverage report.
+            lines_missed (List[int]): The missed lines of the file, from the coverage report.
+
+        Returns:
+            Tuple[List[int], List[int], float]: The covered and missed changed lines, and the percentage of changed lines
+                                                covered (0.0 when no changed line is measured, as with diff-cover reports).
+        """
+        changed = self.changed_lines().get(os.path.realpath(file_path))
+        if changed is None:
+            changed = self.changed_lines().get(os.path.abspath(file_path), 0)
+        covered = [line for line in lines_covered if changed >> line & 1]
+        missed = [line for line in lines_missed if changed >> line & 1]
+        total_lines = len(covered) + len(missed)
+        return covered, missed, (len(covered) / total_lines) if total_lines > 0 else 0.0
+
+    def _git(self, arguments: str) -> str:
+        command = f"git {arguments}"
+        stdout, stderr, exit_code, _ = Runner.run_command(command=command, cwd=self.repo_dir)
+        assert exit_code == 0, (
+            f'Fatal: Error running git command for diff coverage. Is "{self.comparison_branch}" a branch of the repository? "{command}"'
+            f"\nExit code {exit_code}. \nStdout: \n{stdout} \nStderr: \n{stderr}"
+        )
+        return stdout
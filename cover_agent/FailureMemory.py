@@ -0,0 +1,153 @@
+import io
+import re
+import tokenize
+from collections import OrderedDict
+from typing import List
+
+from cover_agent.CustomLogger import CustomLogger
+from cover_agent.settings.token_handling import TokenEncoder
+
+# Used to estimate the number of tokens of a text when the tokenizer is not available
+CHARS_PER_TOKEN = 4
+
+
+class FailureMemory:
+    """
+    The failed generated tests of a run, fed back into the test generation prompt.
+
+    The failed tests of the validator only ever grow, and the model tends to generate the same failing test again in
+    later iterations, under another name. Each failure is therefore keyed by its normalized test code (without the test
+    name, whitespace and, for Python, comments) and the signature of its error (without numbers and memory addresses), and repeated
+    failures are collapsed into a single entry with a count. Only the most recently seen failures are kept, within a
+    maximal number of entries and of tokens.
+    """
+
+    _WHITESPACE_PATTERN = re.compile(r"\s+")
+    _ADDRESS_PATTERN = re.compile(r"0x[0-9a-fA-F]+")
+    _NUMBER_PATTERN = re.compile(r"\d+")
+
+    def __init__(self, max_entries: int = 10, max_tokens: int = 4000, language: str = None):
+        """
+        Parameters:
+            max_entries (int, optional): The maximal number of distinct failures kept. Defaults to 10.
+            max_tokens (int, optional): The maximal number of tokens of the rendered failures. Defaults to 4000.
+            language (str, optional): The language of the tests. Comments are only ignored in Python tests. Defaults to None.
+        """
+        self.max_entries = max_entries
+        self.max_tokens = max_tokens
+        self.language = language
+        self.logger = CustomLogger.get_logger(__name__)
+        # Failures by key, from the least to the most recently seen
+        self._failures = OrderedDict()
+
+    @classmethod
+    def from_failed_test_runs(cls, failed_test_runs: List[dict], **kwargs) -> "FailureMemory":
+        """
+        Build the memory of the failed test runs of the validator, from the oldest to the most recent.
+        """
+        memory = cls(**kwargs)
+        for failed_test in failed_test_runs or []:
+            memory.add(failed_test.get("code", {}), failed_test.get("error_message", None))
+        return memory
+
+    def add(self, test: dict, error_message: str = None):
+        """
+        Record a failed test. A failure with the same normalized code and error signature as a known one only increases
+        its count, and makes it the most recent failure.
+
+        Parameters:
+            test (dict): The generated test, with its "test_code", and optionally its "test_name" and "new_imports_code".
+            error_message (str, optional): The analysis of the error of the test run.
+        """
+        if not test:
+            return
+        key = (self.normalize_code(test, self.language), self.error_signature(error_message))
+        failure = self._failures.pop(key, None)
+        if failure is None:
+            failure = {"test": test, "error_message": error_message, "count": 0}
+        # The most recent occurrence is shown, with the number of times the failure occurred
+        failure["test"], failure["error_message"] = test, error_message
+        failure["count"] += 1
+        self._failures[key] = failure
+        while len(self._failures) > self.max_entries:
+            self._failures.popitem(last=False)
+
+    @classmethod
+    def normalize_code(cls, test: dict, language: str = None) -> str:
+        code = f"{test.get('new_imports_code', '') or ''}\n{test.get('test_code', '') or ''}"
+        test_name = test.get("test_name")
+        if test_name:
+            code = re.sub(rf"\b{re.escape(test_name)}\b", "test", code)
+        if language == "python":
+            code = cls._strip_python_comments(code)
+        return cls._WHITESPACE_PATTERN.sub(" ", code).strip()
+
+    @staticmethod
+    def _strip_python_comments(code: str) -> str:
+        # Comments are found by the tokenizer, so that a "#" within a string is kept
+        lines = code.splitlines(keepends=True)
+        try:
+            comments = [
+                token.start
+                for token in tokenize.generate_tokens(io.StringIO(code).readline)
+                if token.type == tokenize.COMMENT
+            ]
+        except (tokenize.TokenError, SyntaxError):
+            # The code is kept as is when it does not tokenize
+            return code
+        for row, column in comments:
+            lines[row - 1] = lines[row - 1][:column].rstrip() + "\n"
+        return "".join(lines)
+
+    @classmethod
+    def error_signature(cls, error_message: str) -> str:
+        if not error_message:
+            return ""
+        signature = cls._ADDRESS_PATTERN.sub("0x", error_message)
+        signature = cls._NUMBER_PATTERN.sub("N", signature)
+        return cls._WHITESPACE_PATTERN.sub(" ", signature).strip().lower()
+
+    def __len__(self) -> int:
+        return len(self._failures)
+
+    def entries(self) -> List[str]:
+        """
+        Render the failures kept for the prompt, within the token limit.
+
+        Returns:
+            List[str]: The rendered failures, from the least to the most recently seen. The least recent ones are left out
+                       when the failures do not fit in `max_tokens` tokens.
+        """
+        entries = [self._render(failure) for failure in self._failures.values()]
+        count_tokens = self._token_counter()
+        tokens = [count_tokens(entry) for entry in entries]
+        total_tokens = sum(tokens)
+        while entries and total_tokens > self.max_tokens:
+            entries.pop(0)
+            total_tokens -= tokens.pop(0)
+        return entries
+
+    def summary(self) -> str:
+        return "".join(self.entries())
+
+    @staticmethod
+    def _render(failure: dict) -> str:
+        test = failure["test"]
+        code = test.get("test_code", "") or ""
+        if test.get("new_imports_code"):
+            code = f"{test['new_imports_code'].strip()}\n\n{code}"
+        header = "Failed Test:" if failure["count"] == 1 else f"Failed Test ({failure['count']} similar failures):"
+        entry = f"{header}\n```\n{code.strip()}\n```\n"
+        if failure["error_message"]:
+            entry += f"Test execution error analysis:\n{failure['error_message']}\n\n\n"
+        else:
+            entry += "\n\n"
+        return entry
+
+    def _token_counter(self):
+        try:
+            encoder = TokenEncoder.get_token_encoder()
+        except Exception as e:
+            self.logger.warning(f"Failed to load the tokenizer, estimating tokens from the number of characters: {e}")
+            return lambda text: len(text) // CHARS_PER_TOKEN + 1
+        return lambda text: len(encoder.encode(text))
@@ -0,0 +1,73 @@
+import json
+import re
+from typing import Optional
+
+SINGLE_TEST_FIELDS = ["test_behavior", "lines_to_cover", "test_name", "test_code", "new_imports_code", "test_tags"]
+NEW_TESTS_FIELDS = ["language", "existing_test_function_signature", "new_tests"]
+# lines_to_cover is only asked for some languages
+REQUIRED_SINGLE_TEST_FIELDS = [field for field in SINGLE_TEST_FIELDS if field != "lines_to_cover"]
+
+
+class NewTestsSchema:
+    """
+    The JSON schema of the response to the test generation prompt (the `NewTests` type of the prompt), used for
+    structured output.
+
+    Models that support structured output are asked for a JSON object constrained by the schema, through the
+    `response_format` parameter of litellm. Such a response is parsed with a single `json.loads` and checked against the
+    schema, instead of going through the YAML repair strategies of `load_yaml`.
+    """
+
+    _CODE_FENCE_PATTERN = re.compile(r"^\s*```(?:json)?\s*\n?(.*?)\n?```\s*$", re.DOTALL)
+
+    @staticmethod
+    def json_schema(max_tests: int) -> dict:
+        single_test = {
+            "type": "object",
+            "properties": {field: {"type": "string"} for field in SINGLE_TEST_FIELDS},
+            "required": SINGLE_TEST_FIELDS,
+            "additionalProperties": False,
+        }
+        return {
+            "type": "object",
+            "properties": {
+                "language": {"type": "string"},
+                "existing_test_function_signature": {"type": "string"},
+                "new_tests": {"type": "array", "items": single_test, "minItems": 1, "maxItems": max_tests},
+            },
+            "required": NEW_TESTS_FIELDS,
+            "additionalProperties": False,
+        }
+
+    @classmethod
+    def response_format(cls, max_tests: int) -> dict:
+        """
+        Get the `response_format` completion parameter that constrains the response to the schema.
+        """
+        return {
+            "type": "json_schema",
+            "json_schema": {"name": "NewTests", "schema": cls.json_schema(max_tests), "strict": True},
+        }
+
+    @classmethod
+    def parse(cls, response: str) -> Optional[dict]:
+        """
+        Parse a structured response, and check it against the schema.
+
+        Returns:
+            dict: The new tests, or None if the response is not a JSON object of the schema (e.g. when the model did not
+                  use structured output), for the caller to fall back to `load_yaml`.
+        """
+        match = cls._CODE_FENCE_PATTERN.match(response)
+        if match:
+            response = match.group(1)
+        try:
+            data = json.loads(response)
+        except ValueError:
+            return None
+        if not isinstance(data, dict) or not isinstance(data.get("new_tests"), list):
+            return None
+        for test in data["new_tests"]:
+            if not isinstance(test, dict) or not all(isinstance(test.get(field), str) for field in REQUIRED_SINGLE_TEST_FIELDS):
+                return None
+        return data
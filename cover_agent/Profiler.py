@@ -0,0 +1,117 @@
+import asyncio
+import json
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from functools import wraps
+
+
+class Profiler:
+    """
+    Collects the wall-clock time spent in the phases of a run (LLM calls, test commands, coverage parsing, ...).
+
+    Profiling is disabled by default. When disabled, `span` and the functions decorated with `timed` only check the
+    `enabled` flag before doing their actual work, and nothing is recorded.
+    """
+
+    enabled = False
+    _durations = defaultdict(list)
+    _lock = threading.Lock()
+
+    @classmethod
+    def enable(cls):
+        cls.enabled = True
+
+    @classmethod
+    def disable(cls):
+        cls.enabled = False
+
+    @classmethod
+    def reset(cls):
+        with cls._lock:
+            cls._durations = defaultdict(list)
+
+    @classmethod
+    def record(cls, phase: str, seconds: float):
+        with cls._lock:
+            cls._durations[phase].append(seconds)
+
+    @classmethod
+    @contextmanager
+    def span(cls, phase: str):
+        """
+        Time the enclosed block as one occurrence of `phase`.
+        """
+        if not cls.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            cls.record(phase, time.perf_counter() - start)
+
+    @classmethod
+    def timed(cls, phase: str):
+        """
+        Decorator that times every call of a function (or coroutine function) as one occurrence of `phase`.
+        """
+
+        def decorator(func):
+            if asyncio.iscoroutinefunction(func):
+                @wraps(func)
+                async def async_wrapper(*args, **kwargs):
+                    if not cls.enabled:
+                        return await func(*args, **kwargs)
+                    start = time.perf_counter()
+                    try:
+                        return await func(*args, **kwargs)
+                    finally:
+                        cls.record(phase, time.perf_counter() - start)
+
+                return async_wrapper
+
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                if not cls.enabled:
+                    return func(*args, **kwargs)
+                start = time.perf_counter()
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    cls.record(phase, time.perf_counter() - start)
+
+            return wrapper
+
+        return decorator
+
+    @classmethod
+    def summary(cls) -> dict:
+        """
+        Returns:
+            dict: For every phase, sorted by total time: the number of occurrences, and the total, p50, p95 and max durations in seconds.
+        """
+        with cls._lock:
+            durations = {phase: sorted(values) for phase, values in cls._durations.items()}
+        summary = {}
+        for phase, values in sorted(durations.items(), key=lambda item: sum(item[1]), reverse=True):
+            summary[phase] = {
+                "count": len(values),
+                "total_seconds": round(sum(values), 4),
+                "p50_seconds": round(cls._percentile(values, 50), 4),
+                "p95_seconds": round(cls._percentile(values, 95), 4),
+                "max_seconds": round(values[-1], 4),
+            }
+        return summary
+
+    @classmethod
+    def write_json(cls, file_path: str):
+        with open(file_path, "w") as f:
+            json.dump(cls.summary(), f, indent=2)
+
+    @staticmethod
+    def _percentile(sorted_values: list, percentile: float) -> float:
+        # Nearest-rank percentile
+        rank = max(1, -(-len(sorted_values) * percentile // 100))
+        return sorted_values[int(rank) - 1]
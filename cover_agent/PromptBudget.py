@@ -0,0 +1,146 @@
+from typing import Callable, List, Optional
+
+from cover_agent.settings.config_loader import get_settings
+from cover_agent.settings.token_handling import TokenEncoder
+
+TRUNCATED_TEXT = "\n...(truncated)"
+OMITTED_LINES_TEXT = "..."
+
+
+class PromptBudget:
+    """
+    Exact token accounting for the sections of a prompt, used to fit a prompt into the input token budget of a model.
+
+    Tokens are counted with the cached `TokenEncoder`, rather than estimated from the number of characters. The helpers
+    below shrink a section to a given number of tokens in the ways that keep it useful: clipping a text, keeping the
+    most recent entries of a list, or keeping only the lines of a file around its lines of interest.
+    """
+
+    def __init__(self, max_tokens: int):
+        """
+        Parameters:
+            max_tokens (int): The maximal number of input tokens of a prompt.
+        """
+        self.max_tokens = max_tokens
+        self.encoder = TokenEncoder.get_token_encoder()
+
+    @classmethod
+    def for_model(cls, model: str) -> Optional["PromptBudget"]:
+        """
+        Get the budget of a model, from the `[prompt_budget]` section of the configuration.
+
+        Returns:
+            PromptBudget: The budget of the model, or None if prompt budgets are disabled.
+        """
+        settings = get_settings()
+        if not settings.get("prompt_budget.enabled", False):
+            return None
+        models = settings.get("prompt_budget.models", {}) or {}
+        max_tokens = models.get(model) if model else None
+        if max_tokens is None:
+            max_tokens = settings.get("prompt_budget.max_prompt_tokens", 100000)
+        return cls(int(max_tokens))
+
+    def count(self, text: str) -> int:
+        return len(self.encoder.encode(text)) if text else 0
+
+    def clip(self, text: str, max_tokens: int) -> str:
+        """
+        Clip a text to at most `max_tokens` tokens, marking it as truncated.
+
+        Returns:
+            str: The text if it fits, its longest prefix that fits with the truncation marker, or "" if nothing fits.
+        """
+        tokens = self.encoder.encode(text) if text else []
+        if len(tokens) <= max_tokens:
+            return text
+        keep = max_tokens - self.count(TRUNCATED_TEXT)
+        if keep <= 0:
+            return ""
+        clipped = self.encoder.decode(tokens[:keep]) + TRUNCATED_TEXT
+        # Decoding and encoding again does not always give the same tokens
+        while keep > 0 and self.count(clipped) > max_tokens:
+            keep -= 1
+            clipped = self.encoder.decode(tokens[:keep]) + TRUNCATED_TEXT
+        return clipped if keep > 0 else ""
+
+    def keep_recent(self, entries: List[str], render: Callable[[List[str]], str], max_tokens: int) -> str:
+        """
+        Keep the most recent entries of a list (the last ones) that fit in `max_tokens` tokens.
+
+        Parameters:
+            entries (List[str]): The entries, from the oldest to the most recent.
+            render (Callable): Renders the section from the kept entries.
+            max_tokens (int): The budget of the section.
+
+        Returns:
+            str: The rendered section, or "" if not even the most recent entry fits.
+        """
+        low, high = 0, len(entries)
+        # Binary search of the largest number of recent entries that fits
+        while low < high:
+            middle = (low + high + 1) // 2
+            if self.count(render(entries[-middle:])) <= max_tokens:
+                low = middle
+            else:
+                high = middle - 1
+        return render(entries[-low:]) if low else ""
+
+    def window_lines(self, lines: List[str], lines_of_interest: List[int], max_tokens: int) -> str:
+        """
+        Keep the lines of interest of a file and as many lines around them as fit in `max_tokens` tokens. Omitted lines
+        are replaced by "...".
+
+        Parameters:
+            lines (List[str]): The lines of the file.
+            lines_of_interest (List[int]): The numbers of the lines to keep first (1-based). The first lines of the file are
+                                           kept instead when there are none.
+            max_tokens (int): The budget of the file.
+
+        Returns:
+            str: The windowed file.
+        """
+        indices = sorted({line - 1 for line in lines_of_interest if 0 < line <= len(lines)})
+        if not indices:
+            return self._first_lines(lines, list(range(len(lines))), max_tokens)
+
+        # Binary search of the largest context radius around the lines of interest that fits
+        low, high = -1, len(lines)
+        while low < high:
+            middle = (low + high + 1) // 2
+            if self.count(self._window(lines, indices, middle)) <= max_tokens:
+                low = middle
+            else:
+                high = middle - 1
+        if low >= 0:
+            return self._window(lines, indices, low)
+
+        # Not even the lines of interest fit: keep the first ones
+        return self._first_lines(lines, indices, max_tokens)
+
+    def _first_lines(self, lines: List[str], indices: List[int], max_tokens: int) -> str:
+        # Binary search of the largest number of the first lines of `indices` that fits
+        low, high = 0, len(indices)
+        while low < high:
+            middle = (low + high + 1) // 2
+            if self.count(self._window(lines, indices[:middle], 0)) <= max_tokens:
+                low = middle
+            else:
+                high = middle - 1
+        return self._window(lines, indices[:low], 0) if low else ""
+
+    @staticmethod
+    def _window(lines: List[str], indices: List[int], radius: int) -> str:
+        kept = []
+        next_index = 0
+        for index in indices:
+            start, end = max(index - radius, next_index), min(index + radius + 1, len(lines))
+            if start >= end:
+                continue
+            if start > next_index:
+                kept.append(OMITTED_LINES_TEXT)
+            kept.extend(lines[start:end])
+            next_index = end
+        if next_index < len(lines):
+            kept.append(OMITTED_LINES_TEXT)
+        return "\n".join(kept)
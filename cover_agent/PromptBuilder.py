@@ -1,14 +1,19 @@
 import logging
 import os
+import re
 
-from jinja2 import Environment, StrictUndefined
+from jinja2 import Environment, StrictUndefined, meta
 
 from cover_agent.AICaller import AICaller
+from cover_agent.PromptBudget import PromptBudget
 from cover_agent.settings.config_loader import get_settings
 from cover_agent.utils import load_yaml
 
 MAX_TESTS_PER_RUN = 4
 
+# Rendered by the prompt template where its stable prefix ends, and removed from the prompt by `build_prompt`
+CACHE_BREAKPOINT = "<<cover-agent-cache-breakpoint>>"
+
 # Markdown text used as conditional appends
 ADDITIONAL_INCLUDES_TEXT = """
 ## Additional Includes
@@ -46,6 +51,11 @@ class PromptBuilder:
         language: str = "python",
         testing_framework: str = "NOT KNOWN",
         project_root: str = "",
+        included_file_paths: list = None,
+        failed_test_run_entries: list = None,
+        model: str = "",
+        source_skeleton: bool = False,
+        structured_output: bool = False,
     ):
         """
         The `PromptBuilder` class is responsible for building a formatted prompt string by replacing placeholders with the actual content of files read during initialization. It takes in various paths and settings as parameters and provides a method to generate the prompt.
@@ -59,6 +69,13 @@ class PromptBuilder:
             additional_instructions (str): The formatted additional instructions section.
             failed_test_runs (str): The formatted failed test runs section.
             language (str): The programming language of the source and test files.
+            included_file_paths (list): The paths of the included files, summarized when they do not fit in the prompt budget.
+            failed_test_run_entries (list): The failed test runs, from the oldest to the most recent, of which only the most
+                                            recent are kept when they do not fit in the prompt budget.
+            model (str): The model the prompt is built for, which selects its token budget (see `[prompt_budget]`).
+            source_skeleton (bool): Send a skeleton of the source file instead of the whole file: the signatures of its
+                                    functions, and the full bodies of the functions that contain missed lines only.
+            structured_output (bool): Ask for the response as a JSON object of the `NewTests` schema instead of YAML.
 
         Methods:
             __init__(self, prompt_template_path: str, source_file_path: str, test_file_path: str, code_coverage_report: str, included_files: str = "", additional_instructions: str = "", failed_test_runs: str = "")
@@ -80,6 +97,10 @@ class PromptBuilder:
         self.code_coverage_report = code_coverage_report
         self.language = language
         self.testing_framework = testing_framework
+        self.included_file_paths = included_file_paths or []
+        self._included_files_summary = None
+        self.model = model
+        self.structured_output = structured_output
 
         # add line numbers to each line in 'source_file'. start from 1
         self.source_file_numbered = "\n".join(
@@ -88,6 +109,9 @@ class PromptBuilder:
         self.test_file_numbered = "\n".join(
             [f"{i + 1} {line}" for i, line in enumerate(self.test_file.split("\n"))]
         )
+        self.source_file_numbered_full = self.source_file_numbered
+        if source_skeleton:
+            self.source_file_numbered = self._source_skeleton()
 
         # Conditionally fill in optional sections
         self.included_files = (
@@ -102,6 +126,9 @@ class PromptBuilder:
             if additional_instructions
             else ""
         )
+        if failed_test_run_entries:
+            failed_test_runs = "".join(failed_test_run_entries)
+        self.failed_test_run_entries = failed_test_run_entries or ([failed_test_runs] if failed_test_runs else [])
         self.failed_test_runs = (
             FAILED_TESTS_TEXT.format(failed_test_runs=failed_test_runs)
             if failed_test_runs
@@ -145,21 +172,188 @@ class PromptBuilder:
             "testing_framework": self.testing_framework,
             "stdout": self.stdout_from_run,
             "stderr": self.stderr_from_run,
+            "cache_breakpoint": CACHE_BREAKPOINT,
+            "structured_output": self.structured_output,
         }
         environment = Environment(undefined=StrictUndefined)
+        system_template = get_settings().test_generation_prompt.system
+        user_template = get_settings().test_generation_prompt.user
         try:
-            system_prompt = environment.from_string(
-                get_settings().test_generation_prompt.system
-            ).render(variables)
-            user_prompt = environment.from_string(
-                get_settings().test_generation_prompt.user
-            ).render(variables)
+            budget = PromptBudget.for_model(self.model)
+            if budget is not None:
+                variables = self._fit_to_budget(budget, variables, environment, system_template, user_template)
+            system_prompt = environment.from_string(system_template).render(variables)
+            user_prompt = environment.from_string(user_template).render(variables)
         except Exception as e:
             logging.error(f"Error rendering prompt: {e}")
             return {"system": "", "user": ""}
 
         # print(f"#### user_prompt:\n\n{user_prompt}")
-        return {"system": system_prompt, "user": user_prompt}
+        prompt = {"system": system_prompt, "user": user_prompt, "prompt_type": "test_generation_prompt"}
+        if CACHE_BREAKPOINT in user_prompt:
+            # The part of the prompt before the breakpoint does not change between iterations, so that providers can serve
+            # it from their prompt cache
+            cache_prefix, rest = user_prompt.split(CACHE_BREAKPOINT, 1)
+            prompt["user"] = cache_prefix + rest.replace(CACHE_BREAKPOINT, "")
+            prompt["cache_prefix"] = cache_prefix
+        return prompt
+
+    def _fit_to_budget(self, budget: PromptBudget, variables: dict, environment, system_template: str, user_template: str) -> dict:
+        """
+        Fit the sections of the prompt into the token budget of the model, by priority.
+
+        The test file, the coverage report and the additional instructions are always kept whole. The remaining budget goes
+        to the source file, then to the failed test runs, then to the included files. A section that does not fit degrades
+        instead of overflowing the context: the source file is windowed around its missed lines, only the most recent
+        failed test runs are kept, and the included files are replaced by summaries of their definitions, then clipped.
+
+        Returns:
+            dict: The variables of the prompt, with the sections that did not fit reduced.
+        """
+        templates = [environment.from_string(template) for template in (system_template, user_template)]
+        referenced = set()
+        for template in (system_template, user_template):
+            referenced |= meta.find_undeclared_variables(environment.parse(template))
+
+        def prompt_tokens(prompt_variables):
+            return sum(budget.count(template.render(prompt_variables)) for template in templates)
+
+        if prompt_tokens(variables) <= budget.max_tokens:
+            return variables
+        # Sections are counted separately, without the text the template adds around non-empty sections: the allocation
+        # is repeated with a budget reduced by the difference, if any
+        max_tokens = budget.max_tokens
+        for _ in range(3):
+            fitted_variables = self._allocate_budget(budget, max_tokens, variables, referenced, prompt_tokens)
+            excess_tokens = prompt_tokens(fitted_variables) - budget.max_tokens
+            if excess_tokens <= 0:
+                break
+            max_tokens -= excess_tokens
+        return fitted_variables
+
+    def _allocate_budget(self, budget: PromptBudget, max_tokens: int, variables: dict, referenced: set, prompt_tokens) -> dict:
+        def section_tokens(names):
+            return sum(budget.count(variables[name]) for name in names if name in referenced)
+
+        variables = dict(variables)
+        sections = [
+            "source_file_numbered", "source_file", "test_file_numbered", "test_file", "code_coverage_report",
+            "failed_tests_section", "additional_includes_section", "additional_instructions_text",
+        ]
+        # Tokens left once the prompt without any of the sections, and the sections that are always kept whole, are counted
+        remaining = max_tokens - prompt_tokens(dict(variables, **{name: "" for name in sections}))
+        remaining -= section_tokens(["test_file_numbered", "test_file", "code_coverage_report", "additional_instructions_text"])
+
+        # Source file
+        source_tokens = section_tokens(["source_file_numbered", "source_file"])
+        if source_tokens > max(remaining, 0):
+            missed_lines = self._missed_lines()
+            source_sections = [name for name in ("source_file_numbered", "source_file") if name in referenced]
+            full_sources = {"source_file_numbered": self.source_file_numbered_full, "source_file": self.source_file}
+            for name in source_sections:
+                variables[name] = budget.window_lines(
+                    full_sources[name].split("\n"), missed_lines, max(remaining, 0) // len(source_sections)
+                )
+            logging.info(
+                f"Prompt budget: source file windowed around {len(missed_lines)} missed lines, from {source_tokens} to {section_tokens(source_sections)} tokens"
+            )
+        remaining -= section_tokens(["source_file_numbered", "source_file"])
+
+        # Failed test runs, the most recent first
+        failed_tests_tokens = section_tokens(["failed_tests_section"])
+        if failed_tests_tokens > max(remaining, 0):
+            variables["failed_tests_section"] = budget.keep_recent(
+                self.failed_test_run_entries,
+                lambda entries: FAILED_TESTS_TEXT.format(failed_test_runs="".join(entries)),
+                max(remaining, 0),
+            )
+            logging.info(
+                f"Prompt budget: failed test runs reduced from {failed_tests_tokens} to {section_tokens(['failed_tests_section'])} tokens"
+            )
+        remaining -= section_tokens(["failed_tests_section"])
+
+        # Included files: whole, summarized, clipped, or dropped
+        included_tokens = section_tokens(["additional_includes_section"])
+        if included_tokens > max(remaining, 0):
+            summaries = self._summarize_included_files()
+            if summaries:
+                included_files = ADDITIONAL_INCLUDES_TEXT.format(included_files=summaries)
+            else:
+                included_files = variables["additional_includes_section"]
+            included_files = budget.clip(included_files, max(remaining, 0))
+            variables["additional_includes_section"] = included_files
+            logging.info(
+                f"Prompt budget: included files reduced from {included_tokens} to {section_tokens(['additional_includes_section'])} tokens"
+            )
+        return variables
+
+    def _missed_lines(self) -> list:
+        # The coverage report of the prompt is formatted as "Lines missed: [...]" when the report could be parsed
+        match = re.search(r"Lines missed: \[([\d,\s]*)\]", self.code_coverage_report or "")
+        if not match:
+            return []
+        return [int(line) for line in match.group(1).split(",") if line.strip()]
+
+    def _source_skeleton(self) -> str:
+        """
+        Build the skeleton of the numbered source file: the bodies of the functions without missed lines are replaced by
+        "...", while the code outside functions, the signatures of all functions, and the functions that contain missed
+        lines are kept whole, with their original line numbers.
+
+        Returns:
+            str: The skeleton, or the whole numbered source file when the missed lines or the functions are not known.
+        """
+        missed_lines = set(self._missed_lines())
+        if not missed_lines:
+            return self.source_file_numbered
+        # Imported here, as tree-sitter is only needed for skeletons
+        from cover_agent.lsp_logic.file_map.file_map import FileMap
+
+        try:
+            function_ranges = FileMap(self.source_file_path).function_ranges()
+        except Exception as e:
+            logging.warning(f"Could not find the functions of {self.source_file_path}, sending the whole source file: {e}")
+            return self.source_file_numbered
+
+        lines = self.source_file_numbered.split("\n")
+        hidden = [False] * len(lines)
+        outer_function_end = -1
+        for start, body_start, end in sorted(function_ranges):
+            if start <= outer_function_end:
+                # Nested functions are kept or hidden with the function that contains them
+                continue
+            outer_function_end = end
+            if not any(start + 1 <= line <= end + 1 for line in missed_lines):
+                for i in range(body_start, min(end + 1, len(lines))):
+                    hidden[i] = True
+
+        skeleton = []
+        for i, line in enumerate(lines):
+            if not hidden[i]:
+                skeleton.append(line)
+            elif i == 0 or not hidden[i - 1]:
+                skeleton.append("...")
+        return "\n".join(skeleton)
+
+    def _summarize_included_files(self) -> str:
+        if self._included_files_summary is not None:
+            return self._included_files_summary
+        # Imported here, as tree-sitter is only needed when included files must be summarized
+        from cover_agent.lsp_logic.file_map.file_map import FileMap
+
+        summaries = []
+        for file_path in self.included_file_paths:
+            try:
+                summary = FileMap(
+                    file_path, parent_context=False, child_context=False, header_max=0, project_base_path=self.project_root or None
+                ).summarize()
+            except Exception as e:
+                logging.warning(f"Could not summarize included file {file_path}: {e}")
+                continue
+            if summary.strip():
+                summaries.append(summary.strip())
+        self._included_files_summary = "\n\n".join(summaries)
+        return self._included_files_summary
 
     def build_prompt_custom(self, file) -> dict:
         """
@@ -203,23 +397,31 @@ class PromptBuilder:
             logging.error(f"Error rendering prompt: {e}")
             return {"system": "", "user": ""}
 
-        return {"system": system_prompt, "user": user_prompt}
+        # The prompt type selects the model of the call, see the `[model_routing]` configuration
+        return {"system": system_prompt, "user": user_prompt, "prompt_type": file}
 
 
-def adapt_test_command_for_a_single_test_via_ai(args, test_file_relative_path, test_command):
+def adapt_test_command_for_a_single_test_via_ai(args, test_file_relative_path, test_command, response_cache=None):
     try:
         variables = {"project_root_dir": args.test_command_dir,
                      "test_file_relative_path": test_file_relative_path,
                      "test_command": test_command,
                      }
-        ai_caller = AICaller(model=args.model)
+        ai_caller = AICaller(model=args.model, response_cache=response_cache)
         environment = Environment(undefined=StrictUndefined)
         system_prompt = environment.from_string(get_settings().adapt_test_command_for_a_single_test_via_ai.system).render(
             variables)
         user_prompt = environment.from_string(get_settings().adapt_test_command_for_a_single_test_via_ai.user).render(
             variables)
         response, prompt_token_count, response_token_count = (
-            ai_caller.call_model(prompt={"system": system_prompt, "user": user_prompt}, stream=False)
+            ai_caller.call_model(
+                prompt={
+                    "system": system_prompt,
+                    "user": user_prompt,
+                    "prompt_type": "adapt_test_command_for_a_single_test_via_ai",
+                },
+                stream=False,
+            )
         )
         response_yaml = load_yaml(response)
         new_command_line = response_yaml["new_command_line"].strip()
@@ -0,0 +1,282 @@
+import atexit
+import json
+import os
+import re
+import shlex
+import shutil
+import signal
+import socket
+import subprocess
+import tempfile
+import threading
+import time
+
+from cover_agent.CustomLogger import CustomLogger
+from cover_agent.settings.config_loader import get_settings
+
+
+class PytestWorker:
+    """
+    A long-lived pytest fork-server (see pytest_worker_server.py), used instead of spawning the test command for every run.
+
+    The server is started once per interpreter and working directory, with the Python interpreter of the test command.
+    It imports pytest and its plugins (and the `pytest_worker.preload_modules` from the configuration) a single time, and
+    every run is executed in a forked child process, so runs do not pay for the interpreter and import startup. Modules
+    whose source file changed since they were preloaded, such as the edited test file, are imported again in the child.
+
+    Workers are disabled by default; `Runner.run_command` uses them once `enable` was called. Commands that are not
+    plain pytest invocations (shell operators, environment assignments, other test frameworks, ...) always run as a
+    subprocess.
+    """
+
+    enabled = False
+    # Time given to the server to stop a run that is over its timeout, before the run and the server are killed
+    TIMEOUT_GRACE_SECONDS = 10
+    _workers = {}
+    _lock = threading.Lock()
+    SERVER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "pytest_worker_server.py")
+
+    def __init__(self, interpreter: list, cwd: str, preload_modules: list = None, startup_timeout: float = 60):
+        """
+        Parameters:
+            interpreter (list): The command that runs the Python interpreter of the project (e.g. ["poetry", "run", "python"]).
+            cwd (str): The directory the server is started in.
+            preload_modules (list, optional): Additional modules to import once, in the server. Defaults to None.
+            startup_timeout (float, optional): The maximal time to wait for the server to be ready, in seconds. Defaults to 60.
+        """
+        self.interpreter = interpreter
+        self.cwd = cwd
+        self.preload_modules = preload_modules or []
+        self.startup_timeout = startup_timeout
+        self.logger = CustomLogger.get_logger(__name__)
+        self.process = None
+        self.socket_dir = None
+        self.socket_path = None
+        self._run_lock = threading.Lock()
+
+    @classmethod
+    def enable(cls):
+        cls.enabled = True
+
+    @classmethod
+    def disable(cls):
+        cls.enabled = False
+        cls.stop_all()
+
+    @staticmethod
+    def parse_command(command: str):
+        """
+        Split a pytest test command into the Python interpreter to run the worker with, and the arguments of pytest.
+
+        Returns:
+            tuple: The interpreter command (list), the pytest arguments (list), and whether the working directory must be
+                   added to sys.path (as done by "python -m pytest"); or None if the command is not a plain pytest invocation.
+        """
+        if re.search(r"[;&|<>`$()\n]", command):
+            return None
+        try:
+            tokens = shlex.split(command)
+        except ValueError:
+            return None
+        if not tokens or "=" in tokens[0]:
+            return None
+
+        for i, token in enumerate(tokens):
+            if token == "-m" and i > 0 and tokens[i + 1 : i + 2] == ["pytest"]:
+                interpreter = tokens[:i]
+                if not os.path.basename(interpreter[-1]).startswith("python"):
+                    # e.g. "coverage run -m pytest"
+                    return None
+                return interpreter, tokens[i + 2 :], True
+            if os.path.basename(token) in ("pytest", "py.test"):
+                launcher = tokens[:i]
+                if os.path.dirname(token):
+                    # An executable of a virtual environment, next to its interpreter
+                    interpreter = launcher + [os.path.join(os.path.dirname(token), "python")]
+                else:
+                    interpreter = launcher + [get_settings().get("pytest_worker.python", "python")]
+                return interpreter, tokens[i + 1 :], False
+        return None
+
+    @classmethod
+    def run_command(cls, command: str, cwd: str = None, timeout: float = None):
+        """
+        Run a pytest test command with a warm worker.
+
+        Parameters:
+            command (str): The test command.
+            cwd (str, optional): The working directory of the run. Defaults to the current directory.
+            timeout (float, optional): The maximal runtime of the tests, in seconds. Defaults to None.
+
+        Returns:
+            tuple: The standard output, standard error and exit code of the run, and the CPU time and peak memory of the
+                   forked child with the number of output bytes that were not kept; or None if the command must be run as a subprocess instead (not a plain pytest command,
+                   or the worker is not available).
+        """
+        if os.name != "posix" or not hasattr(socket, "AF_UNIX"):
+            return None
+        parsed = cls.parse_command(command)
+        if parsed is None:
+            return None
+        interpreter, pytest_args, prepend_cwd = parsed
+        cwd = os.path.abspath(cwd or os.getcwd())
+
+        worker = cls._get_worker(interpreter, cwd)
+        if worker is None:
+            return None
+        return worker.run(pytest_args, cwd, prepend_cwd=prepend_cwd, timeout=timeout)
+
+    @classmethod
+    def _get_worker(cls, interpreter: list, cwd: str):
+        key = (tuple(interpreter), cwd)
+        with cls._lock:
+            if cls._workers.get(key) is not None and not cls._workers[key].is_alive():
+                # Killed after a run that did not stop in time: start a new one
+                del cls._workers[key]
+            if key not in cls._workers:
+                if not cls._workers:
+                    atexit.register(cls.stop_all)
+                worker = cls(
+                    interpreter,
+                    cwd,
+                    preload_modules=get_settings().get("pytest_worker.preload_modules", []),
+                    startup_timeout=get_settings().get("pytest_worker.startup_timeout_seconds", 60),
+                )
+                # A worker that fails to start is remembered, so that it is not started again for every run
+                cls._workers[key] = worker if worker.start() else None
+            return cls._workers[key]
+
+    @classmethod
+    def stop_all(cls):
+        with cls._lock:
+            workers = [worker for worker in cls._workers.values() if worker is not None]
+            cls._workers = {}
+        for worker in workers:
+            worker.stop()
+
+    def start(self) -> bool:
+        """
+        Start the server, and wait until it is ready.
+
+        Returns:
+            bool: True if the server is ready, False if it could not be started.
+        """
+        self.socket_dir = tempfile.mkdtemp(prefix="cover_agent_worker_")
+        self.socket_path = os.path.join(self.socket_dir, "worker.sock")
+        command = self.interpreter + [
+            self.SERVER_SCRIPT,
+            "--socket",
+            self.socket_path,
+            "--preload",
+            ",".join(self.preload_modules),
+        ]
+        self.logger.info(f'Starting pytest worker: "{" ".join(command)}" in {self.cwd}')
+        log_path = os.path.join(self.socket_dir, "worker.log")
+        try:
+            with open(log_path, "w") as log_file:
+                self.process = subprocess.Popen(
+                    command, cwd=self.cwd, stdin=subprocess.DEVNULL, stdout=log_file, stderr=subprocess.STDOUT
+                )
+        except OSError as e:
+            self.logger.warning(f"Failed to start the pytest worker, running tests as subprocesses: {e}")
+            self._remove_socket_dir()
+            return False
+
+        deadline = time.monotonic() + self.startup_timeout
+        while not os.path.exists(self.socket_path):
+            if self.process.poll() is not None or time.monotonic() > deadline:
+                with open(log_path, errors="replace") as log_file:
+                    output = log_file.read()
+                self.stop()
+                self.logger.warning(f"The pytest worker did not start, running tests as subprocesses. {output}")
+                return False
+            time.sleep(0.05)
+        return True
+
+    def run(self, pytest_args: list, cwd: str, prepend_cwd: bool = False, timeout: float = None):
+        """
+        Run pytest in a forked child of the server.
+
+        Returns:
+            tuple: The standard output, standard error and exit code of the run, and its resource usage (dict), or None if
+                   the server failed.
+        """
+        request = {
+            "command": "run",
+            "args": pytest_args,
+            "cwd": cwd,
+            "prepend_cwd": prepend_cwd,
+            "timeout": timeout,
+            # The server keeps the same head and tail of a very large output as the Runner does for subprocesses
+            "max_output_bytes": get_settings().get("tests.max_output_bytes", 10 * 1024 * 1024),
+        }
+        # The server runs one request at a time
+        with self._run_lock:
+            child_pid = None
+            try:
+                with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+                    # The server enforces the timeout, but does not get the chance to if the run blocks it
+                    client.settimeout(timeout + self.TIMEOUT_GRACE_SECONDS if timeout else None)
+                    client.connect(self.socket_path)
+                    client.sendall((json.dumps(request) + "\n").encode())
+                    reader = client.makefile("r")
+                    response = json.loads(reader.readline())
+                    if "pid" in response:
+                        child_pid = response["pid"]
+                        response = json.loads(reader.readline())
+            except socket.timeout:
+                self.logger.warning(f"The pytest worker did not stop a run after its timeout of {timeout} seconds, killing it")
+                self._kill(child_pid)
+                return "", "Command timed out", -1, {}
+            except (OSError, ValueError) as e:
+                self.logger.warning(f"The pytest worker failed, running tests as a subprocess: {e}")
+                return None
+
+        if response["exit_code"] is None:
+            self.logger.warning(f"The pytest worker failed, running tests as a subprocess: {response['stderr']}")
+            return None
+        stats = {
+            "cpu_time_seconds": response["cpu_time_seconds"],
+            "peak_memory_mb": response["peak_memory_mb"],
+            "truncated_output_bytes": response.get("truncated_output_bytes", 0),
+        }
+        if response["timed_out"]:
+            return "", "Command timed out", -1, stats
+        return response["stdout"], response["stderr"], response["exit_code"], stats
+
+    def is_alive(self) -> bool:
+        return self.process is not None and self.process.poll() is None
+
+    def _kill(self, child_pid: int = None):
+        """
+        Kill the process group of a run, and the server (it is started again for the next run).
+        """
+        if child_pid:
+            try:
+                os.killpg(child_pid, signal.SIGKILL)
+            except OSError:
+                pass
+        if self.is_alive():
+            self.process.kill()
+            self.process.wait()
+        self._remove_socket_dir()
+
+    def stop(self):
+        if self.process and self.process.poll() is None:
+            try:
+                with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+                    client.connect(self.socket_path)
+                    client.sendall((json.dumps({"command": "stop"}) + "\n").encode())
+            except OSError:
+                pass
+            try:
+                self.process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+                self.process.wait()
+        self._remove_socket_dir()
+
+    def _remove_socket_dir(self):
+        if self.socket_dir:
+            shutil.rmtree(self.socket_dir, ignore_errors=True)
+            self.socket_dir = None
@@ -0,0 +1,165 @@
+import asyncio
+import json
+import os
+import threading
+import time
+from typing import Optional
+
+from cover_agent.CustomLogger import CustomLogger
+from cover_agent.settings.config_loader import get_settings
+
+try:
+    import fcntl
+except ImportError:  # Not available on Windows: the limits then only apply within the process
+    fcntl = None
+
+
+class RateLimiter:
+    """
+    Requests-per-minute and tokens-per-minute limits on the LLM calls, shared by all the AICaller instances of the process,
+    and optionally by several processes.
+
+    Both limits are token buckets, refilled continuously and holding at most one minute of budget. A call reserves one
+    request and its estimated prompt tokens, then waits until the buckets are no longer in debt, instead of hitting the
+    provider and being answered with a 429. Reservations are taken in order, so concurrent callers wait in turn rather
+    than all at once. Once the call is done, the estimate is replaced by the actual number of tokens used.
+
+    When a state file is configured, the buckets are kept in that file under an exclusive lock, so that agents running in
+    separate processes (e.g. several cover-agent runs on one machine) share the same limits.
+    """
+
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    def __init__(self, requests_per_minute: int = 0, tokens_per_minute: int = 0, state_file: str = ""):
+        """
+        Parameters:
+            requests_per_minute (int, optional): The maximal number of requests per minute, 0 for no limit. Defaults to 0.
+            tokens_per_minute (int, optional): The maximal number of tokens per minute, 0 for no limit. Defaults to 0.
+            state_file (str, optional): A file shared with other processes to keep the buckets in. Defaults to "" (buckets
+                                        kept in memory, for this process only).
+        """
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.logger = CustomLogger.get_logger(__name__)
+        if state_file and fcntl is None:
+            self.logger.warning("File locks are not supported on this platform: rate limits only apply within the process")
+            state_file = ""
+        self.state_file = state_file
+        self._lock = threading.Lock()
+        self._state = {"requests": requests_per_minute, "tokens": tokens_per_minute, "updated": time.time()}
+
+        # Statistics about the current run
+        self.requests = 0
+        self.delayed_requests = 0
+        self.total_wait_seconds = 0.0
+
+    @classmethod
+    def get_rate_limiter(cls) -> Optional["RateLimiter"]:
+        """
+        Get the rate limiter of the process, configured by the `[rate_limit]` section of the configuration.
+
+        Returns:
+            RateLimiter: The rate limiter, or None if neither limit is set.
+        """
+        if cls._instance is None:  # Check without acquiring the lock for performance
+            with cls._instance_lock:
+                if cls._instance is None:
+                    settings = get_settings()
+                    cls._instance = cls(
+                        requests_per_minute=settings.get("rate_limit.requests_per_minute", 0),
+                        tokens_per_minute=settings.get("rate_limit.tokens_per_minute", 0),
+                        state_file=settings.get("rate_limit.state_file", ""),
+                    )
+        if not cls._instance.requests_per_minute and not cls._instance.tokens_per_minute:
+            return None
+        return cls._instance
+
+    def acquire(self, tokens: int) -> float:
+        """
+        Reserve a request and `tokens` tokens, and wait until the limits allow them.
+
+        Returns:
+            float: The time waited, in seconds.
+        """
+        delay = self._reserve(tokens)
+        if delay > 0:
+            time.sleep(delay)
+        return delay
+
+    async def acquire_async(self, tokens: int) -> float:
+        """
+        Asynchronous version of `acquire`, which does not block the event loop while waiting.
+        """
+        delay = self._reserve(tokens)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        return delay
+
+    def settle(self, estimated_tokens: int, actual_tokens: int):
+        """
+        Replace the estimated number of tokens of a call by the number of tokens it actually used.
+        """
+        if self.tokens_per_minute and actual_tokens != estimated_tokens:
+            self._update(lambda state, now: self._take(state, now, 0, actual_tokens - estimated_tokens))
+
+    def _reserve(self, tokens: int) -> float:
+        delay = self._update(lambda state, now: self._take(state, now, 1, tokens))
+        with self._lock:
+            self.requests += 1
+            if delay > 0:
+                self.delayed_requests += 1
+                self.total_wait_seconds += delay
+        return delay
+
+    def _take(self, state: dict, now: float, requests: int, tokens: int) -> float:
+        """
+        Refill the buckets for the time elapsed since their last update, and take `requests` requests and `tokens` tokens.
+
+        Returns:
+            float: The time until the buckets are no longer in debt, in seconds.
+        """
+        elapsed = max(now - state.get("updated", now), 0.0)
+        state["updated"] = now
+        delay = 0.0
+        for key, per_minute, amount in (
+            ("requests", self.requests_per_minute, requests),
+            ("tokens", self.tokens_per_minute, tokens),
+        ):
+            if not per_minute:
+                continue
+            rate = per_minute / 60
+            # A single call larger than the limit waits for a full bucket, not for longer
+            amount = min(amount, per_minute)
+            level = min(state.get(key, per_minute) + elapsed * rate, per_minute)
+            # A negative amount gives back over-estimated tokens: the bucket still holds at most one minute of budget
+            state[key] = min(level - amount, per_minute)
+            if state[key] < 0:
+                delay = max(delay, -state[key] / rate)
+        return delay
+
+    def _update(self, update):
+        with self._lock:
+            if not self.state_file:
+                return update(self._state, time.time())
+            # Buckets shared with other processes
+            with open(self.state_file, "a+") as f:
+                fcntl.flock(f, fcntl.LOCK_EX)
+                try:
+                    f.seek(0)
+                    content = f.read()
+                    try:
+                        state = json.loads(content) if content.strip() else dict(self._state)
+                    except ValueError:
+                        # A corrupt or truncated file is replaced, instead of failing every LLM call
+                        self.logger.warning(f"Invalid rate limit state in {self.state_file}, resetting it")
+                        state = dict(self._state)
+                    result = update(state, time.time())
+                    f.seek(0)
+                    f.truncate()
+                    f.write(json.dumps(state))
+                    f.flush()
+                    os.fsync(f.fileno())
+                finally:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+            return result
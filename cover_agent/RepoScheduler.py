@@ -0,0 +1,249 @@
+import asyncio
+import copy
+import json
+import os
+import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from cover_agent.AICaller import AICaller
+from cover_agent.CoverAgent import CoverAgent
+from cover_agent.CustomLogger import CustomLogger
+from cover_agent.Profiler import Profiler
+from cover_agent.SandboxPool import SandboxPool
+from cover_agent.settings.config_loader import get_settings
+from cover_agent.UnitTestDB import UnitTestDB
+
+
+class RepoScheduler:
+    def __init__(self, args, context_helper, ai_caller: AICaller, max_concurrent_agents: int = 1):
+        """
+        Schedules the extension of all the test files of a repository as a pipeline of three stages:
+
+        1. LSP context discovery, which runs ahead of the other stages, one test file at a time (the language server is shared).
+        2. LLM analysis of each test file against its context files, for several test files concurrently.
+        3. CoverAgent runs, on a bounded pool of `max_concurrent_agents` workers.
+
+        When more than one agent runs at a time, each agent works in its own sandbox copy of the project (see SandboxPool),
+        so agents never see each other's test files or overwrite each other's coverage reports. The extended test file is
+        copied back to the project when the agent is done.
+
+        Parameters:
+            args (Namespace): The parsed command-line arguments of the full-repository run.
+            context_helper (ContextHelper): The context helper, with a started language server.
+            ai_caller (AICaller): The AI caller used for the analysis stage.
+            max_concurrent_agents (int, optional): The maximal number of CoverAgent runs at a time. Defaults to 1.
+        """
+        self.args = args
+        self.context_helper = context_helper
+        self.ai_caller = ai_caller
+        self.max_concurrent_agents = max(1, max_concurrent_agents)
+        self.max_pending_analyses = get_settings().get("repo_scheduler.max_pending_analyses", 8)
+        self.logger = CustomLogger.get_logger(__name__)
+
+        # All the agents log their attempts to the same database, and a single report is generated at the end
+        if not self.args.log_db_path:
+            self.args.log_db_path = "cover_agent_unit_test_runs.db"
+        self.args.log_db_path = os.path.abspath(self.args.log_db_path)
+
+        self.sandbox_pool = None
+
+        # The agents share the profiler, whose summary covers the whole run and is written once, at the end
+        self.profile_output = getattr(self.args, "profile_output", None)
+        if self.profile_output:
+            Profiler.enable()
+
+    async def run(self, test_files: list) -> dict:
+        """
+        Extend all the given test files.
+
+        Parameters:
+            test_files (list): The test files to extend.
+
+        Returns:
+            dict: The consolidated summary of the run (see `build_summary`).
+        """
+        start_time = time.time()
+        if self.max_concurrent_agents > 1:
+            self.sandbox_pool = SandboxPool(
+                self.args.project_root,
+                size=self.max_concurrent_agents,
+                link_mode=get_settings().get("sandbox.link_mode", "copy"),
+                ignore_patterns=get_settings().get("sandbox.ignore_patterns", []),
+            )
+            self.sandbox_pool.create()
+
+        executor = ThreadPoolExecutor(max_workers=self.max_concurrent_agents, thread_name_prefix="cover-agent")
+        pending_analyses = asyncio.Semaphore(self.max_pending_analyses)
+        jobs = []
+        try:
+            # Stage 1: context discovery runs ahead, while the analyses and agent runs of previous files proceed
+            for test_file in test_files:
+                await pending_analyses.acquire()
+                context_files = await self.context_helper.find_test_file_context(test_file)
+                print("Context files for test file '{}':\n{}".format(test_file, ''.join(f"{f}\n" for f in context_files)))
+                jobs.append(asyncio.create_task(self._process_test_file(test_file, context_files, pending_analyses, executor)))
+            results = await asyncio.gather(*jobs)
+        finally:
+            executor.shutdown(wait=True)
+            if self.sandbox_pool:
+                self.sandbox_pool.cleanup()
+
+        profile = None
+        if self.profile_output:
+            Profiler.write_json(self.profile_output)
+            profile = Profiler.summary()
+        if self.args.report_filepath:
+            UnitTestDB(db_connection_string=f"sqlite:///{self.args.log_db_path}").dump_to_report(
+                self.args.report_filepath, profile=profile
+            )
+        return self.build_summary(results, time.time() - start_time)
+
+    async def _process_test_file(self, test_file, context_files: list, pending_analyses: asyncio.Semaphore, executor) -> dict:
+        try:
+            # Stage 2: analyze the test file against its context files
+            source_file, context_files_include = await self.context_helper.analyze_context(
+                test_file, context_files, self.ai_caller
+            )
+        finally:
+            pending_analyses.release()
+
+        result = {
+            "test_file": str(test_file),
+            "source_file": str(source_file) if source_file else None,
+            "status": "skipped",
+            "error": "",
+            "final_coverage": None,
+            "input_tokens": 0,
+            "cached_input_tokens": 0,
+            "output_tokens": 0,
+            "duration_seconds": 0.0,
+        }
+        if not source_file:
+            result["error"] = "Not a unit test file"
+            return result
+
+        # Stage 3: run the agent on the worker pool
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            executor, self._run_agent, test_file, source_file, context_files_include, result
+        )
+
+    def _run_agent(self, test_file, source_file, context_files_include: list, result: dict) -> dict:
+        start_time = time.time()
+        args_copy = copy.deepcopy(self.args)
+        args_copy.source_file_path = str(source_file)
+        args_copy.test_command_dir = self.args.project_root
+        args_copy.test_file_path = str(test_file)
+        args_copy.included_files = [str(f) for f in context_files_include]
+        args_copy.profile_output = None
+
+        sandbox_root = self.sandbox_pool.acquire() if self.sandbox_pool else None
+        agent = None
+        try:
+            if sandbox_root:
+                self._map_args_to_sandbox(args_copy, sandbox_root)
+            agent = CoverAgent(args_copy)
+            try:
+                agent.run()
+                result["status"] = "completed"
+            except SystemExit:
+                # Raised by CoverAgent when --strict-coverage is set and the desired coverage is not reached
+                result["status"] = "below_target"
+            result["final_coverage"] = agent.test_validator.current_coverage
+            result["input_tokens"] = agent.test_gen.total_input_token_count + agent.test_validator.total_input_token_count
+            result["cached_input_tokens"] = (
+                agent.test_gen.ai_caller.total_cached_prompt_tokens + agent.test_validator.ai_caller.total_cached_prompt_tokens
+            )
+            result["output_tokens"] = agent.test_gen.total_output_token_count + agent.test_validator.total_output_token_count
+            if sandbox_root:
+                self._copy_test_file_back(args_copy, sandbox_root, test_file)
+        except Exception as e:
+            print(f"Error running CoverAgent for test file '{test_file}': {e}")
+            result["status"] = "failed"
+            result["error"] = str(e)
+        finally:
+            if agent is not None and agent.response_cache:
+                agent.response_cache.close()
+            if sandbox_root:
+                self._reset_sandbox_test_file(sandbox_root, test_file)
+                self.sandbox_pool.release(sandbox_root)
+        result["duration_seconds"] = round(time.time() - start_time, 2)
+        return result
+
+    def _map_args_to_sandbox(self, args_copy, sandbox_root: str):
+        pool = self.sandbox_pool
+        args_copy.project_root = sandbox_root
+        args_copy.test_command_dir = sandbox_root
+        args_copy.source_file_path = pool.map_path(args_copy.source_file_path, sandbox_root)
+        args_copy.test_file_path = pool.map_path(args_copy.test_file_path, sandbox_root)
+        if args_copy.test_file_output_path:
+            args_copy.test_file_output_path = pool.map_path(args_copy.test_file_output_path, sandbox_root)
+        args_copy.included_files = [
+            pool.map_path(f, sandbox_root) if pool.contains(f) else f for f in args_copy.included_files
+        ]
+        if pool.contains(args_copy.code_coverage_report_path):
+            args_copy.code_coverage_report_path = pool.map_path(args_copy.code_coverage_report_path, sandbox_root)
+        else:
+            self.logger.warning(
+                f"Coverage report {args_copy.code_coverage_report_path} is outside the project root, and is shared by concurrent agents"
+            )
+        args_copy.test_command = pool.map_command(args_copy.test_command, sandbox_root)
+        # The consolidated report is generated once, at the end of the run
+        args_copy.report_filepath = os.path.join(sandbox_root, "cover_agent_report.html")
+
+    def _copy_test_file_back(self, args_copy, sandbox_root: str, test_file):
+        sandbox_output = args_copy.test_file_output_path or args_copy.test_file_path
+        shutil.copyfile(sandbox_output, self.args.test_file_output_path or str(test_file))
+
+    def _reset_sandbox_test_file(self, sandbox_root: str, test_file):
+        # The next agent running in this sandbox must see the original test file
+        original_test_file = os.path.abspath(str(test_file))
+        with open(original_test_file, "r") as f:
+            original_content = f.read()
+        SandboxPool.write_file(self.sandbox_pool.map_path(original_test_file, sandbox_root), original_content)
+
+    @staticmethod
+    def build_summary(results: list, duration_seconds: float) -> dict:
+        """
+        Build the consolidated summary of a full-repository run.
+
+        Parameters:
+            results (list): The result of every test file.
+            duration_seconds (float): The duration of the whole run.
+
+        Returns:
+            dict: The totals of the run, and the result of every test file.
+        """
+        return {
+            "test_files": len(results),
+            "completed": sum(1 for r in results if r["status"] == "completed"),
+            "below_target": sum(1 for r in results if r["status"] == "below_target"),
+            "skipped": sum(1 for r in results if r["status"] == "skipped"),
+            "failed": sum(1 for r in results if r["status"] == "failed"),
+            "total_input_tokens": sum(r["input_tokens"] for r in results),
+            "total_cached_input_tokens": sum(r["cached_input_tokens"] for r in results),
+            "total_output_tokens": sum(r["output_tokens"] for r in results),
+            "duration_seconds": round(duration_seconds, 2),
+            "results": results,
+        }
+
+    @staticmethod
+    def write_summary(summary: dict, summary_path: str):
+        """
+        Print the consolidated summary, and write it as JSON to `summary_path`.
+        """
+        print("============\nSummary:")
+        for result in summary["results"]:
+            coverage = (
+                f"{round(result['final_coverage'] * 100, 2)}%" if result["final_coverage"] is not None else "-"
+            )
+            print(f"{result['status']:<13} {coverage:>8}  {result['test_file']}")
+        print(
+            f"{summary['completed']} completed, {summary['below_target']} below target, {summary['skipped']} skipped, "
+            f"{summary['failed']} failed, in {summary['duration_seconds']} seconds"
+        )
+        if summary_path:
+            with open(summary_path, "w") as f:
+                json.dump(summary, f, indent=2)
+            print(f"Summary written to {summary_path}")
@@ -85,6 +85,29 @@ class ReportGenerator:
             </tr>
             {% endfor %}
         </table>
+        {% if profile %}
+        <h2>Profile</h2>
+        <table>
+            <tr>
+                <th>Phase</th>
+                <th>Count</th>
+                <th>Total (s)</th>
+                <th>p50 (s)</th>
+                <th>p95 (s)</th>
+                <th>Max (s)</th>
+            </tr>
+            {% for phase, stats in profile.items() %}
+            <tr>
+                <td>{{ phase }}</td>
+                <td>{{ stats.count }}</td>
+                <td>{{ stats.total_seconds }}</td>
+                <td>{{ stats.p50_seconds }}</td>
+                <td>{{ stats.p95_seconds }}</td>
+                <td>{{ stats.max_seconds }}</td>
+            </tr>
+            {% endfor %}
+        </table>
+        {% endif %}
         <script src="https://cdnjs.cloudflare.com/ajax/libs/prism/1.23.0/prism.min.js"></script>
     </body>
     </html>
@@ -152,19 +175,20 @@ class ReportGenerator:
         return '\n'.join(diff_html)
 
     @classmethod
-    def generate_report(cls, results, file_path):
+    def generate_report(cls, results, file_path, profile=None):
         """
         Renders the HTML report with given results and writes to a file.
 
         :param results: List of dictionaries with test results.
         :param file_path: Path to the HTML file where the report will be written.
+        :param profile: Optional per-phase timings of the run (see Profiler.summary), rendered after the results.
         """
         # Generate the full diff for each result
         for result in results:
             result['full_diff'] = cls.generate_full_diff(result['original_test_file'], result['processed_test_file'])
 
         template = Template(cls.HTML_TEMPLATE)
-        html_content = template.render(results=results)
+        html_content = template.render(results=results, profile=profile)
 
         with open(file_path, "w") as file:
             file.write(html_content)
@@ -0,0 +1,178 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+
+from cover_agent.CustomLogger import CustomLogger
+from cover_agent.settings.config_loader import get_settings
+
+CACHE_MODES = ["read-write", "read-only", "bypass"]
+
+# Completion parameters that do not change the content of the response
+IGNORED_PARAMS = {"stream", "api_base", "timeout"}
+
+
+class ResponseCache:
+    def __init__(
+        self,
+        db_path: str,
+        mode: str = "read-write",
+        max_entries: int = 10000,
+        max_age_days: float = 30,
+        max_size_mb: float = 500,
+    ):
+        """
+        A content-addressed cache of LLM responses, stored in a local SQLite file.
+
+        Responses are keyed by a hash of the model, the messages and the other completion parameters, and are evicted
+        in least-recently-used order once the cache grows beyond `max_entries` or `max_size_mb`, or when they are older
+        than `max_age_days`.
+
+        Parameters:
+            db_path (str): The path to the SQLite file.
+            mode (str, optional): "read-write" to use and update the cache, "read-only" to use the cache without storing new
+                                  responses, or "bypass" to always call the model while still storing the fresh responses.
+                                  Defaults to "read-write".
+            max_entries (int, optional): The maximal number of cached responses. Defaults to 10000.
+            max_age_days (float, optional): The maximal age of a cached response, in days. Defaults to 30.
+            max_size_mb (float, optional): The maximal total size of the cached responses, in megabytes. Defaults to 500.
+
+        Returns:
+            None
+        """
+        if mode not in CACHE_MODES:
+            raise ValueError(f"Unsupported LLM cache mode: {mode}")
+        self.db_path = db_path
+        self.mode = mode
+        self.max_entries = max_entries
+        self.max_age_seconds = max_age_days * 24 * 60 * 60
+        self.max_size_bytes = int(max_size_mb * 1024 * 1024)
+        self.logger = CustomLogger.get_logger(__name__)
+
+        # Statistics about the current run
+        self.hits = 0
+        self.misses = 0
+        self.cached_prompt_tokens = 0
+        self.cached_completion_tokens = 0
+
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(db_path, check_same_thread=False)
+        with self._connection:
+            self._connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS llm_responses (
+                    key TEXT PRIMARY KEY,
+                    model TEXT,
+                    content TEXT,
+                    prompt_tokens INTEGER,
+                    completion_tokens INTEGER,
+                    size INTEGER,
+                    created_at REAL,
+                    last_accessed REAL
+                )
+                """
+            )
+            self._connection.execute(
+                "CREATE INDEX IF NOT EXISTS idx_llm_responses_last_accessed ON llm_responses (last_accessed)"
+            )
+
+    @staticmethod
+    def make_key(completion_params: dict) -> str:
+        """
+        Compute the cache key of a completion request: a hash of the model, the messages and the other parameters.
+        """
+        relevant_params = {k: v for k, v in completion_params.items() if k not in IGNORED_PARAMS}
+        serialized = json.dumps(relevant_params, sort_keys=True, default=str)
+        return hashlib.sha256(serialized.encode("utf-8")).hexdigest()
+
+    def get(self, key: str):
+        """
+        Look up a cached response.
+
+        Returns:
+            tuple: The cached (content, prompt tokens, completion tokens), or None if the response is not cached (or the cache is bypassed).
+        """
+        if self.mode == "bypass":
+            return None
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT content, prompt_tokens, completion_tokens, created_at FROM llm_responses WHERE key = ?",
+                (key,),
+            ).fetchone()
+            if row is None or time.time() - row[3] > self.max_age_seconds:
+                self.misses += 1
+                return None
+            if self.mode == "read-write":
+                with self._connection:
+                    self._connection.execute(
+                        "UPDATE llm_responses SET last_accessed = ? WHERE key = ?", (time.time(), key)
+                    )
+            self.hits += 1
+            self.cached_prompt_tokens += row[1]
+            self.cached_completion_tokens += row[2]
+        self.logger.info(f"Using cached LLM response {key[:12]}")
+        return row[0], row[1], row[2]
+
+    def put(self, key: str, model: str, content: str, prompt_tokens: int, completion_tokens: int):
+        """
+        Store a response in the cache, then evict old entries if needed.
+        """
+        if self.mode == "read-only" or content is None:
+            return
+        now = time.time()
+        with self._lock:
+            with self._connection:
+                self._connection.execute(
+                    "INSERT OR REPLACE INTO llm_responses VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (key, model, content, prompt_tokens, completion_tokens, len(content.encode("utf-8")), now, now),
+                )
+            self._evict(now)
+
+    def _evict(self, now: float):
+        with self._connection:
+            self._connection.execute(
+                "DELETE FROM llm_responses WHERE created_at < ?", (now - self.max_age_seconds,)
+            )
+            num_entries, total_size = self._connection.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM llm_responses"
+            ).fetchone()
+            if num_entries <= self.max_entries and total_size <= self.max_size_bytes:
+                return
+
+            # Drop the least recently used entries until both limits are met
+            keys_to_delete = []
+            for key, size in self._connection.execute(
+                "SELECT key, size FROM llm_responses ORDER BY last_accessed ASC"
+            ):
+                if num_entries <= self.max_entries and total_size <= self.max_size_bytes:
+                    break
+                keys_to_delete.append((key,))
+                num_entries -= 1
+                total_size -= size
+            self._connection.executemany("DELETE FROM llm_responses WHERE key = ?", keys_to_delete)
+
+    def close(self):
+        self._connection.close()
+
+
+def create_response_cache(args):
+    """
+    Create the response cache requested on the command line, with the eviction limits of the `llm_cache` settings.
+
+    Parameters:
+        args (Namespace): The parsed command-line arguments (`llm_cache_path` and `llm_cache_mode`).
+
+    Returns:
+        ResponseCache: The response cache, or None if no cache path was provided.
+    """
+    db_path = getattr(args, "llm_cache_path", "")
+    if not db_path:
+        return None
+    return ResponseCache(
+        db_path,
+        mode=getattr(args, "llm_cache_mode", "read-write"),
+        max_entries=get_settings().get("llm_cache.max_entries", 10000),
+        max_age_days=get_settings().get("llm_cache.max_age_days", 30),
+        max_size_mb=get_settings().get("llm_cache.max_size_mb", 500),
+    )
@@ -1,35 +1,236 @@
+import os
+import signal
 import subprocess
+import sys
+import threading
 import time
+from collections import deque
 
+from cover_agent.Profiler import Profiler
+from cover_agent.PytestWorker import PytestWorker
 from cover_agent.settings.config_loader import get_settings
 
 
+class OutputBuffer:
+    def __init__(self, max_bytes: int):
+        """
+        A bounded buffer for the output of a command: it keeps the first and the last `max_bytes / 2` bytes, and only
+        counts the bytes in between.
+
+        Parameters:
+            max_bytes (int): The maximal number of bytes kept.
+        """
+        self.head_limit = max_bytes // 2
+        self.tail_limit = max_bytes - self.head_limit
+        self.head = bytearray()
+        self.tail = deque()
+        self.tail_size = 0
+        self.total_bytes = 0
+
+    def write(self, data: bytes):
+        self.total_bytes += len(data)
+        if len(self.head) < self.head_limit:
+            head_space = self.head_limit - len(self.head)
+            self.head += data[:head_space]
+            data = data[head_space:]
+        if not data:
+            return
+        self.tail.append(data)
+        self.tail_size += len(data)
+        # Drop whole chunks that are no longer needed; the first remaining chunk is trimmed when reading
+        while self.tail_size - len(self.tail[0]) >= self.tail_limit:
+            self.tail_size -= len(self.tail.popleft())
+
+    @property
+    def truncated_bytes(self) -> int:
+        return self.total_bytes - len(self.head) - min(self.tail_size, self.tail_limit)
+
+    def getvalue(self) -> str:
+        tail = b"".join(self.tail)[-self.tail_limit:] if self.tail_limit else b""
+        text = self.head.decode(errors="replace")
+        if self.truncated_bytes:
+            text += f"\n... [{self.truncated_bytes} bytes of output truncated] ...\n"
+        text += tail.decode(errors="replace")
+        # Same newlines as text mode
+        return text.replace("\r\n", "\n").replace("\r", "\n")
+
+
 class Runner:
+    _last_run = threading.local()
+
     @staticmethod
-    def run_command(command, cwd=None):
+    @Profiler.timed("runner.run_command")
+    def run_command(command, cwd=None, timeout=None):
         """
         Executes a shell command in a specified working directory and returns its output, error, and exit code.
 
+        The command runs in its own process group, which is killed as a whole if the command times out. Only the first and
+        last bytes of a very large output are kept (see `tests.max_output_bytes`). The resources used by the command are
+        available from `get_last_run_stats` once it returns.
+
         Parameters:
             command (str): The shell command to execute.
             cwd (str, optional): The working directory in which to execute the command. Defaults to None.
+            timeout (float, optional): The maximal runtime of the command, in seconds. Defaults to `tests.max_allowed_runtime_seconds`.
 
         Returns:
             tuple: A tuple containing the standard output ('stdout'), standard error ('stderr'), exit code ('exit_code'), and the time of the executed command ('command_start_time').
         """
         # Get the current time before running the test command, in milliseconds
         command_start_time = int(round(time.time() * 1000))
+        start = time.monotonic()
+
+        max_allowed_runtime_seconds = timeout or get_settings().get("tests.max_allowed_runtime_seconds", 30)
+        if PytestWorker.enabled:
+            # Plain pytest commands run in a warm worker, without the interpreter and import startup
+            worker_result = PytestWorker.run_command(command, cwd=cwd, timeout=max_allowed_runtime_seconds)
+            if worker_result is not None:
+                stdout, stderr, exit_code, stats = worker_result
+                Runner._set_last_run_stats(
+                    wall_time_seconds=time.monotonic() - start, timed_out=exit_code == -1 and stderr == "Command timed out", **stats
+                )
+                return stdout, stderr, exit_code, command_start_time
 
-        max_allowed_runtime_seconds = get_settings().get("tests.max_allowed_runtime_seconds", 30)
+        if os.name != "posix":
+            return Runner._run_command_without_process_group(command, cwd, max_allowed_runtime_seconds, command_start_time)
+
+        max_output_bytes = get_settings().get("tests.max_output_bytes", 10 * 1024 * 1024)
+        stdout_buffer, stderr_buffer = OutputBuffer(max_output_bytes), OutputBuffer(max_output_bytes)
         # Ensure the command is executed with shell=True for string commands
+        process = subprocess.Popen(
+            command, shell=True, cwd=cwd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, start_new_session=True
+        )
+        readers = [
+            threading.Thread(target=Runner._read_stream, args=(process.stdout, stdout_buffer), daemon=True),
+            threading.Thread(target=Runner._read_stream, args=(process.stderr, stderr_buffer), daemon=True),
+        ]
+        for reader in readers:
+            reader.start()
+
+        # Wait for the shell with wait4, which also reports the resources used by the shell and the processes it waited for
+        wait_result = {}
+        waiter = threading.Thread(
+            target=lambda: wait_result.update(status=os.wait4(process.pid, 0)), daemon=True
+        )
+        waiter.start()
+        deadline = start + max_allowed_runtime_seconds
+        waiter.join(max(0, deadline - time.monotonic()))
+        timed_out = waiter.is_alive()
+        if not timed_out:
+            # Background processes started by the command may keep the output pipes open
+            for reader in readers:
+                reader.join(max(0, deadline - time.monotonic()))
+            timed_out = any(reader.is_alive() for reader in readers)
+        if timed_out:
+            # Terminate the whole process group, and kill it if it is still running (or holding the output pipes) after a grace period
+            Runner._signal_process_group(process.pid, signal.SIGTERM)
+            grace_deadline = time.monotonic() + get_settings().get("tests.timeout_kill_grace_seconds", 2)
+            for thread in [waiter] + readers:
+                thread.join(max(0, grace_deadline - time.monotonic()))
+            if any(thread.is_alive() for thread in [waiter] + readers):
+                Runner._signal_process_group(process.pid, signal.SIGKILL)
+            waiter.join()
+            for reader in readers:
+                # A process that left the group may still hold the pipes: its output is abandoned
+                reader.join(get_settings().get("tests.timeout_kill_grace_seconds", 2))
+        if not any(reader.is_alive() for reader in readers):
+            process.stdout.close()
+            process.stderr.close()
+
+        _, status, rusage = wait_result["status"]
+        # The process was reaped by wait4, Popen must not wait for it again
+        process.returncode = os.waitstatus_to_exitcode(status)
+        Runner._set_last_run_stats(
+            wall_time_seconds=time.monotonic() - start,
+            cpu_time_seconds=rusage.ru_utime + rusage.ru_stime,
+            peak_memory_mb=Runner._max_rss_to_mb(rusage.ru_maxrss),
+            truncated_output_bytes=stdout_buffer.truncated_bytes + stderr_buffer.truncated_bytes,
+            timed_out=timed_out,
+        )
+        if timed_out:
+            # Handle the timeout case
+            return "", "Command timed out", -1, command_start_time
+
+        # Return a dictionary with the desired information
+        return stdout_buffer.getvalue(), stderr_buffer.getvalue(), process.returncode, command_start_time
+
+    @staticmethod
+    def adaptive_timeout(durations: list):
+        """
+        Compute the timeout of a test command from the durations of its recent successful runs:
+        the longest recent duration x `tests.timeout_factor` + `tests.timeout_slack_seconds`.
+
+        Parameters:
+            durations (list): The recent durations of the command, in seconds.
+
+        Returns:
+            float: The timeout in seconds, at most `tests.adaptive_timeout_max_seconds`, or None when adaptive timeouts are
+                   disabled or no duration is known yet, and the static `tests.max_allowed_runtime_seconds` applies.
+        """
+        settings = get_settings()
+        if not settings.get("tests.adaptive_timeout", True) or not durations:
+            return None
+        max_timeout = settings.get("tests.adaptive_timeout_max_seconds", 600)
+        timeout = max(durations) * settings.get("tests.timeout_factor", 3) + settings.get("tests.timeout_slack_seconds", 5)
+        return round(min(timeout, max_timeout), 1)
+
+    @staticmethod
+    def get_last_run_stats() -> dict:
+        """
+        Get the resources used by the last command run by `run_command` in the current thread.
+
+        Returns:
+            dict: The wall-clock time and CPU time (user + system) in seconds, the peak resident memory in MB (None when not
+                  available), the number of output bytes that were not kept, and whether the command timed out.
+        """
+        return dict(getattr(Runner._last_run, "stats", {}))
+
+    @staticmethod
+    def _set_last_run_stats(
+        wall_time_seconds: float,
+        cpu_time_seconds: float = None,
+        peak_memory_mb: float = None,
+        truncated_output_bytes: int = 0,
+        timed_out: bool = False,
+    ):
+        Runner._last_run.stats = {
+            "wall_time_seconds": round(wall_time_seconds, 3),
+            "cpu_time_seconds": round(cpu_time_seconds, 3) if cpu_time_seconds is not None else None,
+            "peak_memory_mb": round(peak_memory_mb, 1) if peak_memory_mb is not None else None,
+            "truncated_output_bytes": truncated_output_bytes,
+            "timed_out": timed_out,
+        }
+
+    @staticmethod
+    def _max_rss_to_mb(max_rss: int) -> float:
+        # ru_maxrss is in bytes on macOS, and in kilobytes on Linux
+        return max_rss / (1024 * 1024) if sys.platform == "darwin" else max_rss / 1024
+
+    @staticmethod
+    def _read_stream(stream, buffer: OutputBuffer):
+        while True:
+            data = os.read(stream.fileno(), 65536)
+            if not data:
+                break
+            buffer.write(data)
+
+    @staticmethod
+    def _signal_process_group(pgid: int, sig: int):
+        try:
+            os.killpg(pgid, sig)
+        except ProcessLookupError:
+            # All the processes of the group already exited
+            pass
+
+    @staticmethod
+    def _run_command_without_process_group(command, cwd, max_allowed_runtime_seconds, command_start_time):
+        start = time.monotonic()
         try:
             result = subprocess.run(
                 command, shell=True, cwd=cwd, text=True, capture_output=True, timeout=max_allowed_runtime_seconds
             )
-
-            # Return a dictionary with the desired information
+            Runner._set_last_run_stats(wall_time_seconds=time.monotonic() - start)
             return result.stdout, result.stderr, result.returncode, command_start_time
         except subprocess.TimeoutExpired:
-            # Handle the timeout case
+            Runner._set_last_run_stats(wall_time_seconds=time.monotonic() - start, timed_out=True)
             return "", "Command timed out", -1, command_start_time
-
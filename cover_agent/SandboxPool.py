@@ -0,0 +1,143 @@
+import os
+import queue
+import shutil
+import tempfile
+
+from cover_agent.CustomLogger import CustomLogger
+
+
+class SandboxPool:
+    def __init__(
+        self,
+        source_dir: str,
+        size: int,
+        link_mode: str = "copy",
+        ignore_patterns: list = None,
+        private_paths: list = None,
+    ):
+        """
+        A pool of scratch copies ("sandboxes") of a project directory.
+
+        Each sandbox is a full copy of `source_dir` that can be modified and tested independently of the others,
+        which allows several generated tests to be validated concurrently without touching the original project.
+
+        Parameters:
+            source_dir (str): The project directory to copy into each sandbox.
+            size (int): The number of sandboxes to create.
+            link_mode (str, optional): "copy" to copy every file, or "hardlink" to hardlink files instead (falls back to copying
+                                       when hardlinks are not possible). Defaults to "copy".
+            ignore_patterns (list, optional): Glob patterns of files and directories that should not be copied. Defaults to None.
+            private_paths (list, optional): Paths inside `source_dir` that are written to during a test run (e.g. the test file or the
+                                            coverage report). In "hardlink" mode these are always copied, so that writing to them
+                                            does not modify the original project. Defaults to None.
+
+        Returns:
+            None
+        """
+        self.source_dir = os.path.abspath(source_dir)
+        self.size = size
+        self.link_mode = link_mode
+        self.ignore_patterns = ignore_patterns or []
+        self.private_paths = private_paths or []
+        self.logger = CustomLogger.get_logger(__name__)
+
+        self.sandboxes = []
+        self._available = queue.Queue()
+
+    def __enter__(self):
+        self.create()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.cleanup()
+
+    def create(self):
+        """
+        Create the sandboxes by copying (or hardlinking) the source directory `size` times.
+        """
+        copy_function = self._link_or_copy if self.link_mode == "hardlink" else shutil.copy2
+        for _ in range(self.size):
+            sandbox_root = tempfile.mkdtemp(prefix="cover_agent_sandbox_")
+            shutil.copytree(
+                self.source_dir,
+                sandbox_root,
+                symlinks=True,
+                ignore=shutil.ignore_patterns(*self.ignore_patterns),
+                copy_function=copy_function,
+                dirs_exist_ok=True,
+            )
+            if self.link_mode == "hardlink":
+                for path in self.private_paths:
+                    self._break_link(self.map_path(path, sandbox_root))
+            self.sandboxes.append(sandbox_root)
+            self._available.put(sandbox_root)
+        self.logger.info(f"Created {self.size} sandbox copies of {self.source_dir}")
+
+    def cleanup(self):
+        """
+        Remove all the sandboxes created by this pool.
+        """
+        for sandbox_root in self.sandboxes:
+            shutil.rmtree(sandbox_root, ignore_errors=True)
+        self.sandboxes = []
+        self._available = queue.Queue()
+
+    def acquire(self) -> str:
+        """
+        Take a free sandbox out of the pool, blocking until one is available.
+
+        Returns:
+            str: The root directory of the sandbox.
+        """
+        return self._available.get()
+
+    def release(self, sandbox_root: str):
+        """
+        Return a sandbox to the pool.
+        """
+        self._available.put(sandbox_root)
+
+    def contains(self, path: str) -> bool:
+        """
+        Check whether a path is located inside the source directory, and can therefore be mapped into a sandbox.
+        """
+        path = os.path.abspath(path)
+        return os.path.commonpath([path, self.source_dir]) == self.source_dir
+
+    def map_path(self, path: str, sandbox_root: str) -> str:
+        """
+        Translate a path inside the source directory into the equivalent path inside a sandbox.
+        """
+        relative_path = os.path.relpath(os.path.abspath(path), self.source_dir)
+        return os.path.normpath(os.path.join(sandbox_root, relative_path))
+
+    def map_command(self, command: str, sandbox_root: str) -> str:
+        """
+        Translate any absolute reference to the source directory in a shell command into the sandbox directory.
+        """
+        return command.replace(self.source_dir, sandbox_root)
+
+    @staticmethod
+    def write_file(path: str, content: str):
+        """
+        Write a file inside a sandbox, making sure a hardlinked file shared with the original project is never modified.
+        """
+        if os.path.exists(path):
+            os.remove(path)
+        with open(path, "w") as f:
+            f.write(content)
+
+    @staticmethod
+    def _link_or_copy(src, dst):
+        try:
+            os.link(src, dst)
+        except OSError:
+            shutil.copy2(src, dst)
+        return dst
+
+    @staticmethod
+    def _break_link(path: str):
+        if os.path.isfile(path) and os.stat(path).st_nlink > 1:
+            tmp_path = path + ".cover_agent_tmp"
+            shutil.copy2(path, tmp_path)
+            os.replace(tmp_path, path)
@@ -0,0 +1,141 @@
+import sys
+import time
+
+from cover_agent.settings.config_loader import get_settings
+
+
+class StreamSink:
+    """
+    Receives the text of an LLM response as it is generated.
+
+    Sinks are called from the thread that consumes the LLM stream, so they must never block or sleep.
+    """
+
+    def start(self):
+        """Called once, before the first chunk of a response."""
+
+    def write(self, text: str):
+        """Called with the text of every chunk of the response."""
+
+    def end(self):
+        """Called once, after the last chunk of a response."""
+
+
+class NullStreamSink(StreamSink):
+    """
+    Discards the response text. Used in headless / CI runs.
+    """
+
+
+class TerminalStreamSink(StreamSink):
+    def __init__(self, stream=None, min_interval: float = 0.05):
+        """
+        Renders the response text to a terminal, flushing at most once every `min_interval` seconds.
+
+        Parameters:
+            stream (TextIO, optional): The stream to write to. Defaults to sys.stdout.
+            min_interval (float, optional): The minimal time, in seconds, between two flushes of the stream. Defaults to 0.05.
+        """
+        self.stream = stream
+        self.min_interval = min_interval
+        self._buffer = []
+        self._last_flush = 0.0
+
+    def start(self):
+        self._buffer = []
+        self._last_flush = time.monotonic()
+        self._stream().write("Streaming results from LLM model...\n")
+
+    def write(self, text: str):
+        if not text:
+            return
+        self._buffer.append(text)
+        if time.monotonic() - self._last_flush >= self.min_interval:
+            self._flush()
+
+    def end(self):
+        self._flush()
+        self._stream().write("\n\n")
+        self._stream().flush()
+
+    def _flush(self):
+        if self._buffer:
+            self._stream().write("".join(self._buffer))
+            self._stream().flush()
+            self._buffer = []
+        self._last_flush = time.monotonic()
+
+    def _stream(self):
+        return self.stream or sys.stdout
+
+
+class CallbackStreamSink(StreamSink):
+    def __init__(self, callback, on_start=None, on_end=None):
+        """
+        Forwards the response text to a callback, for programmatic consumers.
+
+        The callbacks are invoked on the thread that consumes the LLM stream, so they should return quickly
+        (for example, by putting the text on a queue).
+
+        Parameters:
+            callback (Callable[[str], None]): Called with the text of every chunk.
+            on_start (Callable[[], None], optional): Called before the first chunk. Defaults to None.
+            on_end (Callable[[], None], optional): Called after the last chunk. Defaults to None.
+        """
+        self.callback = callback
+        self.on_start = on_start
+        self.on_end = on_end
+
+    def start(self):
+        if self.on_start:
+            self.on_start()
+
+    def write(self, text: str):
+        if text:
+            self.callback(text)
+
+    def end(self):
+        if self.on_end:
+            self.on_end()
+
+
+class TeeStreamSink(StreamSink):
+    def __init__(self, *sinks: StreamSink):
+        """
+        Forwards the response text to several sinks, e.g. to render it while it is also being parsed.
+        """
+        self.sinks = sinks
+
+    def start(self):
+        for sink in self.sinks:
+            sink.start()
+
+    def write(self, text: str):
+        for sink in self.sinks:
+            sink.write(text)
+
+    def end(self):
+        for sink in self.sinks:
+            sink.end()
+
+
+def get_stream_sink(stream_output: str = None) -> StreamSink:
+    """
+    Create the stream sink configured by `llm.stream_output`.
+
+    Parameters:
+        stream_output (str, optional): "terminal", "none", or "auto" (terminal when stdout is a TTY, none otherwise).
+                                       Defaults to the `llm.stream_output` setting.
+
+    Returns:
+        StreamSink: The stream sink.
+    """
+    if stream_output is None:
+        stream_output = get_settings().get("llm.stream_output", "auto")
+    if stream_output == "auto":
+        stream_output = "terminal" if sys.stdout.isatty() else "none"
+    if stream_output == "terminal":
+        return TerminalStreamSink(min_interval=get_settings().get("llm.stream_flush_interval_seconds", 0.05))
+    if stream_output == "none":
+        return NullStreamSink()
+    raise ValueError(f"Unsupported stream output: {stream_output}")
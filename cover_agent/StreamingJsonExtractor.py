@@ -0,0 +1,100 @@
+import json
+import re
+from typing import List, Optional, Tuple
+
+
+class StreamingJsonExtractor:
+    """
+    Extracts the items of a JSON list (by default `new_tests`) from a structured response while it is being streamed.
+
+    The counterpart of `StreamingYamlExtractor` for responses constrained to a JSON schema (see `NewTestsSchema`). The
+    text is scanned as it is fed, keeping track of strings and nesting: an item of the list is complete as soon as its
+    closing brace is received, and it is then parsed on its own, while the rest of the response is still being generated.
+
+    Items that do not parse on their own are returned as None, so that the caller can fall back to the parsing of the
+    whole response for them.
+    """
+
+    def __init__(self, list_key: str = "new_tests"):
+        """
+        Parameters:
+            list_key (str, optional): The key of the list to extract the items of. Defaults to "new_tests".
+        """
+        self._list_start_pattern = re.compile(rf'"{re.escape(list_key)}"\s*:\s*\[')
+        self._text = ""
+        self._position = 0
+        self._in_list = False
+        self._list_ended = False
+        self._depth = 0
+        self._item_start = None
+        self._in_string = False
+        self._escaped = False
+        self.items_completed = 0
+
+    def feed(self, text: str) -> List[Tuple[int, Optional[dict]]]:
+        """
+        Feed the next chunk of the response.
+
+        Returns:
+            List[Tuple[int, Optional[dict]]]: The index and the parsed value (None if it does not parse) of every item
+                                              completed by the chunk.
+        """
+        if self._list_ended:
+            return []
+        self._text += text
+        if not self._in_list:
+            match = self._list_start_pattern.search(self._text)
+            if match is None:
+                return []
+            self._in_list = True
+            self._position = match.end()
+
+        completed = []
+        while self._position < len(self._text) and not self._list_ended:
+            character = self._text[self._position]
+            self._position += 1
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif character == "\\":
+                    self._escaped = True
+                elif character == '"':
+                    self._in_string = False
+            elif character == '"':
+                self._in_string = True
+            elif character in "{[":
+                if self._depth == 0:
+                    self._item_start = self._position - 1
+                self._depth += 1
+            elif character in "}]":
+                if self._depth == 0:
+                    # The end of the list
+                    self._list_ended = True
+                    break
+                self._depth -= 1
+                if self._depth == 0:
+                    completed.append(self._complete_item(self._text[self._item_start:self._position]))
+        return completed
+
+    def finish(self) -> List[Tuple[int, Optional[dict]]]:
+        """
+        Signal the end of the response.
+
+        Returns:
+            List[Tuple[int, Optional[dict]]]: The item left incomplete by the end of the response, if any, as None.
+        """
+        completed = []
+        if self._in_list and not self._list_ended and self._depth > 0:
+            completed.append(self._complete_item(None))
+        self._list_ended = True
+        return completed
+
+    def _complete_item(self, text: Optional[str]) -> Tuple[int, Optional[dict]]:
+        self._item_start = None
+        try:
+            item = json.loads(text) if text is not None else None
+        except ValueError:
+            item = None
+        index = self.items_completed
+        self.items_completed += 1
+        return index, item if isinstance(item, dict) else None
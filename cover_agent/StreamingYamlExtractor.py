@@ -0,0 +1,116 @@
+from typing import List, Optional, Tuple
+
+import yaml
+
+
+class StreamingYamlExtractor:
+    """
+    Extracts the items of a YAML list (by default `new_tests`) from a response while it is being streamed.
+
+    The text is fed chunk by chunk. An item of the list is complete as soon as the next item starts, or as soon as a line
+    less indented than the items ends the list: it is then parsed on its own, while the rest of the response is still
+    being generated. The last item is only complete at the end of the response, see `finish`.
+
+    Items that do not parse on their own are returned as None, so that the caller can fall back to the parsing of the
+    whole response for them.
+    """
+
+    def __init__(self, list_key: str = "new_tests"):
+        """
+        Parameters:
+            list_key (str, optional): The key of the list to extract the items of. Defaults to "new_tests".
+        """
+        self.list_key = list_key
+        self._partial_line = ""
+        self._in_list = False
+        self._list_ended = False
+        self._item_indent = None
+        self._item_lines = []
+        self.items_completed = 0
+
+    def feed(self, text: str) -> List[Tuple[int, Optional[dict]]]:
+        """
+        Feed the next chunk of the response.
+
+        Returns:
+            List[Tuple[int, Optional[dict]]]: The index and the parsed value (None if it does not parse) of every item
+                                              completed by the chunk.
+        """
+        lines = (self._partial_line + text).split("\n")
+        self._partial_line = lines.pop()
+        completed = []
+        for line in lines:
+            completed.extend(self._process_line(line))
+
+        # The first character of a line is enough to know that it is not a part of the current item
+        partial_line = self._partial_line.lstrip(" ")
+        if self._item_lines and partial_line and not partial_line.startswith("#"):
+            if len(self._partial_line) - len(partial_line) <= self._item_indent:
+                completed.extend(self._complete_item())
+        return completed
+
+    def finish(self) -> List[Tuple[int, Optional[dict]]]:
+        """
+        Signal the end of the response.
+
+        Returns:
+            List[Tuple[int, Optional[dict]]]: The item completed by the end of the response, if any.
+        """
+        completed = []
+        if self._partial_line:
+            completed.extend(self._process_line(self._partial_line))
+            self._partial_line = ""
+        completed.extend(self._complete_item())
+        self._list_ended = True
+        return completed
+
+    def _process_line(self, line: str) -> List[Tuple[int, Optional[dict]]]:
+        if self._list_ended:
+            return []
+        stripped = line.strip()
+        indent = len(line) - len(line.lstrip(" "))
+
+        if not self._in_list:
+            self._in_list = stripped.startswith(f"{self.list_key}:")
+            return []
+
+        if not stripped or stripped.startswith("#"):
+            if self._item_lines:
+                self._item_lines.append(line)
+            return []
+
+        if self._item_indent is None:
+            if stripped.startswith("- ") or stripped == "-":
+                self._item_indent = indent
+                self._item_lines = [line]
+                return []
+            # An empty list, or not a list
+            self._list_ended = True
+            return []
+
+        if indent == self._item_indent and (stripped.startswith("- ") or stripped == "-"):
+            completed = self._complete_item()
+            self._item_lines = [line]
+            return completed
+        if indent <= self._item_indent:
+            # A key of the parent mapping, or the end of a code block: the list is over
+            completed = self._complete_item()
+            self._list_ended = True
+            return completed
+
+        self._item_lines.append(line)
+        return []
+
+    def _complete_item(self) -> List[Tuple[int, Optional[dict]]]:
+        if not self._item_lines:
+            return []
+        text = "\n".join(line[self._item_indent:] for line in self._item_lines)
+        self._item_lines = []
+        try:
+            items = yaml.safe_load(text)
+            item = items[0] if isinstance(items, list) and items and isinstance(items[0], dict) else None
+        except Exception:
+            item = None
+        index = self.items_completed
+        self.items_completed += 1
+        return [(index, item)]
@@ -0,0 +1,87 @@
+import ast
+
+
+class PythonSuiteAnalyzer:
+    def __init__(self, test_file_content: str):
+        """
+        Deterministic analysis of the structure of a Python test file, used instead of the LLM-based analysis when possible.
+
+        Parameters:
+            test_file_content (str): The content of the test file.
+        """
+        self.test_file_content = test_file_content
+
+    def analyze(self):
+        """
+        Find where new tests and imports should be inserted in the test file, how test headers are indented,
+        and which testing framework is used.
+
+        The analysis only answers for simple, unambiguous layouts: all the tests are either module-level functions
+        or methods of module-level test classes, the file is indented with spaces, and the framework can be told
+        from the imports and base classes.
+
+        Returns:
+            dict: The same keys as the LLM-based analysis (`test_headers_indentation`, `relevant_line_number_to_insert_tests_after`,
+                  `relevant_line_number_to_insert_imports_after` and `testing_framework`), or None when the layout is not
+                  recognized with confidence.
+        """
+        if "\t" in self.test_file_content:
+            return None
+        try:
+            tree = ast.parse(self.test_file_content)
+        except (SyntaxError, ValueError):
+            return None
+
+        imports = [node for node in tree.body if isinstance(node, (ast.Import, ast.ImportFrom))]
+        test_functions = [node for node in tree.body if self._is_test_function(node)]
+        test_classes = [node for node in tree.body if isinstance(node, ast.ClassDef) and self._test_methods(node)]
+        if not imports or bool(test_functions) == bool(test_classes):
+            # No place for new imports, or no tests at all, or a mix of both styles
+            return None
+
+        imported_modules = self._imported_modules(imports)
+        if test_functions:
+            last_test = test_functions[-1]
+            testing_framework = "pytest"
+        else:
+            last_class = test_classes[-1]
+            last_test = self._test_methods(last_class)[-1]
+            base_names = {self._base_name(base) for base in last_class.bases}
+            if any(name.endswith("TestCase") for name in base_names) and "unittest" in imported_modules:
+                testing_framework = "unittest"
+            elif not base_names and "pytest" in imported_modules:
+                testing_framework = "pytest"
+            else:
+                return None
+
+        return {
+            "test_headers_indentation": last_test.col_offset,
+            "relevant_line_number_to_insert_tests_after": last_test.end_lineno,
+            "relevant_line_number_to_insert_imports_after": imports[-1].end_lineno,
+            "testing_framework": testing_framework,
+        }
+
+    @staticmethod
+    def _is_test_function(node) -> bool:
+        return isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)) and node.name.startswith("test")
+
+    def _test_methods(self, class_node: ast.ClassDef) -> list:
+        return [node for node in class_node.body if self._is_test_function(node)]
+
+    @staticmethod
+    def _base_name(base) -> str:
+        if isinstance(base, ast.Attribute):
+            return base.attr
+        if isinstance(base, ast.Name):
+            return base.id
+        return ""
+
+    @staticmethod
+    def _imported_modules(imports: list) -> set:
+        modules = set()
+        for node in imports:
+            if isinstance(node, ast.Import):
+                modules.update(alias.name.split(".")[0] for alias in node.names)
+            elif node.module:
+                modules.add(node.module.split(".")[0])
+        return modules
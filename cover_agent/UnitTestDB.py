@@ -1,8 +1,10 @@
 import argparse
+import json
 from datetime import datetime
-from sqlalchemy import create_engine, Column, Integer, String, Text, DateTime
+from sqlalchemy import create_engine, inspect, text, Column, Float, Integer, String, Text, DateTime
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, scoped_session, load_only
+from cover_agent.Profiler import Profiler
 from cover_agent.ReportGenerator import ReportGenerator
 
 Base = declarative_base()
@@ -23,13 +25,55 @@ class UnitTestGenerationAttempt(Base):
     source_file = Column(Text)
     original_test_file = Column(Text)
     processed_test_file = Column(Text)
+    cpu_time_seconds = Column(Float)
+    peak_memory_mb = Column(Float)
+
+class SuiteAnalysisResult(Base):
+    __tablename__ = 'test_suite_analyses'
+    id = Column(Integer, primary_key=True)
+    run_time = Column(DateTime, default=datetime.now)  # Use local time
+    test_file_hash = Column(String, index=True)
+    model = Column(String)
+    test_headers_indentation = Column(Integer)
+    relevant_line_number_to_insert_tests_after = Column(Integer)
+    relevant_line_number_to_insert_imports_after = Column(Integer)
+    testing_framework = Column(String)
+
+class RunCheckpoint(Base):
+    __tablename__ = 'run_checkpoints'
+    id = Column(Integer, primary_key=True)
+    run_time = Column(DateTime, default=datetime.now)  # Use local time
+    run_key = Column(String, index=True, unique=True)
+    iteration_count = Column(Integer)
+    state = Column(Text)
+    test_file_content = Column(Text)
+
+class CommandDuration(Base):
+    __tablename__ = 'command_durations'
+    id = Column(Integer, primary_key=True)
+    run_time = Column(DateTime, default=datetime.now)  # Use local time
+    project = Column(Text, index=True)
+    command = Column(Text)
+    duration_seconds = Column(Float)
 
 class UnitTestDB:
     def __init__(self, db_connection_string):
         self.engine = create_engine(db_connection_string)
         Base.metadata.create_all(self.engine)
+        self._add_missing_columns()
         self.Session = scoped_session(sessionmaker(bind=self.engine))
 
+    def _add_missing_columns(self):
+        # Databases created by previous versions lack the newer (nullable) columns of the attempts table
+        table = UnitTestGenerationAttempt.__table__
+        existing_columns = {column["name"] for column in inspect(self.engine).get_columns(table.name)}
+        with self.engine.begin() as connection:
+            for column in table.columns:
+                if column.name not in existing_columns:
+                    column_type = column.type.compile(dialect=self.engine.dialect)
+                    connection.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"))
+
+    @Profiler.timed("db.insert_attempt")
     def insert_attempt(self, test_result: dict):
         with self.Session() as session:
             new_attempt = UnitTestGenerationAttempt(
@@ -46,11 +90,152 @@ class UnitTestDB:
                 source_file=test_result.get("source_file"),
                 original_test_file=test_result.get("original_test_file"),
                 processed_test_file=test_result.get("processed_test_file"),
+                cpu_time_seconds=test_result.get("run_stats", {}).get("cpu_time_seconds"),
+                peak_memory_mb=test_result.get("run_stats", {}).get("peak_memory_mb"),
             )
             session.add(new_attempt)
             session.commit()
             return new_attempt.id
         
+    def get_test_suite_analysis(self, test_file_hash: str, model: str):
+        """
+        Retrieve the most recent analysis of a test file, made by the given model.
+
+        Parameters:
+            test_file_hash (str): The hash of the content of the test file.
+            model (str): The LLM model that analyzed the test file.
+
+        Returns:
+            dict: The analysis results, or None if this test file content was never analyzed by this model.
+        """
+        with self.Session() as session:
+            analysis = (
+                session.query(SuiteAnalysisResult)
+                .filter_by(test_file_hash=test_file_hash, model=model)
+                .order_by(SuiteAnalysisResult.id.desc())
+                .first()
+            )
+            if analysis is None:
+                return None
+            return {
+                "test_headers_indentation": analysis.test_headers_indentation,
+                "relevant_line_number_to_insert_tests_after": analysis.relevant_line_number_to_insert_tests_after,
+                "relevant_line_number_to_insert_imports_after": analysis.relevant_line_number_to_insert_imports_after,
+                "testing_framework": analysis.testing_framework,
+            }
+
+    def insert_test_suite_analysis(self, test_file_hash: str, model: str, analysis: dict):
+        """
+        Store the analysis of a test file, so it can be reused as long as the test file content does not change.
+        """
+        with self.Session() as session:
+            new_analysis = SuiteAnalysisResult(
+                run_time=datetime.now(),  # Use local time
+                test_file_hash=test_file_hash,
+                model=model,
+                test_headers_indentation=analysis.get("test_headers_indentation"),
+                relevant_line_number_to_insert_tests_after=analysis.get("relevant_line_number_to_insert_tests_after"),
+                relevant_line_number_to_insert_imports_after=analysis.get("relevant_line_number_to_insert_imports_after"),
+                testing_framework=analysis.get("testing_framework"),
+            )
+            session.add(new_analysis)
+            session.commit()
+            return new_analysis.id
+
+    def save_checkpoint(self, run_key: str, iteration_count: int, state: dict, test_file_content: str):
+        """
+        Save the state of a run after an iteration, replacing the previous checkpoint of the same run.
+
+        Parameters:
+            run_key (str): The identifier of the run (see CoverAgent).
+            iteration_count (int): The number of completed iterations.
+            state (dict): The JSON-serializable state of the run.
+            test_file_content (str): The content of the test file, including the tests accepted so far.
+        """
+        with self.Session() as session:
+            session.query(RunCheckpoint).filter_by(run_key=run_key).delete()
+            session.add(
+                RunCheckpoint(
+                    run_time=datetime.now(),  # Use local time
+                    run_key=run_key,
+                    iteration_count=iteration_count,
+                    state=json.dumps(state),
+                    test_file_content=test_file_content,
+                )
+            )
+            session.commit()
+
+    def get_checkpoint(self, run_key: str):
+        """
+        Retrieve the last checkpoint of a run.
+
+        Returns:
+            dict: The iteration count, state and test file content of the checkpoint, or None if the run has no checkpoint.
+        """
+        with self.Session() as session:
+            checkpoint = session.query(RunCheckpoint).filter_by(run_key=run_key).first()
+            if checkpoint is None:
+                return None
+            return {
+                "iteration_count": checkpoint.iteration_count,
+                "state": json.loads(checkpoint.state),
+                "test_file_content": checkpoint.test_file_content,
+            }
+
+    def delete_checkpoint(self, run_key: str):
+        """
+        Delete the checkpoint of a run, once the run is complete.
+        """
+        with self.Session() as session:
+            session.query(RunCheckpoint).filter_by(run_key=run_key).delete()
+            session.commit()
+
+    def insert_command_duration(self, project: str, command: str, duration_seconds: float, history_size: int = None):
+        """
+        Record how long a successful run of a test command took.
+
+        Parameters:
+            project (str): The project the command runs in.
+            command (str): The test command.
+            duration_seconds (float): The duration of the run.
+            history_size (int, optional): The number of most recent durations to keep for this project and command. Defaults to None (keep all).
+        """
+        with self.Session() as session:
+            session.add(
+                CommandDuration(
+                    run_time=datetime.now(),  # Use local time
+                    project=project,
+                    command=command,
+                    duration_seconds=duration_seconds,
+                )
+            )
+            session.commit()
+            if history_size:
+                expired_ids = [
+                    row.id
+                    for row in session.query(CommandDuration.id)
+                    .filter_by(project=project, command=command)
+                    .order_by(CommandDuration.id.desc())
+                    .offset(history_size)
+                ]
+                if expired_ids:
+                    session.query(CommandDuration).filter(CommandDuration.id.in_(expired_ids)).delete()
+                    session.commit()
+
+    def get_command_durations(self, project: str, command: str, limit: int = 10) -> list:
+        """
+        Returns:
+            list: The most recent durations of successful runs of a test command in a project, in seconds, most recent first.
+        """
+        with self.Session() as session:
+            rows = (
+                session.query(CommandDuration.duration_seconds)
+                .filter_by(project=project, command=command)
+                .order_by(CommandDuration.id.desc())
+                .limit(limit)
+            )
+            return [row.duration_seconds for row in rows]
+
     def get_all_attempts(self):
         '''
         Retrieve all unit test generation attempts from the database.
@@ -77,20 +262,23 @@ class UnitTestDB:
                 "source_file": attempt.source_file,
                 "original_test_file": attempt.original_test_file,
                 "processed_test_file": attempt.processed_test_file,
+                "cpu_time_seconds": attempt.cpu_time_seconds,
+                "peak_memory_mb": attempt.peak_memory_mb,
             }
             for attempt in attempts
         ]
 
         return test_results_list
 
-    def dump_to_report(self, report_filepath):
+    def dump_to_report(self, report_filepath, profile=None):
         """
         Generates an HTML report for all attempts in the database and writes to the specified file path.
 
         :param report_filepath: Path to the HTML file where the report will be written.
+        :param profile: Optional per-phase timings of the run, appended to the report.
         """
         # Use the ReportGenerator to generate the HTML report
-        ReportGenerator.generate_report(self.get_all_attempts(), report_filepath)
+        ReportGenerator.generate_report(self.get_all_attempts(), report_filepath, profile=profile)
 
 def dump_to_report(path_to_db="cover_agent_unit_test_runs.db", report_filepath="test_results.html"):
     unittest_db = UnitTestDB(f"sqlite:///{path_to_db}")
@@ -3,18 +3,30 @@ import datetime
 import json
 import logging
 import os
+import queue
 import re
+import threading
 
 from cover_agent.AICaller import AICaller
 from cover_agent.CoverageProcessor import CoverageProcessor
 from cover_agent.CustomLogger import CustomLogger
+from cover_agent.FailureMemory import FailureMemory
 from cover_agent.FilePreprocessor import FilePreprocessor
-from cover_agent.PromptBuilder import PromptBuilder
+from cover_agent.NewTestsSchema import NewTestsSchema
+from cover_agent.PromptBuilder import MAX_TESTS_PER_RUN, PromptBuilder
+from cover_agent.ResponseCache import ResponseCache
 from cover_agent.Runner import Runner
 from cover_agent.settings.config_loader import get_settings
 from cover_agent.settings.token_handling import clip_tokens, TokenEncoder
+from cover_agent.StreamingJsonExtractor import StreamingJsonExtractor
+from cover_agent.StreamingYamlExtractor import StreamingYamlExtractor
+from cover_agent.StreamSink import CallbackStreamSink, TeeStreamSink
 from cover_agent.utils import load_yaml
 
+# Markers put on the queue of streamed text by `generate_tests_streaming`
+_STREAM_STARTED = object()
+_STREAM_ENDED = object()
+
 
 class UnitTestGenerator:
     def __init__(
@@ -31,6 +43,9 @@ class UnitTestGenerator:
         additional_instructions: str = "",
         use_report_coverage_feature_flag: bool = False,
         project_root: str = "",
+        response_cache: ResponseCache = None,
+        source_skeleton: bool = False,
+        structured_output: bool = False,
     ):
         """
         Initialize the UnitTestGenerator class with the provided parameters.
@@ -50,6 +65,11 @@ class UnitTestGenerator:
             use_report_coverage_feature_flag (bool, optional): Setting this to True considers the coverage of all the files in the coverage report. 
                                                                This means we consider a test as good if it increases coverage for a different 
                                                                file other than the source file. Defaults to False.
+            response_cache (ResponseCache, optional): A cache of previous LLM responses to identical prompts. Defaults to None.
+            source_skeleton (bool, optional): Send a skeleton of the source file in the prompt, with the full bodies of the functions
+                                              that contain missed lines only. Defaults to False.
+            structured_output (bool, optional): Ask the models that support structured output for a JSON object of the
+                                                `NewTests` schema, instead of YAML. Defaults to False.
 
         Returns:
             None
@@ -61,6 +81,7 @@ class UnitTestGenerator:
         self.code_coverage_report_path = code_coverage_report_path
         self.test_command = test_command
         self.test_command_dir = test_command_dir
+        self.included_file_paths = included_files or []
         self.included_files = self.get_included_files(included_files, project_root)
         self.coverage_type = coverage_type
         self.additional_instructions = additional_instructions
@@ -68,9 +89,11 @@ class UnitTestGenerator:
         self.use_report_coverage_feature_flag = use_report_coverage_feature_flag
         self.last_coverage_percentages = {}
         self.llm_model = llm_model
+        self.source_skeleton = source_skeleton
+        self.structured_output = structured_output
 
         # Objects to instantiate
-        self.ai_caller = AICaller(model=llm_model, api_base=api_base)
+        self.ai_caller = AICaller(model=llm_model, api_base=api_base, response_cache=response_cache)
 
         # Get the logger instance from CustomLogger
         self.logger = CustomLogger.get_logger(__name__)
@@ -79,6 +102,7 @@ class UnitTestGenerator:
         self.preprocessor = FilePreprocessor(self.test_file_path)
         self.total_input_token_count = 0
         self.total_output_token_count = 0
+        self.failure_memory = FailureMemory()
         self.testing_framework = "Unknown"
         self.code_coverage_report = ""
 
@@ -172,29 +196,21 @@ class UnitTestGenerator:
         Returns:
             str: The generated prompt to be used for test generation.
         """
-        # Check for existence of failed tests:
-        if not failed_test_runs:
-            failed_test_runs_value = ""
-        else:
-            failed_test_runs_value = ""
+        # Collapse the repeated failed tests, and keep only the most recent ones
+        failed_test_run_entries = []
+        if failed_test_runs:
             try:
-                for failed_test in failed_test_runs:
-                    failed_test_dict = failed_test.get("code", {})
-                    if not failed_test_dict:
-                        continue
-                    # dump dict to str
-                    code = json.dumps(failed_test_dict)
-                    error_message = failed_test.get("error_message", None)
-                    failed_test_runs_value += f"Failed Test:\n```\n{code}\n```\n"
-                    if error_message:
-                        failed_test_runs_value += (
-                            f"Test execution error analysis:\n{error_message}\n\n\n"
-                        )
-                    else:
-                        failed_test_runs_value += "\n\n"
+                self.failure_memory = FailureMemory.from_failed_test_runs(
+                    failed_test_runs,
+                    max_entries=get_settings().get("failed_tests.max_entries", 10),
+                    max_tokens=get_settings().get("failed_tests.max_tokens", 4000),
+                    language=self.language,
+                )
+                failed_test_run_entries = self.failure_memory.entries()
             except Exception as e:
                 self.logger.error(f"Error processing failed test runs: {e}")
-                failed_test_runs_value = ""
+                failed_test_run_entries = []
+        failed_test_runs_value = "".join(failed_test_run_entries)
 
         # Call PromptBuilder to build the prompt
         self.prompt_builder = PromptBuilder(
@@ -207,10 +223,36 @@ class UnitTestGenerator:
             language=language,
             testing_framework=testing_framework,
             project_root=self.project_root,
+            included_file_paths=self.included_file_paths,
+            failed_test_run_entries=failed_test_run_entries,
+            # The prompt is fitted to the context of the model it is routed to
+            model=self.ai_caller.model_for("test_generation_prompt"),
+            source_skeleton=self.source_skeleton,
+            structured_output=self.structured_output,
         )
 
         return self.prompt_builder.build_prompt()
 
+    def _response_format(self):
+        return NewTestsSchema.response_format(MAX_TESTS_PER_RUN) if self.structured_output else None
+
+    def _parse_response(self, response: str):
+        """
+        Parse the response to the test generation prompt.
+
+        A structured response is a JSON object of the `NewTests` schema, loaded as is. Any other response (a model without
+        structured output, or structured output disabled) goes through the YAML repair strategies of `load_yaml`.
+        """
+        if self.structured_output:
+            tests_dict = NewTestsSchema.parse(response)
+            if tests_dict is not None:
+                return tests_dict
+            self.logger.info("The response is not a structured JSON object, parsing it as YAML")
+        return load_yaml(
+            response,
+            keys_fix_yaml=["test_tags", "test_code", "test_name", "test_behavior"],
+        )
+
     def generate_tests(self, failed_test_runs, language, testing_framework, code_coverage_report):
         """
         Generate tests using the AI model based on the constructed prompt.
@@ -230,15 +272,14 @@ class UnitTestGenerator:
             Exception: If there is an error during test generation, such as a parsing error while processing the AI model response.
         """
         self.prompt = self.build_prompt(failed_test_runs, language, testing_framework, code_coverage_report)
-        response, prompt_token_count, response_token_count =  self.ai_caller.call_model(prompt=self.prompt)
+        response, prompt_token_count, response_token_count = self.ai_caller.call_model(
+            prompt=self.prompt, response_format=self._response_format()
+        )
 
         self.total_input_token_count += prompt_token_count
         self.total_output_token_count += response_token_count
         try:
-            tests_dict = load_yaml(
-                response,
-                keys_fix_yaml=["test_tags", "test_code", "test_name", "test_behavior"],
-            )
+            tests_dict = self._parse_response(response)
             if tests_dict is None:
                 return {}
         except Exception as e:
@@ -257,6 +298,91 @@ class UnitTestGenerator:
 
         return tests_dict
 
+    def generate_tests_streaming(self, failed_test_runs, language, testing_framework, code_coverage_report):
+        """
+        Generate tests like `generate_tests`, but yield every test as soon as it is complete in the streamed response.
+
+        The model is called on a separate thread, whose stream sink also puts the response text on a queue. The text is fed
+        to a `StreamingYamlExtractor` (and a `StreamingJsonExtractor` with structured output) on the calling thread, so
+        that the caller can validate the first tests while the model is still generating the next ones. Once the response
+        is complete, it is parsed as a whole, and the tests that could not be extracted from the stream are yielded then.
+
+        Tests are told apart by their code and imports (up to whitespace), not by their position: a retried call streams a
+        new response, whose tests are yielded unless they were already yielded from an earlier attempt.
+
+        Yields:
+            dict: The generated tests, in the order of the response.
+        """
+        self.prompt = self.build_prompt(failed_test_runs, language, testing_framework, code_coverage_report)
+
+        chunks = queue.Queue()
+        stream_sink = TeeStreamSink(
+            self.ai_caller.stream_sink, CallbackStreamSink(chunks.put, on_start=lambda: chunks.put(_STREAM_STARTED))
+        )
+        result = {}
+
+        def call_model():
+            try:
+                result["response"] = self.ai_caller.call_model(
+                    prompt=self.prompt, stream_sink=stream_sink, response_format=self._response_format()
+                )
+            except Exception as e:
+                result["error"] = e
+            finally:
+                chunks.put(_STREAM_ENDED)
+
+        thread = threading.Thread(target=call_model, name="cover-agent-test-generation", daemon=True)
+        thread.start()
+
+        yielded = set()
+
+        def is_new(test):
+            if not isinstance(test, dict):
+                return False
+            # Only the same test received again is skipped, so the code is compared as is, apart from whitespace
+            code = tuple(" ".join((test.get(key) or "").split()) for key in ("new_imports_code", "test_code"))
+            if code in yielded:
+                return False
+            yielded.add(code)
+            return True
+
+        extractors = self._streaming_extractors()
+        while True:
+            chunk = chunks.get()
+            if chunk is _STREAM_ENDED:
+                break
+            if chunk is _STREAM_STARTED:
+                # A retried call streams a new response
+                extractors = self._streaming_extractors()
+                continue
+            for extractor in extractors:
+                for _, test in extractor.feed(chunk):
+                    if is_new(test):
+                        yield test
+        thread.join()
+
+        if "error" in result:
+            raise result["error"]
+        response, prompt_token_count, response_token_count = result["response"]
+        self.total_input_token_count += prompt_token_count
+        self.total_output_token_count += response_token_count
+
+        try:
+            tests_dict = self._parse_response(response)
+            new_tests = (tests_dict or {}).get("new_tests", None) or []
+        except Exception as e:
+            self.logger.error(f"Error during test generation: {e}")
+            new_tests = []
+        for test in new_tests:
+            if is_new(test):
+                yield test
+
+    def _streaming_extractors(self) -> list:
+        # With structured output, the response is JSON, unless the model does not support it and answers in YAML
+        if self.structured_output:
+            return [StreamingJsonExtractor(), StreamingYamlExtractor()]
+        return [StreamingYamlExtractor()]
+
     def to_dict(self):
         return {
             "source_file_path": self.source_file_path,
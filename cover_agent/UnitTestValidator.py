@@ -1,19 +1,33 @@
 from wandb.sdk.data_types.trace_tree import Trace
+import atexit
 import datetime
+import hashlib
 import json
 import logging
 import os
 import re
+import tempfile
+import xml.etree.ElementTree as ET
+
+from concurrent.futures import ThreadPoolExecutor
 
 from cover_agent.AICaller import AICaller
 from cover_agent.CoverageProcessor import CoverageProcessor
 from cover_agent.CustomLogger import CustomLogger
+from cover_agent.DiffCoverageEngine import DiffCoverageEngine
 from cover_agent.FilePreprocessor import FilePreprocessor
 from cover_agent.PromptBuilder import PromptBuilder
+from cover_agent.Profiler import Profiler
+from cover_agent.ResponseCache import ResponseCache
 from cover_agent.Runner import Runner
+from cover_agent.SandboxPool import SandboxPool
 from cover_agent.settings.config_loader import get_settings
+from cover_agent.SuiteAnalyzer import PythonSuiteAnalyzer
+from cover_agent.UnitTestDB import UnitTestDB
 from cover_agent.utils import load_yaml
 
+TEST_FUNCTION_PATTERN = re.compile(r"^\s*(?:async\s+)?def\s+(test\w*)\s*\(", re.MULTILINE)
+
 
 class UnitTestValidator:
     def __init__(
@@ -34,6 +48,10 @@ class UnitTestValidator:
         diff_coverage: bool = False,
         comparison_branch: str = "main",
         num_attempts: int = 1,
+        response_cache: ResponseCache = None,
+        per_test_coverage: bool = False,
+        test_db: UnitTestDB = None,
+        builtin_diff_coverage: bool = False,
     ):
         """
         Initialize the UnitTestValidator class with the provided parameters.
@@ -53,6 +71,14 @@ class UnitTestValidator:
             use_report_coverage_feature_flag (bool, optional): Setting this to True considers the coverage of all the files in the coverage report. 
                                                                This means we consider a test as good if it increases coverage for a different 
                                                                file other than the source file. Defaults to False.
+            response_cache (ResponseCache, optional): A cache of previous LLM responses to identical prompts. Defaults to None.
+            per_test_coverage (bool, optional): Validate each generated test by running only that test, and comparing the lines it covers
+                                                against the lines covered by the test suite. Only supported for Python tests run with pytest,
+                                                with Cobertura reports. Defaults to False.
+            test_db (UnitTestDB, optional): The database where the durations of the baseline test runs are kept, to adapt the timeout
+                                            of test runs across runs of Cover-Agent. Defaults to None.
+            builtin_diff_coverage (bool, optional): With diff_coverage, compute the diff coverage in-process from the changed lines
+                                                    of the source file, instead of running diff-cover after every test run. Defaults to False.
 
         Returns:
             None
@@ -78,15 +104,26 @@ class UnitTestValidator:
         self.diff_coverage = diff_coverage
         self.comparison_branch = comparison_branch
         self.num_attempts = num_attempts
+        self.per_test_coverage = per_test_coverage
+        self.test_db = test_db
+        # Recent durations of the baseline test command, most recent first (loaded from test_db when first needed)
+        self.baseline_durations = None
+        # Scratch copies of the project for parallel validation (created when first needed, see `validate_tests_in_sandboxes`)
+        self.sandbox_pool = None
 
         # Objects to instantiate
-        self.ai_caller = AICaller(model=llm_model, api_base=api_base)
+        self.ai_caller = AICaller(model=llm_model, api_base=api_base, response_cache=response_cache)
 
         # Get the logger instance from CustomLogger
         self.logger = CustomLogger.get_logger(__name__)
 
-        # Override covertype to be 'diff' if diff_coverage is enabled
-        if self.diff_coverage:
+        # Override covertype to be 'diff' if diff_coverage is enabled, unless the diff coverage is computed in-process
+        self.diff_coverage_engine = None
+        if self.diff_coverage and builtin_diff_coverage:
+            self.diff_coverage_engine = DiffCoverageEngine(self.test_command_dir, self.comparison_branch)
+            self.diff_cover_report_path = ""
+            self.logger.info(f"Diff coverage enabled. Comparing the {self.coverage_type} coverage report against {self.comparison_branch}")
+        elif self.diff_coverage:
             self.coverage_type = "diff_cover_json"
             self.diff_coverage_report_name = "diff-cover-report.json"
             self.diff_cover_report_path = f"{self.test_command_dir}/{self.diff_coverage_report_name}"
@@ -113,6 +150,7 @@ class UnitTestValidator:
             coverage_type=self.coverage_type,
             use_report_coverage_feature_flag=self.use_report_coverage_feature_flag,
             diff_coverage_report_path=self.diff_cover_report_path,
+            diff_coverage_engine=self.diff_coverage_engine,
         )
 
     def get_coverage(self):
@@ -186,15 +224,20 @@ class UnitTestValidator:
             project_root=self.project_root,
         )
 
-    def initial_test_suite_analysis(self):
+    def initial_test_suite_analysis(self, test_db: UnitTestDB = None):
         """
         Perform the initial analysis of the test suite structure.
 
-        This method iterates through a series of attempts to analyze the test suite structure by interacting with the AI model.
+        For Python test files with a simple layout, the analysis is done deterministically from the AST of the test file.
+        Otherwise, if `test_db` holds an analysis of the same test file content by the same model, it is reused.
+        Otherwise, this method iterates through a series of attempts to analyze the test suite structure by interacting with the AI model.
         It constructs prompts based on specific files and calls to the AI model to gather information such as test headers indentation,
         relevant line numbers for inserting new tests, and relevant line numbers for inserting imports.
         The method handles multiple attempts to gather this information and raises exceptions if the analysis fails.
 
+        Parameters:
+            test_db (UnitTestDB, optional): The database where the results of previous analyses are stored. Defaults to None.
+
         Raises:
             Exception: If the test headers indentation cannot be analyzed successfully.
             Exception: If the relevant line number to insert new tests cannot be determined.
@@ -205,73 +248,162 @@ class UnitTestValidator:
         try:
             self._init_prompt_builder() # Initialize the prompt builder
 
-            test_headers_indentation = None
-            allowed_attempts = 3
-            counter_attempts = 0
-            while (
-                test_headers_indentation is None and counter_attempts < allowed_attempts
-            ):
-                prompt_headers_indentation = self.prompt_builder.build_prompt_custom(
-                    file="analyze_suite_test_headers_indentation"
-                )
-                response, prompt_token_count, response_token_count = (
-                    self.ai_caller.call_model(prompt=prompt_headers_indentation)
-                )
-                self.ai_caller.model = self.llm_model
-                self.total_input_token_count += prompt_token_count
-                self.total_output_token_count += response_token_count
-                tests_dict = load_yaml(response)
-                test_headers_indentation = tests_dict.get(
-                    "test_headers_indentation", None
-                )
-                counter_attempts += 1
-
-            if test_headers_indentation is None:
-                raise Exception("Failed to analyze the test headers indentation")
-
-            relevant_line_number_to_insert_tests_after = None
-            relevant_line_number_to_insert_imports_after = None
-            allowed_attempts = 3
-            counter_attempts = 0
-            while (
-                not relevant_line_number_to_insert_tests_after
-                and counter_attempts < allowed_attempts
-            ):
-                prompt_test_insert_line = self.prompt_builder.build_prompt_custom(
-                    file="analyze_suite_test_insert_line"
-                )
-                response, prompt_token_count, response_token_count = (
-                    self.ai_caller.call_model(prompt=prompt_test_insert_line)
-                )
-                self.ai_caller.model = self.llm_model
-                self.total_input_token_count += prompt_token_count
-                self.total_output_token_count += response_token_count
-                tests_dict = load_yaml(response)
-                relevant_line_number_to_insert_tests_after = tests_dict.get(
-                    "relevant_line_number_to_insert_tests_after", None
-                )
-                relevant_line_number_to_insert_imports_after = tests_dict.get(
-                    "relevant_line_number_to_insert_imports_after", None
-                )
-                self.testing_framework: str = tests_dict.get("testing_framework", "Unknown")
-                counter_attempts += 1
-
-            if not relevant_line_number_to_insert_tests_after:
-                raise Exception(
-                    "Failed to analyze the relevant line number to insert new tests"
-                )
+            test_file_content = self._read_test_file()
+            test_file_hash = (
+                hashlib.sha256(test_file_content.encode("utf-8")).hexdigest()
+                if test_file_content is not None
+                else None
+            )
 
-            self.test_headers_indentation = test_headers_indentation
+            analysis = None
+            if self.language == "python" and test_file_content is not None:
+                analysis = PythonSuiteAnalyzer(test_file_content).analyze()
+                if analysis is not None:
+                    self.logger.info("Analyzed the test suite structure from the test file AST")
+            if test_db is None:
+                test_db = self.test_db
+            if analysis is None and test_db is not None and test_file_hash:
+                analysis = test_db.get_test_suite_analysis(test_file_hash, self.llm_model)
+                if analysis is not None:
+                    self.logger.info("Reusing the previous analysis of the unchanged test file")
+            if analysis is None:
+                analysis = self._analyze_test_suite_with_llm()
+                if test_db is not None and test_file_hash:
+                    test_db.insert_test_suite_analysis(test_file_hash, self.llm_model, analysis)
+
+            self.test_headers_indentation = analysis["test_headers_indentation"]
             self.relevant_line_number_to_insert_tests_after = (
-                relevant_line_number_to_insert_tests_after
+                analysis["relevant_line_number_to_insert_tests_after"]
             )
             self.relevant_line_number_to_insert_imports_after = (
-                relevant_line_number_to_insert_imports_after
+                analysis["relevant_line_number_to_insert_imports_after"]
             )
+            self.testing_framework = analysis["testing_framework"] or "Unknown"
         except Exception as e:
             self.logger.error(f"Error during initial test suite analysis: {e}")
             raise Exception("Error during initial test suite analysis")
 
+    def _read_test_file(self):
+        try:
+            with open(self.test_file_path, "r") as f:
+                return f.read()
+        except (OSError, UnicodeDecodeError):
+            return None
+
+    def _analyze_test_suite_with_llm(self) -> dict:
+        """
+        Analyze the test suite structure by prompting the AI model.
+
+        Returns:
+            dict: The test headers indentation, the relevant line numbers to insert tests and imports after, and the testing framework.
+        """
+        test_headers_indentation = None
+        allowed_attempts = 3
+        counter_attempts = 0
+        while (
+            test_headers_indentation is None and counter_attempts < allowed_attempts
+        ):
+            prompt_headers_indentation = self.prompt_builder.build_prompt_custom(
+                file="analyze_suite_test_headers_indentation"
+            )
+            response, prompt_token_count, response_token_count = (
+                self.ai_caller.call_model(prompt=prompt_headers_indentation)
+            )
+            self.ai_caller.model = self.llm_model
+            self.total_input_token_count += prompt_token_count
+            self.total_output_token_count += response_token_count
+            tests_dict = load_yaml(response)
+            test_headers_indentation = tests_dict.get(
+                "test_headers_indentation", None
+            )
+            counter_attempts += 1
+
+        if test_headers_indentation is None:
+            raise Exception("Failed to analyze the test headers indentation")
+
+        relevant_line_number_to_insert_tests_after = None
+        relevant_line_number_to_insert_imports_after = None
+        testing_framework = "Unknown"
+        allowed_attempts = 3
+        counter_attempts = 0
+        while (
+            not relevant_line_number_to_insert_tests_after
+            and counter_attempts < allowed_attempts
+        ):
+            prompt_test_insert_line = self.prompt_builder.build_prompt_custom(
+                file="analyze_suite_test_insert_line"
+            )
+            response, prompt_token_count, response_token_count = (
+                self.ai_caller.call_model(prompt=prompt_test_insert_line)
+            )
+            self.ai_caller.model = self.llm_model
+            self.total_input_token_count += prompt_token_count
+            self.total_output_token_count += response_token_count
+            tests_dict = load_yaml(response)
+            relevant_line_number_to_insert_tests_after = tests_dict.get(
+                "relevant_line_number_to_insert_tests_after", None
+            )
+            relevant_line_number_to_insert_imports_after = tests_dict.get(
+                "relevant_line_number_to_insert_imports_after", None
+            )
+            testing_framework = tests_dict.get("testing_framework", "Unknown")
+            counter_attempts += 1
+
+        if not relevant_line_number_to_insert_tests_after:
+            raise Exception(
+                "Failed to analyze the relevant line number to insert new tests"
+            )
+
+        return {
+            "test_headers_indentation": test_headers_indentation,
+            "relevant_line_number_to_insert_tests_after": relevant_line_number_to_insert_tests_after,
+            "relevant_line_number_to_insert_imports_after": relevant_line_number_to_insert_imports_after,
+            "testing_framework": testing_framework,
+        }
+
+    def get_checkpoint_state(self) -> dict:
+        """
+        Get the state that changes between iterations, so that an interrupted run can be resumed.
+
+        Returns:
+            dict: A JSON-serializable dictionary of the iteration state.
+        """
+        return {
+            "failed_test_runs": self.failed_test_runs,
+            "current_coverage": self.current_coverage,
+            "last_coverage_percentages": self.last_coverage_percentages,
+            "code_coverage_report": self.code_coverage_report,
+            "test_headers_indentation": self.test_headers_indentation,
+            "relevant_line_number_to_insert_tests_after": self.relevant_line_number_to_insert_tests_after,
+            "relevant_line_number_to_insert_imports_after": self.relevant_line_number_to_insert_imports_after,
+            "testing_framework": self.testing_framework,
+            "total_input_token_count": self.total_input_token_count,
+            "total_output_token_count": self.total_output_token_count,
+            "baseline_covered_bitmap": self.coverage_processor.baseline_covered_bitmap,
+            "baseline_statements_bitmap": self.coverage_processor.baseline_statements_bitmap,
+        }
+
+    def restore_checkpoint_state(self, state: dict):
+        """
+        Restore the state saved by `get_checkpoint_state`, instead of running the initial test suite analysis and coverage.
+
+        Parameters:
+            state (dict): The saved iteration state.
+        """
+        self.failed_test_runs = state["failed_test_runs"]
+        self.current_coverage = state["current_coverage"]
+        self.last_coverage_percentages = state["last_coverage_percentages"]
+        self.code_coverage_report = state["code_coverage_report"]
+        self.test_headers_indentation = state["test_headers_indentation"]
+        self.relevant_line_number_to_insert_tests_after = state["relevant_line_number_to_insert_tests_after"]
+        self.relevant_line_number_to_insert_imports_after = state["relevant_line_number_to_insert_imports_after"]
+        self.testing_framework = state["testing_framework"]
+        self.total_input_token_count = state["total_input_token_count"]
+        self.total_output_token_count = state["total_output_token_count"]
+        self.coverage_processor.baseline_covered_bitmap = state["baseline_covered_bitmap"]
+        self.coverage_processor.baseline_statements_bitmap = state["baseline_statements_bitmap"]
+        self._init_prompt_builder()
+
     def run_coverage(self):
         """
         Perform an initial build/test command to generate coverage report and get a baseline.
@@ -287,11 +419,12 @@ class UnitTestValidator:
             f'Running build/test command to generate coverage report: "{self.test_command}"'
         )
         stdout, stderr, exit_code, time_of_test_command = Runner.run_command(
-            command=self.test_command, cwd=self.test_command_dir
+            command=self.test_command, cwd=self.test_command_dir, timeout=self._get_test_timeout()
         )
         assert (
             exit_code == 0
         ), f'Fatal: Error running test command. Are you sure the command is correct? "{self.test_command}"\nExit code {exit_code}. \nStdout: \n{stdout} \nStderr: \n{stderr}'
+        self._record_baseline_duration()
 
         try:
             # Process the extracted coverage metrics
@@ -303,6 +436,9 @@ class UnitTestValidator:
             self.logger.info(
                 f"Initial coverage: {round(self.current_coverage * 100, 2)}%"
             )
+            if self._per_test_coverage_supported():
+                lines_covered, lines_missed, _ = self.coverage_processor.parse_coverage_report()
+                self.coverage_processor.set_coverage_baseline(lines_covered, lines_missed)
             
         except AssertionError as error:
             # Handle the case where the coverage report does not exist or was not updated after the test command
@@ -318,6 +454,34 @@ class UnitTestValidator:
             with open(self.code_coverage_report_path, "r") as f:
                 self.code_coverage_report = f.read()
 
+    def _get_test_timeout(self):
+        """
+        Returns:
+            float: The timeout of test runs, adapted to the recent durations of the baseline test command (see `Runner.adaptive_timeout`),
+                   or None to use the static timeout.
+        """
+        if self.baseline_durations is None:
+            history_size = get_settings().get("tests.timeout_history_size", 10)
+            self.baseline_durations = (
+                self.test_db.get_command_durations(self._get_timeout_project(), self.test_command, history_size)
+                if self.test_db is not None
+                else []
+            )
+        return Runner.adaptive_timeout(self.baseline_durations)
+
+    def _record_baseline_duration(self):
+        duration = Runner.get_last_run_stats().get("wall_time_seconds")
+        if duration is None or not get_settings().get("tests.adaptive_timeout", True):
+            return
+        history_size = get_settings().get("tests.timeout_history_size", 10)
+        self.baseline_durations = ([duration] + (self.baseline_durations or []))[:history_size]
+        if self.test_db is not None:
+            self.test_db.insert_command_duration(self._get_timeout_project(), self.test_command, duration, history_size)
+        self.logger.info(f"Baseline test run took {duration} seconds. Test run timeout: {self._get_test_timeout()} seconds")
+
+    def _get_timeout_project(self) -> str:
+        return os.path.abspath(self.project_root or self.test_command_dir)
+
     @staticmethod
     def get_included_files(included_files):
         """
@@ -349,6 +513,7 @@ class UnitTestValidator:
             return out_str.strip()
         return ""
 
+    @Profiler.timed("validator.validate_test")
     def validate_test(self, generated_test: dict):
         """
         Validate a generated test by inserting it into the test file, running the test, and checking for pass/fail.
@@ -381,85 +546,30 @@ class UnitTestValidator:
             original_content = test_file.read()
 
         try:
-            # Step 0: no pre-process.
-            # We asked the model that each generated test should be a self-contained independent test
-            test_code = generated_test.get("test_code", "").rstrip()
-            additional_imports = generated_test.get("new_imports_code", "").strip()
-            if (
-                additional_imports
-                and additional_imports[0] == '"'
-                and additional_imports[-1] == '"'
-            ):
-                additional_imports = additional_imports.strip('"')
-
-            # check if additional_imports only contains '"':
-            if additional_imports and additional_imports == '""':
-                additional_imports = ""
-            relevant_line_number_to_insert_tests_after = (
-                self.relevant_line_number_to_insert_tests_after
-            )
-            relevant_line_number_to_insert_imports_after = (
-                self.relevant_line_number_to_insert_imports_after
-            )
-
-            needed_indent = self.test_headers_indentation
-            # remove initial indent of the test code, and insert the needed indent
-            test_code_indented = test_code
-            if needed_indent:
-                initial_indent = len(test_code) - len(test_code.lstrip())
-                delta_indent = int(needed_indent) - initial_indent
-                if delta_indent > 0:
-                    test_code_indented = "\n".join(
-                        [delta_indent * " " + line for line in test_code.split("\n")]
-                    )
-            test_code_indented = "\n" + test_code_indented.strip("\n") + "\n"
+            # Step 1: Insert the generated test to the relevant line in the test file
+            processed_test, additional_imports_lines = self._insert_generated_test(
+                original_content, generated_test
+            )
             exit_code = 0
-            if test_code_indented and relevant_line_number_to_insert_tests_after:
-                # Step 1: Insert the generated test to the relevant line in the test file
-                additional_imports_lines = ""
-                original_content_lines = original_content.split("\n")
-                test_code_lines = test_code_indented.split("\n")
-                # insert the test code at the relevant line
-                processed_test_lines = (
-                    original_content_lines[:relevant_line_number_to_insert_tests_after]
-                    + test_code_lines
-                    + original_content_lines[
-                        relevant_line_number_to_insert_tests_after:
-                    ]
-                )
-                # insert the additional imports at line 'relevant_line_number_to_insert_imports_after'
-                processed_test = "\n".join(processed_test_lines)
-                if (
-                    relevant_line_number_to_insert_imports_after
-                    and additional_imports
-                    and additional_imports not in processed_test
-                ):
-                    additional_imports_lines = additional_imports.split("\n")
-                    processed_test_lines = (
-                        processed_test_lines[
-                            :relevant_line_number_to_insert_imports_after
-                        ]
-                        + additional_imports_lines
-                        + processed_test_lines[
-                            relevant_line_number_to_insert_imports_after:
-                        ]
-                    )
-                processed_test = "\n".join(processed_test_lines)
+            if processed_test is not None:
                 with open(self.test_file_path, "w") as test_file:
                     test_file.write(processed_test)
                     test_file.flush()
 
                 # Step 2: Run the test using the Runner class
+                single_test_command = self._get_single_test_command(generated_test, original_content)
+                test_command = single_test_command or self.test_command
                 for i in range(self.num_attempts):
                     self.logger.info(
-                        f'Running test with the following command: "{self.test_command}"'
+                        f'Running test with the following command: "{test_command}"'
                     )
                     stdout, stderr, exit_code, time_of_test_command = Runner.run_command(
-                        command=self.test_command, cwd=self.test_command_dir
+                        command=test_command, cwd=self.test_command_dir, timeout=self._get_test_timeout()
                     )
                     if exit_code != 0:
                         break
-                
+                # CPU time and peak memory of the (last) test run, stored with the attempt
+                run_stats = Runner.get_last_run_stats()
 
                 # Step 3: Check for pass/fail from the Runner object
                 if exit_code != 0:
@@ -478,6 +588,7 @@ class UnitTestValidator:
                         "source_file": self.source_code,
                         "original_test_file": original_content,
                         "processed_test_file": processed_test,
+                        "run_stats": run_stats,
                     }
 
                     error_message = self.extract_error_message(fail_details)
@@ -490,22 +601,25 @@ class UnitTestValidator:
 
                     if "WANDB_API_KEY" in os.environ:
                         fail_details["error_message"] = error_message
-                        root_span = Trace(
-                            name="fail_details_"
-                            + datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S"),
-                            kind="llm",  # kind can be "llm", "chain", "agent" or "tool
-                            inputs={"test_code": fail_details["test"]},
-                            outputs=fail_details,
-                        )
-                        root_span.log(name="inference")
+                        self._log_fail_details_to_wandb(fail_details)
 
                     return fail_details
 
                 # If test passed, check for coverage increase
+                baseline = (
+                    self.coverage_processor.baseline_covered_bitmap,
+                    self.coverage_processor.baseline_statements_bitmap,
+                    self.code_coverage_report,
+                )
                 try:
-                    new_percentage_covered, new_coverage_percentages = self.post_process_coverage_report(
-                        time_of_test_command
-                    )
+                    if single_test_command:
+                        new_percentage_covered, new_coverage_percentages = self.post_process_single_test_coverage(
+                            time_of_test_command
+                        )
+                    else:
+                        new_percentage_covered, new_coverage_percentages = self.post_process_coverage_report(
+                            time_of_test_command
+                        )
 
                     if new_percentage_covered <= self.current_coverage:
                         # Coverage has not increased, rollback the test by removing it from the test file
@@ -526,6 +640,7 @@ class UnitTestValidator:
                             "source_file": self.source_code,
                             "original_test_file": original_content,
                             "processed_test_file": processed_test,
+                            "run_stats": run_stats,
                         }
                         self.failed_test_runs.append(
                             {
@@ -535,14 +650,7 @@ class UnitTestValidator:
                         )  # Append failure details to the list
 
                         if "WANDB_API_KEY" in os.environ:
-                            root_span = Trace(
-                                name="fail_details_"
-                                + datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S"),
-                                kind="llm",  # kind can be "llm", "chain", "agent" or "tool
-                                inputs={"test_code": fail_details["test"]},
-                                outputs=fail_details,
-                            )
-                            root_span.log(name="inference")
+                            self._log_fail_details_to_wandb(fail_details)
 
                         return fail_details
                 except Exception as e:
@@ -552,6 +660,11 @@ class UnitTestValidator:
                     with open(self.test_file_path, "w") as test_file:
                         test_file.write(original_content)
                         test_file.flush()
+                    (
+                        self.coverage_processor.baseline_covered_bitmap,
+                        self.coverage_processor.baseline_statements_bitmap,
+                        self.code_coverage_report,
+                    ) = baseline
 
                     fail_details = {
                         "status": "FAIL",
@@ -564,6 +677,7 @@ class UnitTestValidator:
                         "source_file": self.source_code,
                         "original_test_file": original_content,
                         "processed_test_file": processed_test,
+                        "run_stats": run_stats,
                     }
                     self.failed_test_runs.append(
                         {
@@ -573,6 +687,45 @@ class UnitTestValidator:
                     )  # Append failure details to the list
                     return fail_details
 
+                if single_test_command:
+                    # The test passed on its own: check that the test suite still passes with it, before accepting it
+                    self.logger.info(
+                        f'Running the test suite with the following command: "{self.test_command}"'
+                    )
+                    stdout, stderr, exit_code, _ = Runner.run_command(
+                        command=self.test_command, cwd=self.test_command_dir, timeout=self._get_test_timeout()
+                    )
+                    if exit_code != 0:
+                        with open(self.test_file_path, "w") as test_file:
+                            test_file.write(original_content)
+                        (
+                            self.coverage_processor.baseline_covered_bitmap,
+                            self.coverage_processor.baseline_statements_bitmap,
+                            self.code_coverage_report,
+                        ) = baseline
+                        self.logger.info("Skipping a generated test that passed on its own, but breaks the test suite")
+                        fail_details = {
+                            "status": "FAIL",
+                            "reason": "Test failed",
+                            "exit_code": exit_code,
+                            "stderr": stderr,
+                            "stdout": stdout,
+                            "test": generated_test,
+                            "language": self.language,
+                            "source_file": self.source_code,
+                            "original_test_file": original_content,
+                            "processed_test_file": processed_test,
+                            "run_stats": Runner.get_last_run_stats(),
+                        }
+                        error_message = self.extract_error_message(fail_details)
+                        if error_message:
+                            logging.error(f"Error message summary:\n{error_message}")
+                        self.failed_test_runs.append({"code": generated_test, "error_message": error_message})
+                        if "WANDB_API_KEY" in os.environ:
+                            fail_details["error_message"] = error_message
+                            self._log_fail_details_to_wandb(fail_details)
+                        return fail_details
+
                 # If we got here, everything passed and coverage increased - update current coverage and log success,
                 # and increase 'relevant_line_number_to_insert_tests_after' by the number of imports lines added
                 self.relevant_line_number_to_insert_tests_after += len(
@@ -605,6 +758,7 @@ class UnitTestValidator:
                     "source_file": self.source_code,
                     "original_test_file": original_content,
                     "processed_test_file": processed_test,
+                    "run_stats": run_stats,
                 }
         except Exception as e:
             self.logger.error(f"Error validating test: {e}")
@@ -621,6 +775,577 @@ class UnitTestValidator:
                 "processed_test_file": "N/A",
             }
 
+    def _insert_generated_test(self, original_content: str, generated_test: dict, insert_tests_after: int = None):
+        """
+        Insert a generated test, and its additional imports, into the content of the test file.
+
+        Parameters:
+            original_content (str): The current content of the test file.
+            generated_test (dict): The generated test, containing test code and additional imports.
+            insert_tests_after (int, optional): The line to insert the test after. Defaults to `relevant_line_number_to_insert_tests_after`.
+
+        Returns:
+            tuple: The processed test file content (None if the test could not be inserted), and the list of import lines that were added.
+        """
+        # We asked the model that each generated test should be a self-contained independent test
+        test_code = generated_test.get("test_code", "").rstrip()
+        additional_imports = generated_test.get("new_imports_code", "").strip()
+        if (
+            additional_imports
+            and additional_imports[0] == '"'
+            and additional_imports[-1] == '"'
+        ):
+            additional_imports = additional_imports.strip('"')
+
+        # check if additional_imports only contains '"':
+        if additional_imports and additional_imports == '""':
+            additional_imports = ""
+        relevant_line_number_to_insert_tests_after = (
+            self.relevant_line_number_to_insert_tests_after if insert_tests_after is None else insert_tests_after
+        )
+        relevant_line_number_to_insert_imports_after = (
+            self.relevant_line_number_to_insert_imports_after
+        )
+
+        needed_indent = self.test_headers_indentation
+        # remove initial indent of the test code, and insert the needed indent
+        test_code_indented = test_code
+        if needed_indent:
+            initial_indent = len(test_code) - len(test_code.lstrip())
+            delta_indent = int(needed_indent) - initial_indent
+            if delta_indent > 0:
+                test_code_indented = "\n".join(
+                    [delta_indent * " " + line for line in test_code.split("\n")]
+                )
+        test_code_indented = "\n" + test_code_indented.strip("\n") + "\n"
+        if not (test_code_indented and relevant_line_number_to_insert_tests_after):
+            return None, []
+
+        additional_imports_lines = []
+        original_content_lines = original_content.split("\n")
+        test_code_lines = test_code_indented.split("\n")
+        # insert the test code at the relevant line
+        processed_test_lines = (
+            original_content_lines[:relevant_line_number_to_insert_tests_after]
+            + test_code_lines
+            + original_content_lines[relevant_line_number_to_insert_tests_after:]
+        )
+        # insert the additional imports at line 'relevant_line_number_to_insert_imports_after'
+        processed_test = "\n".join(processed_test_lines)
+        if (
+            relevant_line_number_to_insert_imports_after
+            and additional_imports
+            and additional_imports not in processed_test
+        ):
+            additional_imports_lines = additional_imports.split("\n")
+            processed_test_lines = (
+                processed_test_lines[:relevant_line_number_to_insert_imports_after]
+                + additional_imports_lines
+                + processed_test_lines[relevant_line_number_to_insert_imports_after:]
+            )
+        processed_test = "\n".join(processed_test_lines)
+        return processed_test, additional_imports_lines
+
+    def _log_fail_details_to_wandb(self, fail_details: dict):
+        root_span = Trace(
+            name="fail_details_"
+            + datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S"),
+            kind="llm",  # kind can be "llm", "chain", "agent" or "tool
+            inputs={"test_code": fail_details["test"]},
+            outputs=fail_details,
+        )
+        root_span.log(name="inference")
+
+    def validate_tests_in_sandboxes(self, generated_tests: list, num_workers: int) -> list:
+        """
+        Validate several generated tests concurrently, each one in an isolated scratch copy of the project.
+
+        Every candidate is run in its own sandbox (see SandboxPool) against the baseline coverage. Candidates that fail, or that
+        do not increase the coverage, are rejected right away, and so is a candidate whose covered lines are all covered by the
+        candidates accepted before it. The sandbox runs are reused as the results of the candidates: a single accepted
+        candidate is merged into the real test file without running the test suite again, and several accepted candidates are
+        merged with a single confirming run of the test suite. Only when the confirming run shows that the candidates interact
+        (it fails) are they validated again one by one, in the order they were generated, using `validate_test`.
+
+        The sandboxes are created on the first call and reused by the next ones, see `cleanup_sandboxes`.
+
+        Parameters:
+            generated_tests (list): The generated tests to validate.
+            num_workers (int): The maximal number of candidates to validate concurrently.
+
+        Returns:
+            list: The validation results, in the same order as `generated_tests`.
+        """
+        if num_workers <= 1 or len(generated_tests) <= 1:
+            return [self.validate_test(generated_test) for generated_test in generated_tests]
+        if self.diff_coverage or self.use_report_coverage_feature_flag:
+            self.logger.info(
+                "Parallel validation is not supported with diff coverage or report coverage. Validating tests serially."
+            )
+            return [self.validate_test(generated_test) for generated_test in generated_tests]
+
+        sandbox_pool = self._get_sandbox_pool(num_workers)
+        if sandbox_pool is None:
+            return [self.validate_test(generated_test) for generated_test in generated_tests]
+
+        with open(self.test_file_path, "r") as test_file:
+            original_content = test_file.read()
+        baseline_coverage = self.current_coverage
+
+        with ThreadPoolExecutor(max_workers=sandbox_pool.size) as executor:
+            sandbox_runs = list(
+                executor.map(
+                    lambda generated_test: self._run_test_in_sandbox(sandbox_pool, generated_test, original_content),
+                    generated_tests,
+                )
+            )
+
+        # Decide the candidates from their sandbox runs, in the order they were generated
+        decisions = {}
+        accepted = []
+        accepted_lines = set()
+        for i, run in enumerate(sandbox_runs):
+            if run is None:
+                continue
+            if run["exit_code"] != 0:
+                decisions[i] = ("Test failed", run)
+            elif run["percentage_covered"] <= baseline_coverage or (accepted and set(run["lines_covered"]) <= accepted_lines):
+                decisions[i] = ("Coverage did not increase", run)
+            else:
+                decisions[i] = ("", run)
+                accepted.append(i)
+                accepted_lines |= set(run["lines_covered"])
+
+        # Tests that could not be run in a sandbox are validated serially
+        revalidate = [i for i, run in enumerate(sandbox_runs) if run is None]
+        if len(accepted) == 1:
+            # The sandbox ran the test suite with exactly this candidate added: its coverage is the new coverage
+            run = decisions[accepted[0]][1]
+            self.current_coverage = run["percentage_covered"]
+            self.last_coverage_percentages = run["coverage_percentages"].copy()
+            self.code_coverage_report = run["code_coverage_report"]
+        elif len(accepted) > 1 and not self._confirm_sandbox_candidates(original_content, generated_tests, accepted):
+            self.logger.info("The generated tests interact with each other. Validating the tests that passed serially.")
+            revalidate = sorted(revalidate + accepted)
+            accepted = []
+
+        decided = [i for i in range(len(generated_tests)) if i not in revalidate]
+        batch = {
+            "original_content": original_content,
+            "generated_tests": [generated_tests[i] for i in decided],
+            "decisions": {position: decisions[i] for position, i in enumerate(decided)},
+        }
+        with open(self.test_file_path, "w") as test_file:
+            test_file.write(self._build_batch_content(batch, [decided.index(i) for i in accepted]))
+        if self._per_test_coverage_supported() and self.coverage_processor.baseline_covered_bitmap is not None:
+            for i in accepted:
+                self.coverage_processor.merge_into_baseline(decisions[i][1]["lines_covered"])
+        if accepted:
+            self.logger.info(
+                f"{len(accepted)} tests passed and increased coverage. Current coverage: {round(self.current_coverage * 100, 2)}%"
+            )
+
+        results = dict(zip(decided, self._batch_results(batch)))
+        for i in revalidate:
+            results[i] = self.validate_test(generated_tests[i])
+        return [results[i] for i in range(len(generated_tests))]
+
+    def _get_sandbox_pool(self, num_workers: int):
+        """
+        Get the sandboxes of the run, creating them on the first call.
+
+        Returns:
+            SandboxPool: The sandboxes, or None if the files of the run are not all located inside the project, in which case the
+                         tests should be validated serially.
+        """
+        if self.sandbox_pool is not None:
+            return self.sandbox_pool
+
+        sandbox_root = self.project_root or self.test_command_dir
+        sandbox_pool = SandboxPool(
+            source_dir=sandbox_root,
+            size=num_workers,
+            link_mode=get_settings().get("sandbox.link_mode", "copy"),
+            ignore_patterns=get_settings().get("sandbox.ignore_patterns", [".git"]),
+            private_paths=[self.test_file_path, self.code_coverage_report_path],
+        )
+        if not all(
+            sandbox_pool.contains(path)
+            for path in [self.test_file_path, self.code_coverage_report_path, self.source_file_path, self.test_command_dir]
+        ):
+            self.logger.info(
+                f"Not all of the test file, coverage report, source file and test command directory are located inside {sandbox_root}. Validating tests serially."
+            )
+            return None
+
+        sandbox_pool.create()
+        atexit.register(self.cleanup_sandboxes)
+        self.sandbox_pool = sandbox_pool
+        return sandbox_pool
+
+    def cleanup_sandboxes(self):
+        """
+        Remove the sandboxes created by `validate_tests_in_sandboxes`, once the run is over.
+        """
+        if self.sandbox_pool is not None:
+            self.sandbox_pool.cleanup()
+            self.sandbox_pool = None
+
+    def _run_test_in_sandbox(self, sandbox_pool: SandboxPool, generated_test: dict, original_content: str):
+        """
+        Run the test suite with a single generated test added, inside a sandbox.
+
+        Only the test file changes between iterations, so it is the only file written to the sandbox: it is rewritten with the
+        current content of the real test file and the candidate. The coverage report is written by the run itself.
+
+        Returns:
+            dict: The output and exit code of the run, and its coverage if the run passed (see `_run_batch`), or None if the test
+                  could not be run in the sandbox and should be validated serially.
+        """
+        sandbox_root = sandbox_pool.acquire()
+        try:
+            processed_test, _ = self._insert_generated_test(original_content, generated_test)
+            if processed_test is None:
+                return None
+            sandbox_pool.write_file(sandbox_pool.map_path(self.test_file_path, sandbox_root), processed_test)
+
+            command = sandbox_pool.map_command(self.test_command, sandbox_root)
+            for i in range(self.num_attempts):
+                self.logger.info(f'Running test in sandbox with the following command: "{command}"')
+                stdout, stderr, exit_code, time_of_test_command = Runner.run_command(
+                    command=command,
+                    cwd=sandbox_pool.map_path(self.test_command_dir, sandbox_root),
+                    timeout=self._get_test_timeout(),
+                )
+                if exit_code != 0:
+                    break
+
+            run = {
+                "exit_code": exit_code,
+                "stdout": stdout,
+                "stderr": stderr,
+                "run_stats": Runner.get_last_run_stats(),
+                "percentage_covered": None,
+                "lines_covered": [],
+                "coverage_percentages": {},
+                "code_coverage_report": "",
+            }
+            if exit_code != 0:
+                return run
+
+            coverage_processor = CoverageProcessor(
+                file_path=sandbox_pool.map_path(self.code_coverage_report_path, sandbox_root),
+                src_file_path=sandbox_pool.map_path(self.source_file_path, sandbox_root),
+                coverage_type=self.coverage_type,
+            )
+            lines_covered, lines_missed, percentage_covered = coverage_processor.process_coverage_report(
+                time_of_test_command=time_of_test_command
+            )
+            run["percentage_covered"] = percentage_covered
+            run["lines_covered"] = lines_covered
+            # Per-file percentages, as returned by `post_process_coverage_report` without the report coverage feature flag
+            run["coverage_percentages"] = {}
+            run["code_coverage_report"] = f"Lines covered: {lines_covered}\nLines missed: {lines_missed}\nPercentage covered: {round(percentage_covered * 100, 2)}%"
+            return run
+        except Exception as e:
+            # Let the serial validation handle (and record) anything unexpected
+            self.logger.warning(f"Error validating test in sandbox: {e}")
+            return None
+        finally:
+            sandbox_pool.release(sandbox_root)
+
+    def _confirm_sandbox_candidates(self, original_content: str, generated_tests: list, accepted: list) -> bool:
+        """
+        Run the test suite once in the real project, with all the candidates accepted from their sandbox runs.
+
+        Returns:
+            bool: True if the run passed, in which case the coverage is updated, or False if the candidates interact.
+        """
+        with open(self.test_file_path, "w") as test_file:
+            test_file.write(
+                self._build_batch_content({"original_content": original_content, "generated_tests": generated_tests}, accepted)
+            )
+            test_file.flush()
+
+        self.logger.info(f'Running {len(accepted)} tests with the following command: "{self.test_command}"')
+        stdout, stderr, exit_code, time_of_test_command = Runner.run_command(
+            command=self.test_command, cwd=self.test_command_dir, timeout=self._get_test_timeout()
+        )
+        confirmed = exit_code == 0
+        if confirmed:
+            try:
+                percentage_covered, coverage_percentages = self.post_process_coverage_report(time_of_test_command)
+                self.current_coverage = percentage_covered
+                self.last_coverage_percentages = coverage_percentages.copy()
+            except Exception as e:
+                self.logger.error(f"Error during coverage verification: {e}")
+                confirmed = False
+        if not confirmed:
+            with open(self.test_file_path, "w") as test_file:
+                test_file.write(original_content)
+        return confirmed
+
+    def _batch_validation_supported(self) -> bool:
+        return (
+            self.language == "python"
+            and not self.use_report_coverage_feature_flag
+            and not self.diff_coverage
+            and not self._per_test_coverage_supported()
+            and re.search(r"\bpytest\b", self.test_command) is not None
+        )
+
+    def validate_tests_in_batch(self, generated_tests: list) -> list:
+        """
+        Validate several generated tests with as few runs of the test command as possible (group testing).
+
+        All the candidates are inserted into the test file at once, and the test command is run a single time, with a JUnit XML
+        report of the per-test results. When the run fails, the candidates named in the report as failing are rejected and the
+        others are run again; a failure that cannot be attributed (e.g. a collection error) is narrowed down by bisecting the
+        candidates. When the run passes, the coverage increase is attributed the same way: a group of candidates that does not
+        increase the coverage is rejected as a whole, and a group that does is split until each candidate is decided.
+
+        Candidates are decided in the order they were generated, each one on top of the candidates accepted before it, so the
+        results are the same as those of `validate_test` called on each candidate in turn.
+
+        Parameters:
+            generated_tests (list): The generated tests to validate.
+
+        Returns:
+            list: The validation results, in the same order as `generated_tests`.
+        """
+        if len(generated_tests) <= 1 or not self._batch_validation_supported():
+            return [self.validate_test(generated_test) for generated_test in generated_tests]
+
+        with open(self.test_file_path, "r") as test_file:
+            original_content = test_file.read()
+
+        # Every candidate must be told apart in the per-test results
+        test_names = [self._get_test_name(generated_test) for generated_test in generated_tests]
+        existing_names = self._get_test_names(original_content)
+        if (
+            None in test_names
+            or len(set(test_names)) != len(test_names)
+            or existing_names.intersection(test_names)
+            or any(self._insert_generated_test(original_content, generated_test)[0] is None for generated_test in generated_tests)
+        ):
+            self.logger.info("Generated tests cannot be told apart in the test results. Validating tests serially.")
+            return [self.validate_test(generated_test) for generated_test in generated_tests]
+
+        junit_file = tempfile.NamedTemporaryFile(prefix="cover_agent_junit_", suffix=".xml", delete=False)
+        junit_file.close()
+        batch = {
+            "original_content": original_content,
+            "generated_tests": generated_tests,
+            "test_names": test_names,
+            "junit_path": junit_file.name,
+            "decisions": {},
+            "runs": 0,
+        }
+        code_coverage_report = self.code_coverage_report
+        try:
+            indices = list(range(len(generated_tests)))
+            accepted, final_run = self._validate_batch(
+                batch, [], indices, self._run_batch(batch, indices), self.current_coverage
+            )
+        finally:
+            os.remove(junit_file.name)
+
+        # Leave the test file, and the coverage, as if the accepted candidates had been validated one by one
+        with open(self.test_file_path, "w") as test_file:
+            test_file.write(self._build_batch_content(batch, accepted))
+        if final_run:
+            self.current_coverage = final_run["percentage_covered"]
+            self.last_coverage_percentages = final_run["coverage_percentages"].copy()
+            self.code_coverage_report = final_run["code_coverage_report"]
+        else:
+            self.code_coverage_report = code_coverage_report
+        self.logger.info(
+            f"Validated {len(generated_tests)} tests with {batch['runs']} runs of the test command: {len(accepted)} passed and increased coverage. "
+            f"Current coverage: {round(self.current_coverage * 100, 2)}%"
+        )
+        return self._batch_results(batch)
+
+    def _validate_batch(self, batch: dict, base: list, indices: list, run: dict, base_coverage: float):
+        """
+        Decide the candidates at `indices`, on top of the accepted candidates `base`.
+
+        Parameters:
+            batch (dict): The state of the batch validation.
+            base (list): The indices of the candidates accepted so far.
+            indices (list): The indices of the candidates to decide.
+            run (dict): The result of running `base` and `indices` together (see `_run_batch`).
+            base_coverage (float): The coverage of `base`.
+
+        Returns:
+            tuple: The accepted indices among `indices`, and the run of `base` with them (None if none was accepted).
+        """
+        if run["exit_code"] != 0:
+            failed = [i for i in indices if batch["test_names"][i] in run["failed_tests"]]
+            if failed:
+                # The per-test results point at the failing candidates: reject them, and run the others again
+                for i in failed:
+                    batch["decisions"][i] = ("Test failed", run)
+                rest = [i for i in indices if i not in failed]
+                if not rest:
+                    return [], None
+                return self._validate_batch(batch, base, rest, self._run_batch(batch, base + rest), base_coverage)
+            if len(indices) == 1:
+                batch["decisions"][indices[0]] = ("Test failed", run)
+                return [], None
+        elif run["coverage_error"]:
+            if len(indices) == 1:
+                batch["decisions"][indices[0]] = ("Runtime error", run)
+                return [], None
+        elif run["percentage_covered"] <= base_coverage:
+            for i in indices:
+                batch["decisions"][i] = ("Coverage did not increase", run)
+            return [], None
+        elif len(indices) == 1:
+            batch["decisions"][indices[0]] = ("", run)
+            return indices, run
+
+        # Split the candidates, and decide the second half on top of what the first half added
+        half = len(indices) // 2
+        left, right = indices[:half], indices[half:]
+        left_accepted, left_run = self._validate_batch(
+            batch, base, left, self._run_batch(batch, base + left), base_coverage
+        )
+        new_base = base + left_accepted
+        new_base_coverage = left_run["percentage_covered"] if left_run else base_coverage
+        # When all of the first half is accepted, the second half runs with the same tests as `run`
+        right_run = run if left_accepted == left else self._run_batch(batch, new_base + right)
+        right_accepted, last_run = self._validate_batch(batch, new_base, right, right_run, new_base_coverage)
+        return left_accepted + right_accepted, last_run if right_accepted else left_run
+
+    def _build_batch_content(self, batch: dict, indices: list) -> str:
+        # Insert the candidates in order, the same way `validate_test` inserts the tests it accepts
+        content = batch["original_content"]
+        insert_tests_after = self.relevant_line_number_to_insert_tests_after
+        for i in sorted(indices):
+            content, additional_imports_lines = self._insert_generated_test(
+                content, batch["generated_tests"][i], insert_tests_after=insert_tests_after
+            )
+            insert_tests_after += len(additional_imports_lines)
+        return content
+
+    def _run_batch(self, batch: dict, indices: list) -> dict:
+        """
+        Run the test command with the candidates at `indices` inserted into the test file.
+
+        Returns:
+            dict: The output and exit code of the run, the names of the failing tests, and the coverage if the run passed.
+        """
+        with open(self.test_file_path, "w") as test_file:
+            test_file.write(self._build_batch_content(batch, indices))
+            test_file.flush()
+
+        junit_path = batch["junit_path"]
+        pytest_match = re.search(r"\bpytest\b", self.test_command)
+        command = f"{self.test_command[:pytest_match.end()]} --junitxml={junit_path}{self.test_command[pytest_match.end():]}"
+        for i in range(self.num_attempts):
+            self.logger.info(f'Running {len(indices)} tests with the following command: "{command}"')
+            open(junit_path, "w").close()
+            stdout, stderr, exit_code, time_of_test_command = Runner.run_command(
+                command=command, cwd=self.test_command_dir, timeout=self._get_test_timeout()
+            )
+            batch["runs"] += 1
+            if exit_code != 0:
+                break
+
+        run = {
+            "exit_code": exit_code,
+            "stdout": stdout,
+            "stderr": stderr,
+            "failed_tests": self._read_failed_tests(junit_path) if exit_code != 0 else set(),
+            "run_stats": Runner.get_last_run_stats(),
+            "coverage_error": "",
+            "percentage_covered": None,
+            "coverage_percentages": {},
+            "code_coverage_report": "",
+        }
+        if exit_code == 0:
+            try:
+                run["percentage_covered"], run["coverage_percentages"] = self.post_process_coverage_report(
+                    time_of_test_command
+                )
+                run["code_coverage_report"] = self.code_coverage_report
+            except Exception as e:
+                self.logger.error(f"Error during coverage verification: {e}")
+                run["coverage_error"] = str(e)
+        return run
+
+    @staticmethod
+    def _read_failed_tests(junit_path: str) -> set:
+        """
+        Returns:
+            set: The names of the test functions that failed or errored in a JUnit XML report (without pytest parameters).
+        """
+        try:
+            tree = ET.parse(junit_path)
+        except (ET.ParseError, OSError):
+            return set()
+        return {
+            testcase.get("name", "").split("[")[0]
+            for testcase in tree.iter("testcase")
+            if testcase.find("failure") is not None or testcase.find("error") is not None
+        }
+
+    def _batch_results(self, batch: dict) -> list:
+        """
+        Build the validation result of every candidate, as `validate_test` would have returned it.
+        """
+        results = []
+        content = batch["original_content"]
+        insert_tests_after = self.relevant_line_number_to_insert_tests_after
+        for i, generated_test in enumerate(batch["generated_tests"]):
+            reason, run = batch["decisions"][i]
+            processed_test, additional_imports_lines = self._insert_generated_test(
+                content, generated_test, insert_tests_after=insert_tests_after
+            )
+            if reason == "Coverage did not increase":
+                reason = "Coverage did not increase. Maybe the test did run but did not increase coverage, or maybe the test execution was skipped due to some problem"
+            results.append(
+                {
+                    "status": "PASS" if reason == "" else "FAIL",
+                    "reason": reason,
+                    "exit_code": run["exit_code"],
+                    "stderr": run["stderr"],
+                    "stdout": run["stdout"],
+                    "test": generated_test,
+                    "language": self.language,
+                    "source_file": self.source_code,
+                    "original_test_file": content,
+                    "processed_test_file": processed_test,
+                    "run_stats": run["run_stats"],
+                }
+            )
+            if reason == "":
+                content = processed_test
+                insert_tests_after += len(additional_imports_lines)
+        # The next tests are inserted after the imports added by the accepted tests
+        self.relevant_line_number_to_insert_tests_after = insert_tests_after
+
+        # Analyze all the failed runs at once
+        failed_results = [result for result in results if result["reason"] == "Test failed"]
+        error_messages = iter(self.extract_error_messages(failed_results))
+        for result in results:
+            if result["reason"] == "Test failed":
+                self.logger.info(f"Skipping a generated test that failed")
+                error_message = next(error_messages)
+                if error_message:
+                    logging.error(f"Error message summary:\n{error_message}")
+                self.failed_test_runs.append({"code": result["test"], "error_message": error_message})
+                if "WANDB_API_KEY" in os.environ:
+                    result["error_message"] = error_message
+                    self._log_fail_details_to_wandb(result)
+            elif result["reason"] == "Runtime error":
+                self.failed_test_runs.append({"code": result["test"], "error_message": "Coverage verification error"})
+            elif result["status"] == "FAIL":
+                self.failed_test_runs.append({"code": result["test"], "error_message": "Test did not increase code coverage"})
+                if "WANDB_API_KEY" in os.environ:
+                    self._log_fail_details_to_wandb(result)
+        return results
+
     def to_dict(self):
         return {
             "source_file_path": self.source_file_path,
@@ -657,20 +1382,7 @@ class UnitTestValidator:
             str: The error summary extracted from the response or a default error message if extraction fails.
         """
         try:
-            # Update the PromptBuilder object with stderr and stdout
-            self.prompt_builder.stderr_from_run = fail_details["stderr"]
-            self.prompt_builder.stdout_from_run = fail_details["stdout"]
-            self.prompt_builder.processed_test_file = fail_details["processed_test_file"]
-
-            # Build the prompt
-            custom_prompt = self.prompt_builder.build_prompt_custom(
-                file="analyze_test_run_failure"
-            )
-
-            # Reset the stderr, stdout, and processed test file in the prompt builder
-            self.prompt_builder.stderr_from_run = ""
-            self.prompt_builder.stdout_from_run = ""
-            self.prompt_builder.processed_test_file = ""
+            custom_prompt = self._build_error_analysis_prompt(fail_details)
 
             # Run the analysis via LLM
             response, prompt_token_count, response_token_count = (
@@ -689,6 +1401,54 @@ class UnitTestValidator:
             logging.error(f"Error extracting error message: {e}")
             return ""
 
+    def extract_error_messages(self, fail_details_list: list) -> list:
+        """
+        Batch version of `extract_error_message`: analyzes several failed test runs with concurrent LLM calls.
+
+        Parameters:
+            fail_details_list (list): The failure details of each failed test run.
+
+        Returns:
+            list: The error summary for each failed test run, in order. An empty string is returned for a run that could not be analyzed.
+        """
+        if not fail_details_list:
+            return []
+        try:
+            prompts = [self._build_error_analysis_prompt(fail_details) for fail_details in fail_details_list]
+            responses = self.ai_caller.call_model_batch(prompts)
+        except Exception as e:
+            logging.error(f"Error extracting error messages: {e}")
+            return [""] * len(fail_details_list)
+
+        error_messages = []
+        for response in responses:
+            if isinstance(response, Exception):
+                logging.error(f"Error extracting error message: {response}")
+                error_messages.append("")
+                continue
+            output_str, prompt_token_count, response_token_count = response
+            self.total_input_token_count += prompt_token_count
+            self.total_output_token_count += response_token_count
+            error_messages.append(output_str.strip())
+        return error_messages
+
+    def _build_error_analysis_prompt(self, fail_details: dict) -> dict:
+        # Update the PromptBuilder object with stderr and stdout
+        self.prompt_builder.stderr_from_run = fail_details["stderr"]
+        self.prompt_builder.stdout_from_run = fail_details["stdout"]
+        self.prompt_builder.processed_test_file = fail_details["processed_test_file"]
+
+        # Build the prompt
+        custom_prompt = self.prompt_builder.build_prompt_custom(
+            file="analyze_test_run_failure"
+        )
+
+        # Reset the stderr, stdout, and processed test file in the prompt builder
+        self.prompt_builder.stderr_from_run = ""
+        self.prompt_builder.stdout_from_run = ""
+        self.prompt_builder.processed_test_file = ""
+        return custom_prompt
+
     def post_process_coverage_report(self, time_of_test_command):
         coverage_percentages = {}
         if self.use_report_coverage_feature_flag:
@@ -726,7 +1486,8 @@ class UnitTestValidator:
                 f"coverage: Percentage {round(percentage_covered * 100, 2)}%"
             )
         elif self.diff_coverage:
-            self.generate_diff_coverage_report()
+            if self.diff_coverage_engine is None:
+                self.generate_diff_coverage_report()
             lines_covered, lines_missed, percentage_covered = (
                 self.coverage_processor.process_coverage_report(
                     time_of_test_command=time_of_test_command
@@ -743,6 +1504,74 @@ class UnitTestValidator:
         return percentage_covered, coverage_percentages
 
 
+    def _per_test_coverage_supported(self) -> bool:
+        return (
+            self.per_test_coverage
+            and self.language == "python"
+            and self.coverage_type in ("cobertura", "coveragepy")
+            and not self.use_report_coverage_feature_flag
+            and not self.diff_coverage
+            and re.search(r"\bpytest\b", self.test_command) is not None
+        )
+
+    def _get_single_test_command(self, generated_test: dict, original_content: str):
+        """
+        Build a test command that runs only the generated test, for the per-test coverage mode.
+
+        Parameters:
+            generated_test (dict): The generated test.
+            original_content (str): The content of the test file before the generated test was inserted.
+
+        Returns:
+            str: The test command with a pytest `-k` selection of the generated test, or None if the whole test suite should be run instead.
+        """
+        if not self._per_test_coverage_supported() or self.coverage_processor.baseline_covered_bitmap is None:
+            return None
+        test_name = self._get_test_name(generated_test)
+        if not test_name or test_name in self._get_test_names(original_content):
+            # A test that redefines an existing test shadows it: only the whole test suite shows the coverage it loses
+            return None
+        pytest_match = re.search(r"\bpytest\b", self.test_command)
+        return f"{self.test_command[:pytest_match.end()]} -k {test_name}{self.test_command[pytest_match.end():]}"
+
+    @staticmethod
+    def _get_test_name(generated_test: dict):
+        test_name_match = TEST_FUNCTION_PATTERN.search(generated_test.get("test_code", ""))
+        return test_name_match.group(1) if test_name_match else None
+
+    @staticmethod
+    def _get_test_names(content: str) -> set:
+        """
+        Returns:
+            set: The names of the test functions defined in the content of a test file.
+        """
+        return set(TEST_FUNCTION_PATTERN.findall(content))
+
+    def post_process_single_test_coverage(self, time_of_test_command):
+        """
+        Compare the lines covered by a single-test run against the baseline coverage of the test suite.
+
+        The test is considered to increase the coverage if it covers at least one line that the baseline does not cover, in which
+        case these lines are merged into the baseline. Other tests selected by the same `-k` expression are part of the test suite,
+        so they can never add lines to the baseline.
+
+        Returns:
+            tuple: The coverage percentage of the (updated) baseline, and an empty dictionary of per-file coverage percentages.
+        """
+        lines_covered, _, _ = self.coverage_processor.process_coverage_report(
+            time_of_test_command=time_of_test_command
+        )
+        new_lines = self.coverage_processor.new_covered_lines(lines_covered)
+        if not new_lines:
+            return self.coverage_processor.baseline_coverage_percentage(), {}
+
+        self.logger.info(f"Test covers {len(new_lines)} new lines: {new_lines}")
+        self.coverage_processor.merge_into_baseline(lines_covered)
+        lines_covered, lines_missed, percentage_covered = self.coverage_processor.baseline_coverage()
+        self.code_coverage_report = f"Lines covered: {lines_covered}\nLines missed: {lines_missed}\nPercentage covered: {round(percentage_covered * 100, 2)}%"
+        return percentage_covered, {}
+
+    @Profiler.timed("validator.generate_diff_coverage_report")
     def generate_diff_coverage_report(self):
         # Run the diff-cover command to generate a JSON diff coverage report
         coverage_filename = os.path.basename(self.code_coverage_report_path)
@@ -64,6 +64,29 @@ class FileMap:
         res = context.format()
         return res
 
+    def function_ranges(self) -> list:
+        """
+        Find the function and method definitions of the file.
+
+        Returns:
+            list: A (first line, first line of the body, last line) tuple for every definition, with 0-indexed line numbers.
+                  The lines before the first line of the body are the signature of the function.
+        """
+        query_results = self.get_query_results()
+        if not query_results:
+            return []
+        _, captures = query_results
+        ranges = []
+        for node, tag in captures:
+            if tag not in ("definition.function", "definition.method"):
+                continue
+            start, end = node.start_point[0], node.end_point[0]
+            body = node.child_by_field_name("body")
+            body_start = body.start_point[0] if body is not None else end + 1
+            # A function defined on a single line is its own signature
+            ranges.append((start, max(body_start, start + 1), end))
+        return ranges
+
     def query_processing(self, query_results: list):
         if not query_results:
             return ""
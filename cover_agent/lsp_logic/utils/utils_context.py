@@ -35,7 +35,10 @@ async def analyze_context(test_file, context_files, args, ai_caller):
         system_prompt = environment.from_string(get_settings().analyze_test_against_context.system).render(variables)
         user_prompt = environment.from_string(get_settings().analyze_test_against_context.user).render(variables)
         response, prompt_token_count, response_token_count = (
-            ai_caller.call_model(prompt={"system": system_prompt, "user": user_prompt}, stream=False)
+            await ai_caller.acall_model(
+                prompt={"system": system_prompt, "user": user_prompt, "prompt_type": "analyze_test_against_context"},
+                stream=False,
+            )
         )
         response_dict = load_yaml(response)
         if int(response_dict.get('is_this_a_unit_test', 0)) == 1:
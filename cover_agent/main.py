@@ -49,7 +49,7 @@ def parse_args():
     parser.add_argument(
         "--coverage-type",
         default="cobertura",
-        help="Type of coverage report. Default: %(default)s.",
+        help='Type of coverage report: "cobertura", "lcov", "jacoco", or "coveragepy" (the native .coverage data file of coverage.py). Default: %(default)s.',
     )
     parser.add_argument(
         "--report-filepath",
@@ -99,6 +99,17 @@ def parse_args():
         default="",
         help="Path to optional log database. Default: %(default)s.",
     )
+    parser.add_argument(
+        "--llm-cache-path",
+        default="",
+        help="Path to an optional on-disk cache of LLM responses, reused when the same prompt is sent again. Default: %(default)s (no cache).",
+    )
+    parser.add_argument(
+        "--llm-cache-mode",
+        choices=["read-write", "read-only", "bypass"],
+        default="read-write",
+        help="How the LLM response cache is used: 'read-write', 'read-only' (never store new responses), or 'bypass' (always call the model, but store the fresh responses). Default: %(default)s.",
+    )
 
     parser.add_argument(
         "--branch",
@@ -126,6 +137,65 @@ def parse_args():
         default=False,
         help="Run each test separately. Default: False"
     )
+    parser.add_argument(
+        "--parallel-validation-workers",
+        type=int,
+        default=1,
+        help="Number of generated tests to validate concurrently, each in an isolated copy of the project. Default: %(default)s.",
+    )
+    parser.add_argument(
+        "--per-test-coverage",
+        action="store_true",
+        default=False,
+        help="Validate each generated test by running only that test, and accept it if it covers at least one line not covered by the test suite. Python and pytest with Cobertura reports only. Default: False.",
+    )
+    parser.add_argument(
+        "--batch-validation",
+        action="store_true",
+        default=False,
+        help="Validate all the tests generated in an iteration with a single run of the test command, and bisect the failures using the per-test results. Python and pytest only. Default: False.",
+    )
+    parser.add_argument(
+        "--pytest-worker",
+        action="store_true",
+        default=False,
+        help="Run pytest test commands in a long-lived worker that imports pytest and its plugins once, and forks for every run. Other test commands run as usual. Default: False.",
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        default=False,
+        help="Resume an interrupted run from its last checkpoint in the log database, instead of starting over. Default: False.",
+    )
+    parser.add_argument(
+        "--profile-output",
+        default=None,
+        help="Path to a JSON file where the time spent in each phase of the run (LLM calls, test runs, coverage parsing, ...) is written. The per-phase timings are also added to the report. Default: %(default)s.",
+    )
+    parser.add_argument(
+        "--builtin-diff-coverage",
+        action="store_true",
+        default=False,
+        help="With --diff-coverage, compute the diff coverage in-process from the changed lines read once from git, instead of running diff-cover after every test run. Default: False.",
+    )
+    parser.add_argument(
+        "--source-skeleton",
+        action="store_true",
+        default=False,
+        help="Send a skeleton of the source file in the test generation prompt: the signatures of its functions, and the full bodies of the functions that contain missed lines only. Default: False.",
+    )
+    parser.add_argument(
+        "--stream-validation",
+        action="store_true",
+        default=False,
+        help="Validate every generated test as soon as it is complete in the streamed LLM response, while the next tests are still being generated. Not used with --batch-validation or --parallel-validation-workers. Default: False.",
+    )
+    parser.add_argument(
+        "--structured-output",
+        action="store_true",
+        default=False,
+        help="Ask the models that support structured output for the generated tests as a JSON object of a fixed schema, instead of YAML. Responses of other models are parsed as YAML. Default: False.",
+    )
 
 
     return parser.parse_args()
@@ -134,7 +204,11 @@ def parse_args():
 def main():
     args = parse_args()
     agent = CoverAgent(args)
-    agent.run()
+    try:
+        agent.run()
+    finally:
+        if agent.response_cache:
+            agent.response_cache.close()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,225 @@
+"""
+Fork-server for pytest runs, started by PytestWorker with the Python interpreter of the project under test.
+
+The server imports pytest, its plugins and the modules given with --preload once, then listens on a Unix socket.
+Every run request is executed by a forked child process, which starts with all these modules already imported.
+
+This script is run outside of the cover_agent package, so it must only depend on the standard library (and pytest).
+"""
+import argparse
+import importlib
+import json
+import math
+import os
+import signal
+import socket
+import sys
+import tempfile
+import time
+import traceback
+
+# Time given to the alarm of a run to stop it, before its process group is killed
+KILL_GRACE_SECONDS = 1.0
+
+
+def preload(modules: list) -> dict:
+    """
+    Import pytest, its installed plugins and `modules`.
+
+    Returns:
+        dict: The modification time of the source file of every imported module, by module name.
+    """
+    import pytest  # noqa: F401
+
+    try:
+        from importlib.metadata import entry_points
+
+        eps = entry_points()
+        plugins = eps.select(group="pytest11") if hasattr(eps, "select") else eps.get("pytest11", [])
+    except ImportError:
+        plugins = []
+    for plugin in plugins:
+        try:
+            plugin.load()
+        except Exception:
+            traceback.print_exc()
+    for module in modules:
+        try:
+            importlib.import_module(module)
+        except Exception:
+            traceback.print_exc()
+    return {name: _source_mtime(module) for name, module in list(sys.modules.items())}
+
+
+def _source_mtime(module):
+    file_path = getattr(module, "__file__", None)
+    try:
+        return os.stat(file_path).st_mtime_ns if file_path else None
+    except OSError:
+        return None
+
+
+def purge_modified_modules(mtimes: dict):
+    # Modules whose source changed since they were preloaded (such as an edited test file) are imported again
+    for name, module in list(sys.modules.items()):
+        if name in mtimes and mtimes[name] != _source_mtime(module):
+            del sys.modules[name]
+
+
+def read_output(path: str, max_bytes: int = None):
+    """
+    Read the output of a run, keeping only its first and last `max_bytes / 2` bytes, as the Runner does for subprocesses.
+
+    Returns:
+        tuple: The output, and the number of bytes that were not kept.
+    """
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if max_bytes is None or size <= max_bytes:
+            data = f.read()
+            truncated_bytes = 0
+        else:
+            head_limit = max_bytes // 2
+            tail_limit = max_bytes - head_limit
+            head = f.read(head_limit)
+            f.seek(size - tail_limit)
+            tail = f.read(tail_limit)
+            truncated_bytes = size - max_bytes
+            data = head + f"\n... [{truncated_bytes} bytes of output truncated] ...\n".encode() + tail
+    # Same newlines as text mode
+    return data.decode(errors="replace").replace("\r\n", "\n").replace("\r", "\n"), truncated_bytes
+
+
+def run_pytest(request: dict, mtimes: dict, on_start=None) -> dict:
+    """
+    Run pytest in a forked child, within the timeout of the request.
+
+    The child sets an alarm for the timeout, and the server also kills the process group of the child once the timeout is
+    over, for runs whose code under test resets or ignores SIGALRM.
+
+    Parameters:
+        request (dict): The run request.
+        mtimes (dict): The modification times of the preloaded modules (see `preload`).
+        on_start (callable, optional): Called with the pid of the child once it is started. Defaults to None.
+    """
+    output_dir = tempfile.mkdtemp(prefix="cover_agent_worker_")
+    stdout_path = os.path.join(output_dir, "stdout")
+    stderr_path = os.path.join(output_dir, "stderr")
+    sys.stdout.flush()
+    sys.stderr.flush()
+
+    pid = os.fork()
+    if pid == 0:
+        exit_code = 1
+        try:
+            # The child and the processes it starts can be killed together
+            os.setpgid(0, 0)
+            os.chdir(request["cwd"])
+            os.dup2(os.open(stdout_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC), 1)
+            os.dup2(os.open(stderr_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC), 2)
+            if request.get("timeout"):
+                signal.alarm(math.ceil(request["timeout"]))
+            purge_modified_modules(mtimes)
+            if request.get("prepend_cwd"):
+                # Same as "python -m pytest", which adds the current directory to sys.path
+                sys.path.insert(0, request["cwd"])
+
+            import pytest
+
+            exit_code = int(pytest.main(request["args"]))
+        except SystemExit as e:
+            # Same exit code as the interpreter: None is a success, and any other value than an int is a failure
+            exit_code = 0 if e.code is None else e.code if isinstance(e.code, int) else 1
+        except BaseException:
+            traceback.print_exc()
+        finally:
+            sys.stdout.flush()
+            sys.stderr.flush()
+            os._exit(exit_code)
+
+    if on_start is not None:
+        on_start(pid)
+    killed = False
+    deadline = time.monotonic() + request["timeout"] + KILL_GRACE_SECONDS if request.get("timeout") else None
+    while True:
+        waited_pid, status, rusage = os.wait4(pid, os.WNOHANG)
+        if waited_pid == pid:
+            break
+        if deadline is not None and time.monotonic() > deadline and not killed:
+            try:
+                os.killpg(pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+            killed = True
+        time.sleep(0.01)
+    stdout, stdout_truncated_bytes = read_output(stdout_path, request.get("max_output_bytes"))
+    stderr, stderr_truncated_bytes = read_output(stderr_path, request.get("max_output_bytes"))
+    for path in (stdout_path, stderr_path):
+        os.remove(path)
+    os.rmdir(output_dir)
+
+    response = {
+        "stdout": stdout,
+        "stderr": stderr,
+        "exit_code": os.WEXITSTATUS(status),
+        "timed_out": False,
+        "truncated_output_bytes": stdout_truncated_bytes + stderr_truncated_bytes,
+        "cpu_time_seconds": rusage.ru_utime + rusage.ru_stime,
+        # In bytes on macOS, and in kilobytes on Linux
+        "peak_memory_mb": rusage.ru_maxrss / (1024 * 1024) if sys.platform == "darwin" else rusage.ru_maxrss / 1024,
+    }
+    if os.WIFSIGNALED(status):
+        response["exit_code"] = -os.WTERMSIG(status)
+        response["timed_out"] = killed or os.WTERMSIG(status) == signal.SIGALRM
+    return response
+
+
+def serve(socket_path: str, mtimes: dict):
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(socket_path)
+    server.listen()
+    server.settimeout(1.0)
+    # The client removes the socket when it stops, or when it is gone
+    while os.path.exists(socket_path):
+        try:
+            connection, _ = server.accept()
+        except socket.timeout:
+            continue
+        with connection:
+            connection.settimeout(None)
+            request = json.loads(connection.makefile("r").readline())
+            if request.get("command") == "stop":
+                break
+
+            def notify_start(pid):
+                # The client is told the pid of the child first, to kill it if the server does not answer in time
+                try:
+                    connection.sendall((json.dumps({"pid": pid}) + "\n").encode())
+                except OSError:
+                    pass
+
+            try:
+                response = run_pytest(request, mtimes, on_start=notify_start)
+            except Exception as e:
+                response = {"stdout": "", "stderr": f"Worker error: {e}", "exit_code": None, "timed_out": False}
+            connection.sendall((json.dumps(response) + "\n").encode())
+    server.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="pytest fork-server")
+    parser.add_argument("--socket", required=True, help="Path of the Unix socket to listen on.")
+    parser.add_argument("--preload", default="", help="Comma-separated modules to import before serving.")
+    args = parser.parse_args()
+
+    # The directory of this script must not shadow the modules of the project
+    if sys.path and os.path.abspath(sys.path[0]) == os.path.dirname(os.path.abspath(__file__)):
+        sys.path.pop(0)
+    sys.path.insert(0, os.getcwd())
+    mtimes = preload([module for module in args.preload.split(",") if module])
+    sys.path.remove(os.getcwd())
+    serve(args.socket, mtimes)
+
+
+if __name__ == "__main__":
+    main()
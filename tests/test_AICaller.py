@@ -1,8 +1,11 @@
+import asyncio
 import os
 
 import pytest
-from unittest.mock import patch, Mock
+from unittest.mock import patch, Mock, AsyncMock
 from cover_agent.AICaller import AICaller
+from cover_agent.ResponseCache import ResponseCache
+from cover_agent.StreamSink import CallbackStreamSink
 
 
 class TestAICaller:
@@ -164,4 +167,153 @@ class TestAICaller:
                 assert response == "response"
                 assert prompt_tokens == 2
                 assert response_tokens == 10
-                mock_print.assert_any_call("Error logging to W&B: Logging error")
\ No newline at end of file
+                mock_print.assert_any_call("Error logging to W&B: Logging error")
+
+    @patch("cover_agent.AICaller.litellm.acompletion", new_callable=AsyncMock)
+    def test_acall_model(self, mock_acompletion, ai_caller):
+        mock_response = Mock()
+        mock_response.choices = [Mock(message=Mock(content="response"))]
+        mock_response.usage = Mock(prompt_tokens=2, completion_tokens=10)
+        mock_acompletion.return_value = mock_response
+        prompt = {"system": "System message", "user": "Hello, world!"}
+
+        response, prompt_tokens, response_tokens = asyncio.run(ai_caller.acall_model(prompt))
+
+        assert response == "response"
+        assert prompt_tokens == 2
+        assert response_tokens == 10
+        assert mock_acompletion.call_args.kwargs["stream"] is False
+        assert mock_acompletion.call_args.kwargs["messages"][0] == {"role": "system", "content": "System message"}
+
+    @patch("cover_agent.AICaller.litellm.acompletion", new_callable=AsyncMock)
+    def test_call_model_batch(self, mock_acompletion, ai_caller):
+        def make_response(**kwargs):
+            user_prompt = kwargs["messages"][-1]["content"]
+            if user_prompt == "fail":
+                raise Exception("Test exception")
+            mock_response = Mock()
+            mock_response.choices = [Mock(message=Mock(content=f"answer to {user_prompt}"))]
+            mock_response.usage = Mock(prompt_tokens=1, completion_tokens=3)
+            return mock_response
+
+        mock_acompletion.side_effect = make_response
+        prompts = [{"system": "", "user": "first"}, {"system": "", "user": "fail"}, {"system": "", "user": "second"}]
+
+        results = ai_caller.call_model_batch(prompts)
+
+        assert results[0] == ("answer to first", 1, 3)
+        assert isinstance(results[1], Exception)
+        assert results[2] == ("answer to second", 1, 3)
+
+    @patch("cover_agent.AICaller.litellm.completion")
+    def test_call_model_streaming_to_callback_sink(self, mock_completion):
+        chunks = []
+        ai_caller = AICaller("test-model", "test-api", enable_retry=False, stream_sink=CallbackStreamSink(chunks.append))
+        prompt = {"system": "", "user": "Hello, world!"}
+        mock_completion.return_value = [
+            Mock(choices=[Mock(delta=Mock(content="response "))]),
+            Mock(choices=[Mock(delta=Mock(content="part"))]),
+        ]
+        with patch("cover_agent.AICaller.litellm.stream_chunk_builder") as mock_builder:
+            mock_builder.return_value = {
+                "choices": [{"message": {"content": "response part"}}],
+                "usage": {"prompt_tokens": 2, "completion_tokens": 10},
+            }
+            response, _, _ = ai_caller.call_model(prompt, stream=True)
+
+        assert response == "response part"
+        assert chunks == ["response ", "part"]
+
+    @patch("cover_agent.AICaller.litellm.completion")
+    def test_call_model_uses_response_cache(self, mock_completion, tmp_path):
+        response_cache = ResponseCache(str(tmp_path / "cache.db"))
+        ai_caller = AICaller("test-model", "test-api", enable_retry=False, response_cache=response_cache)
+        prompt = {"system": "", "user": "Hello, world!"}
+        mock_completion.return_value = Mock(
+            choices=[Mock(message=Mock(content="response"))],
+            usage=Mock(prompt_tokens=2, completion_tokens=10),
+        )
+
+        first = ai_caller.call_model(prompt, stream=False)
+        second = ai_caller.call_model(prompt, stream=False)
+
+        assert first == second == ("response", 2, 10)
+        mock_completion.assert_called_once()
+        assert response_cache.cached_prompt_tokens == 2
+        assert ai_caller.last_cached_prompt_tokens == 0
+        response_cache.close()
+
+    @patch("cover_agent.AICaller.litellm.completion")
+    def test_call_model_marks_stable_prefix_as_cacheable(self, mock_completion):
+        mock_completion.return_value = Mock(
+            choices=[Mock(message=Mock(content="response"))],
+            usage=Mock(prompt_tokens=2, completion_tokens=10, prompt_tokens_details=Mock(cached_tokens=1)),
+        )
+        prompt = {"system": "", "user": "Stable prefix. Changing part.", "cache_prefix": "Stable prefix. "}
+
+        AICaller("anthropic/claude-3-5-sonnet-20241022", enable_retry=False).call_model(prompt, stream=False)
+        assert mock_completion.call_args.kwargs["messages"][0]["content"] == [
+            {"type": "text", "text": "Stable prefix. ", "cache_control": {"type": "ephemeral"}},
+            {"type": "text", "text": "Changing part."},
+        ]
+
+        # Providers that cache prompt prefixes automatically get the prompt as is
+        AICaller("gpt-4o", enable_retry=False).call_model(prompt, stream=False)
+        assert mock_completion.call_args.kwargs["messages"][0]["content"] == "Stable prefix. Changing part."
+
+    @patch("cover_agent.AICaller.litellm.completion")
+    def test_call_model_records_cached_prompt_tokens(self, mock_completion, ai_caller):
+        prompt = {"system": "", "user": "Hello, world!"}
+        mock_completion.return_value = Mock(
+            choices=[Mock(message=Mock(content="response"))],
+            usage=Mock(prompt_tokens=100, completion_tokens=10, prompt_tokens_details=Mock(cached_tokens=80)),
+        )
+        ai_caller.call_model(prompt, stream=False)
+        assert ai_caller.last_cached_prompt_tokens == 80
+
+        # Usage of a response built from streamed chunks, with the Anthropic field only
+        mock_completion.return_value = [{"choices": [{"delta": {"content": "response"}}]}]
+        with patch("cover_agent.AICaller.litellm.stream_chunk_builder") as mock_builder:
+            mock_builder.return_value = {
+                "choices": [{"message": {"content": "response"}}],
+                "usage": {"prompt_tokens": 100, "completion_tokens": 10, "cache_read_input_tokens": 90},
+            }
+            ai_caller.call_model(prompt)
+
+        assert ai_caller.last_cached_prompt_tokens == 90
+        assert ai_caller.total_cached_prompt_tokens == 170
+
+    @patch("cover_agent.AICaller.litellm.completion")
+    def test_call_model_routes_prompt_types(self, mock_completion, ai_caller):
+        mock_completion.return_value = Mock(
+            choices=[Mock(message=Mock(content="response"))],
+            usage=Mock(prompt_tokens=2, completion_tokens=10),
+        )
+        routing = {"model_routing.analyze_test_run_failure": {"model": "small-model", "max_tokens": 512, "timeout": 30}}
+
+        with patch("cover_agent.AICaller.get_settings") as mock_settings:
+            mock_settings.return_value.get.side_effect = lambda key, default=None: routing.get(key, default)
+            ai_caller.call_model({"system": "", "user": "Analyze", "prompt_type": "analyze_test_run_failure"}, stream=False)
+            routed_params = mock_completion.call_args.kwargs
+            ai_caller.call_model({"system": "", "user": "Generate", "prompt_type": "test_generation_prompt"}, stream=False)
+            default_params = mock_completion.call_args.kwargs
+
+        assert (routed_params["model"], routed_params["max_tokens"], routed_params["timeout"]) == ("small-model", 512, 30)
+        assert (default_params["model"], default_params["max_tokens"]) == ("test-model", 4096)
+        assert "timeout" not in default_params
+
+    @patch("cover_agent.AICaller.litellm.completion")
+    def test_call_model_response_format(self, mock_completion):
+        mock_completion.return_value = Mock(
+            choices=[Mock(message=Mock(content="{}"))],
+            usage=Mock(prompt_tokens=2, completion_tokens=10),
+        )
+        response_format = {"type": "json_schema", "json_schema": {"name": "NewTests", "schema": {}, "strict": True}}
+        prompt = {"system": "", "user": "Generate"}
+
+        AICaller("gpt-4o", enable_retry=False).call_model(prompt, stream=False, response_format=response_format)
+        assert mock_completion.call_args.kwargs["response_format"] == response_format
+
+        # Not sent to a model without structured output
+        AICaller("o1-mini", enable_retry=False).call_model(prompt, stream=False, response_format=response_format)
+        assert "response_format" not in mock_completion.call_args.kwargs
@@ -294,3 +294,61 @@ class TestCoverAgent:
         os.remove(temp_test_file.name)
 
 
+
+    @patch("cover_agent.CoverAgent.os.environ", {})
+    @patch("cover_agent.CoverAgent.UnitTestGenerator")
+    @patch("cover_agent.CoverAgent.UnitTestValidator")
+    @patch("cover_agent.CoverAgent.UnitTestDB")
+    def test_run_resumes_from_checkpoint(self, mock_test_db, mock_test_validator, mock_test_gen, tmp_path):
+        source_file = tmp_path / "app.py"
+        source_file.write_text("x = 1\n")
+        test_file = tmp_path / "test_app.py"
+        test_file.write_text("original tests\n")
+        output_file = tmp_path / "test_app_output.py"
+        args = argparse.Namespace(
+            source_file_path=str(source_file),
+            test_file_path=str(test_file),
+            project_root="",
+            test_file_output_path=str(output_file),
+            code_coverage_report_path="coverage_report.xml",
+            test_command="pytest",
+            test_command_dir=str(tmp_path),
+            included_files=None,
+            coverage_type="cobertura",
+            report_filepath=str(tmp_path / "test_results.html"),
+            desired_coverage=90,
+            max_iterations=3,
+            additional_instructions="",
+            model="openai/test-model",
+            api_base="openai/test-api",
+            use_report_coverage_feature_flag=False,
+            log_db_path="",
+            run_tests_multiple_times=False,
+            strict_coverage=False,
+            diff_coverage=False,
+            branch="main",
+            resume=True,
+        )
+        mock_test_db.return_value.get_checkpoint.return_value = {
+            "iteration_count": 2,
+            "state": {"validator": {}, "generator_input_token_count": 7, "generator_output_token_count": 3},
+            "test_file_content": "tests accepted so far\n",
+        }
+        validator = mock_test_validator.return_value
+        validator.current_coverage = 0.5
+        validator.desired_coverage = 90
+        validator.get_coverage.return_value = [[], "python", "pytest", ""]
+        mock_test_gen.return_value.generate_tests.return_value = {"new_tests": []}
+
+        agent = CoverAgent(args)
+        agent.run()
+
+        # The initial analysis is skipped, and only the remaining iteration is run
+        validator.initial_test_suite_analysis.assert_not_called()
+        validator.restore_checkpoint_state.assert_called_once_with({})
+        assert mock_test_gen.return_value.generate_tests.call_count == 1
+        assert agent.test_gen.total_input_token_count == 7
+        assert output_file.read_text() == "tests accepted so far\n"
+        mock_test_db.return_value.save_checkpoint.assert_called_once()
+        assert mock_test_db.return_value.save_checkpoint.call_args.args[1] == 3
+        mock_test_db.return_value.delete_checkpoint.assert_called_once()
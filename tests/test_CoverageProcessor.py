@@ -1,34 +1,29 @@
 import pytest
-import xml.etree.ElementTree as ET
 from cover_agent.CoverageProcessor import CoverageProcessor
 
 
 @pytest.fixture
-def mock_xml_tree(monkeypatch):
+def mock_xml_tree(monkeypatch, tmp_path):
     """
-    Creates a mock function to simulate the ET.parse method, returning a mocked XML tree structure.
+    Writes a small Cobertura XML report to "fake_path", in a temporary working directory.
     """
-
-    def mock_parse(file_path):
-        # Mock XML structure for the test
-        xml_str = """<coverage>
-                        <packages>
-                            <package>
-                                <classes>
-                                    <class filename="app.py">
-                                        <lines>
-                                            <line number="1" hits="1"/>
-                                            <line number="2" hits="0"/>
-                                        </lines>
-                                    </class>
-                                </classes>
-                            </package>
-                        </packages>
-                     </coverage>"""
-        root = ET.ElementTree(ET.fromstring(xml_str))
-        return root
-
-    monkeypatch.setattr(ET, "parse", mock_parse)
+    # Mock XML structure for the test
+    xml_str = """<coverage>
+                    <packages>
+                        <package>
+                            <classes>
+                                <class filename="app.py">
+                                    <lines>
+                                        <line number="1" hits="1"/>
+                                        <line number="2" hits="0"/>
+                                    </lines>
+                                </class>
+                            </classes>
+                        </package>
+                    </packages>
+                 </coverage>"""
+    (tmp_path / "fake_path").write_text(xml_str)
+    monkeypatch.chdir(tmp_path)
 
 
 class TestCoverageProcessor:
@@ -47,6 +42,14 @@ class TestCoverageProcessor:
         assert missed_lines == [2], "Should list line 2 as missed"
         assert coverage_pct == 0.5, "Coverage should be 50 percent"
 
+    def test_coverage_baseline_bitmap(self, processor):
+        processor.set_coverage_baseline([1, 2, 5], [3, 4])
+
+        assert processor.new_covered_lines([1, 2]) == []
+        assert processor.new_covered_lines([2, 3, 4]) == [3, 4]
+        assert processor.merge_into_baseline([3]) == 0.8
+        assert processor.baseline_coverage() == ([1, 2, 3, 5], [4], 0.8)
+
     def test_correct_parsing_for_matching_package_and_class(self, mocker):
         # Setup
         mock_open = mocker.patch(
@@ -223,18 +226,19 @@ class TestCoverageProcessor:
         with pytest.raises(KeyError):
             processor.parse_missed_covered_lines_jacoco_csv("com.example", "MyClass")
 
-    def test_parse_coverage_report_lcov_no_coverage_data(self, mocker):
+    def test_parse_coverage_report_lcov_no_coverage_data(self, tmp_path):
         """
         Test parse_coverage_report_lcov returns empty lists and 0 coverage when the lcov report contains no relevant data.
         """
-        mocker.patch("builtins.open", mocker.mock_open(read_data=""))
-        processor = CoverageProcessor("empty_report.lcov", "app.py", "lcov")
+        report_path = tmp_path / "empty_report.lcov"
+        report_path.write_text("")
+        processor = CoverageProcessor(str(report_path), "app.py", "lcov")
         covered_lines, missed_lines, coverage_pct = processor.parse_coverage_report_lcov()
         assert covered_lines == [], "Expected no covered lines"
         assert missed_lines == [], "Expected no missed lines"
         assert coverage_pct == 0, "Expected 0% coverage"
 
-    def test_parse_coverage_report_lcov_with_coverage_data(self, mocker):
+    def test_parse_coverage_report_lcov_with_coverage_data(self, tmp_path):
         """
         Test parse_coverage_report_lcov correctly parses coverage data from an lcov report.
         """
@@ -245,14 +249,15 @@ class TestCoverageProcessor:
         DA:3,1
         end_of_record
         """
-        mocker.patch("builtins.open", mocker.mock_open(read_data=lcov_data))
-        processor = CoverageProcessor("report.lcov", "app.py", "lcov")
+        report_path = tmp_path / "report.lcov"
+        report_path.write_text(lcov_data)
+        processor = CoverageProcessor(str(report_path), "app.py", "lcov")
         covered_lines, missed_lines, coverage_pct = processor.parse_coverage_report_lcov()
         assert covered_lines == [1, 3], "Expected lines 1 and 3 to be covered"
         assert missed_lines == [2], "Expected line 2 to be missed"
         assert coverage_pct == 2/3, "Expected 66.67% coverage"
 
-    def test_parse_coverage_report_lcov_with_multiple_files(self, mocker):
+    def test_parse_coverage_report_lcov_with_multiple_files(self, tmp_path):
         """
         Test parse_coverage_report_lcov correctly parses coverage data for the target file among multiple files in the lcov report.
         """
@@ -270,8 +275,9 @@ class TestCoverageProcessor:
         DA:1,1
         end_of_record
         """
-        mocker.patch("builtins.open", mocker.mock_open(read_data=lcov_data))
-        processor = CoverageProcessor("report.lcov", "app.py", "lcov")
+        report_path = tmp_path / "report.lcov"
+        report_path.write_text(lcov_data)
+        processor = CoverageProcessor(str(report_path), "app.py", "lcov")
         covered_lines, missed_lines, coverage_pct = processor.parse_coverage_report_lcov()
         assert covered_lines == [1, 3], "Expected lines 1 and 3 to be covered for app.py"
         assert missed_lines == [2], "Expected line 2 to be missed for app.py"
@@ -291,7 +297,7 @@ class TestCoverageProcessor:
         ):
             processor.parse_coverage_report_jacoco()
 
-    def test_parse_missed_covered_lines_jacoco_xml_no_source_file(self, mocker):
+    def test_parse_missed_covered_lines_jacoco_xml_no_source_file(self, mocker, tmp_path):
         #, mock_xml_tree
         mocker.patch(
             "cover_agent.CoverageProcessor.CoverageProcessor.extract_package_and_class_java",
@@ -318,13 +324,11 @@ class TestCoverageProcessor:
                         </package>
                     </report>"""
 
-        mocker.patch(
-            "xml.etree.ElementTree.parse",
-            return_value=ET.ElementTree(ET.fromstring(xml_str))
-        )
+        report_path = tmp_path / "coverage_report.xml"
+        report_path.write_text(xml_str)
 
         processor = CoverageProcessor(
-            "path/to/coverage_report.xml", "path/to/MySecondClass.java", "jacoco"
+            str(report_path), "path/to/MySecondClass.java", "jacoco"
         )
 
         # Action
@@ -336,7 +340,7 @@ class TestCoverageProcessor:
         assert missed == []
         assert covered == []
 
-    def test_parse_missed_covered_lines_jacoco_xml(self, mocker):
+    def test_parse_missed_covered_lines_jacoco_xml(self, mocker, tmp_path):
         #, mock_xml_tree
         mocker.patch(
             "cover_agent.CoverageProcessor.CoverageProcessor.extract_package_and_class_java",
@@ -363,13 +367,11 @@ class TestCoverageProcessor:
                         </package>
                     </report>"""
 
-        mocker.patch(
-            "xml.etree.ElementTree.parse",
-            return_value=ET.ElementTree(ET.fromstring(xml_str))
-        )
+        report_path = tmp_path / "coverage_report.xml"
+        report_path.write_text(xml_str)
 
         processor = CoverageProcessor(
-            "path/to/coverage_report.xml", "path/to/MyClass.java", "jacoco"
+            str(report_path), "path/to/MyClass.java", "jacoco"
         )
 
         # Action
@@ -381,7 +383,7 @@ class TestCoverageProcessor:
         assert missed == [39, 40, 41]
         assert covered == [35, 36, 37, 38]
 
-    def test_parse_missed_covered_lines_kotlin_jacoco_xml(self, mocker):
+    def test_parse_missed_covered_lines_kotlin_jacoco_xml(self, mocker, tmp_path):
         #, mock_xml_tree
         mocker.patch(
             "cover_agent.CoverageProcessor.CoverageProcessor.extract_package_and_class_kotlin",
@@ -408,13 +410,11 @@ class TestCoverageProcessor:
                         </package>
                     </report>"""
 
-        mocker.patch(
-            "xml.etree.ElementTree.parse",
-            return_value=ET.ElementTree(ET.fromstring(xml_str))
-        )
+        report_path = tmp_path / "coverage_report.xml"
+        report_path.write_text(xml_str)
 
         processor = CoverageProcessor(
-            "path/to/coverage_report.xml", "path/to/MyClass.kt", "jacoco"
+            str(report_path), "path/to/MyClass.kt", "jacoco"
         )
 
         # Action
@@ -477,9 +477,11 @@ class TestCoverageProcessor:
         assert coverage_pct == 0.0, "Expected 0% coverage"
 
 
-    def test_parse_coverage_report_lcov_file_read_error(self, mocker):
+    def test_parse_coverage_report_lcov_file_read_error(self, mocker, tmp_path):
+        report_path = tmp_path / "report.lcov"
+        report_path.write_text("SF:app.py\nend_of_record\n")
         mocker.patch("builtins.open", side_effect=IOError("File read error"))
-        processor = CoverageProcessor("report.lcov", "app.py", "lcov")
+        processor = CoverageProcessor(str(report_path), "app.py", "lcov")
         with pytest.raises(IOError, match="File read error"):
             processor.parse_coverage_report_lcov()
 
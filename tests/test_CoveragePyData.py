@@ -0,0 +1,128 @@
+import os
+
+from coverage import CoverageData
+
+import cover_agent.CoveragePyData as coverage_py_data_module
+from cover_agent.CoverageProcessor import CoverageProcessor
+from cover_agent.CoveragePyData import CoveragePyData
+
+SOURCE = '''"""Module docstring."""
+import functools
+
+
+def add(a, b):
+    """Add two numbers."""
+    return a + b
+
+
+@functools.lru_cache()
+def sub(a, b):
+    if a > b:
+        return a - b
+    return b - a
+
+
+def unused():  # pragma: no cover
+    return None
+'''
+
+
+def write_source(tmp_path):
+    source_path = tmp_path / "calc.py"
+    source_path.write_text(SOURCE)
+    return str(source_path)
+
+
+class TestCoveragePyData:
+    def test_executed_lines_by_context(self, tmp_path):
+        source_path = write_source(tmp_path)
+        data = CoverageData(basename=str(tmp_path / ".coverage"))
+        data.set_context("test_add")
+        data.add_lines({source_path: [2, 5, 10, 11, 7]})
+        data.set_context("test_sub")
+        data.add_lines({source_path: [12, 13]})
+        data.write()
+
+        executed = CoveragePyData(str(tmp_path / ".coverage")).executed_lines_by_context()
+
+        assert executed[source_path]["test_add"] == sum(1 << line for line in [2, 5, 7, 10, 11])
+        assert executed[source_path]["test_sub"] == sum(1 << line for line in [12, 13])
+
+    def test_executed_lines_with_branch_coverage(self, tmp_path):
+        source_path = write_source(tmp_path)
+        data = CoverageData(basename=str(tmp_path / ".coverage"))
+        data.add_arcs({source_path: [(-1, 2), (2, 5), (5, -1), (-11, 12), (12, 13), (13, -11)]})
+        data.write()
+
+        executed = CoveragePyData(str(tmp_path / ".coverage")).executed_lines()
+
+        assert executed == {source_path: sum(1 << line for line in [2, 5, 12, 13])}
+
+    def test_find_file(self):
+        paths = ["/repo/src/calc.py", "/repo/src/mycalc.py"]
+        assert CoveragePyData.find_file(paths, "/repo/src/calc.py") == "/repo/src/calc.py"
+        assert CoveragePyData.find_file(paths, "src/mycalc.py") == "/repo/src/mycalc.py"
+        assert CoveragePyData.find_file(paths, "calc.py") == "/repo/src/calc.py"
+        assert CoveragePyData.find_file(paths, "alc.py") is None
+
+    def test_statement_lines_with_ast_fallback(self, tmp_path, monkeypatch):
+        source_path = write_source(tmp_path)
+        with_parser = CoveragePyData.statement_lines(source_path)
+
+        monkeypatch.setattr(coverage_py_data_module, "PythonParser", None)
+        monkeypatch.setattr(CoveragePyData, "_statements_cache", type(CoveragePyData._statements_cache)())
+        without_parser = CoveragePyData.statement_lines(source_path)
+
+        # Docstrings and excluded code are not statements; decorated functions count their decorator and "def" lines
+        assert without_parser == sum(1 << line for line in [2, 5, 7, 10, 11, 12, 13, 14])
+        assert without_parser == with_parser
+
+    def test_statement_lines_are_cached_until_the_source_changes(self, tmp_path, mocker):
+        source_path = write_source(tmp_path)
+        CoveragePyData.statement_lines(source_path)
+        spy = mocker.spy(CoveragePyData, "_ast_statement_lines")
+        mocker.patch.object(coverage_py_data_module, "PythonParser", None)
+
+        CoveragePyData.statement_lines(source_path)
+        assert spy.call_count == 0
+
+        with open(source_path, "a") as f:
+            f.write("x = 1\n")
+        assert CoveragePyData.statement_lines(source_path) >> 19 & 1
+        assert spy.call_count == 1
+
+
+class TestCoverageProcessorCoveragePy:
+    def test_parse_single_file(self, tmp_path):
+        source_path = write_source(tmp_path)
+        data = CoverageData(basename=str(tmp_path / ".coverage"))
+        data.add_lines({source_path: [2, 5, 10, 11, 7]})
+        data.write()
+
+        processor = CoverageProcessor(str(tmp_path / ".coverage"), source_path, "coveragepy")
+        lines_covered, lines_missed, percentage = processor.parse_coverage_report()
+
+        assert lines_covered == [2, 5, 7, 10, 11]
+        assert lines_missed == [12, 13, 14]
+        assert percentage == 5 / 8
+
+    def test_parse_unmeasured_file(self, tmp_path):
+        data = CoverageData(basename=str(tmp_path / ".coverage"))
+        data.add_lines({str(tmp_path / "other.py"): [1]})
+        data.write()
+
+        processor = CoverageProcessor(str(tmp_path / ".coverage"), write_source(tmp_path), "coveragepy")
+        assert processor.parse_coverage_report() == ([], [], 0.0)
+
+    def test_parse_all_files_with_feature_flag(self, tmp_path):
+        source_path = write_source(tmp_path)
+        data = CoverageData(basename=str(tmp_path / ".coverage"))
+        # Measured files that no longer exist are skipped
+        data.add_lines({source_path: [2, 5, 7, 10, 11, 12, 13, 14], os.path.join(str(tmp_path), "deleted.py"): [1]})
+        data.write()
+
+        processor = CoverageProcessor(
+            str(tmp_path / ".coverage"), source_path, "coveragepy", use_report_coverage_feature_flag=True
+        )
+
+        assert processor.parse_coverage_report() == {source_path: ([2, 5, 7, 10, 11, 12, 13, 14], [], 1.0)}
@@ -0,0 +1,115 @@
+import os
+
+from cover_agent.CoverageReportIndex import CoverageReportIndex
+
+COBERTURA_REPORT = """<?xml version="1.0" ?>
+<coverage>
+    <packages>
+        <package name="src">
+            <classes>
+                <class name="app.py" filename="src/app.py">
+                    <methods>
+                        <method name="add">
+                            <lines>
+                                <line number="2" hits="1"/>
+                            </lines>
+                        </method>
+                    </methods>
+                    <lines>
+                        <line number="1" hits="1"/>
+                        <line number="2" hits="1"/>
+                        <line number="3" hits="0"/>
+                    </lines>
+                </class>
+                <class name="app.py$Inner" filename="src/app.py">
+                    <lines>
+                        <line number="7" hits="0"/>
+                    </lines>
+                </class>
+                <class name="myapp.py" filename="src/myapp.py">
+                    <lines>
+                        <line number="1" hits="1"/>
+                    </lines>
+                </class>
+            </classes>
+        </package>
+    </packages>
+</coverage>
+"""
+
+
+class TestCoverageReportIndex:
+    def test_cobertura_index(self, tmp_path):
+        report_path = tmp_path / "coverage.xml"
+        report_path.write_text(COBERTURA_REPORT)
+
+        index = CoverageReportIndex.for_report(str(report_path), "cobertura")
+
+        # Method lines are not counted twice, and classes of the same file are merged
+        assert index.lookup("src/app.py") == ([1, 2], [3, 7])
+        assert index.lookup("app.py") == ([1, 2], [3, 7])
+        assert index.lookup("myapp.py") == ([1], [])
+        assert index.lookup("p.py") is None
+        assert [filename for filename, _ in index.items()] == ["src/app.py", "src/myapp.py"]
+
+    def test_index_is_cached_until_the_report_changes(self, tmp_path):
+        report_path = tmp_path / "coverage.xml"
+        report_path.write_text(COBERTURA_REPORT)
+
+        index = CoverageReportIndex.for_report(str(report_path), "cobertura")
+        assert CoverageReportIndex.for_report(str(report_path), "cobertura") is index
+
+        report_path.write_text(COBERTURA_REPORT.replace('hits="0"', 'hits="1"'))
+        os.utime(report_path, ns=(0, os.stat(report_path).st_mtime_ns + 1_000_000))
+        new_index = CoverageReportIndex.for_report(str(report_path), "cobertura")
+        assert new_index is not index
+        assert new_index.lookup("app.py") == ([1, 2, 3, 7], [])
+
+    def test_jacoco_index(self, tmp_path):
+        report_path = tmp_path / "jacoco.xml"
+        report_path.write_text(
+            """<report name="demo">
+                <package name="com/example">
+                    <class name="com/example/Calc" sourcefilename="Calc.java">
+                        <method name="add" desc="()V" line="3"><counter type="LINE" missed="0" covered="1"/></method>
+                    </class>
+                    <sourcefile name="Calc.java">
+                        <line nr="3" mi="0" ci="4" mb="0" cb="0"/>
+                        <line nr="5" mi="2" ci="0" mb="0" cb="0"/>
+                    </sourcefile>
+                </package>
+            </report>"""
+        )
+
+        index = CoverageReportIndex.for_report(str(report_path), "jacoco")
+
+        assert index.lookup("Calc.java") == ([3], [5])
+        assert index.lookup("com/example/Calc.java") == ([3], [5])
+
+    def test_lcov_index(self, tmp_path):
+        report_path = tmp_path / "coverage.lcov"
+        report_path.write_text(
+            "TN:\n"
+            "SF:/repo/src/myapp.js\n"
+            "DA:1,1\n"
+            "end_of_record\n"
+            "SF:/repo/src/app.js\n"
+            "FN:2,add\n"
+            "DA:2,3\n"
+            "DA:3,0\n"
+            "DA:5,0,checksum\n"
+            "end_of_record\n"
+            "SF:/repo/src/app.js\n"
+            "DA:3,1\n"
+            "DA:7,0\n"
+            "end_of_record\n"
+        )
+
+        index = CoverageReportIndex.for_report(str(report_path), "lcov")
+
+        # Records of the same file are merged, and file names only match whole path components
+        assert index.lookup("app.js") == ([2, 3], [5, 7])
+        assert index.lookup("src/myapp.js") == ([1], [])
+        assert index.lookup("p.js") is None
+        assert list(index.items()) == [("/repo/src/myapp.js", ([1], [])), ("/repo/src/app.js", ([2, 3], [5, 7]))]
+        assert CoverageReportIndex.for_report(str(report_path), "lcov") is index
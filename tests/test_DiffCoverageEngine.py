@@ -0,0 +1,92 @@
+import os
+import subprocess
+
+import pytest
+
+from cover_agent.CoverageProcessor import CoverageProcessor
+from cover_agent.DiffCoverageEngine import DiffCoverageEngine
+from cover_agent.Runner import Runner
+
+DIFF = """diff --git a/src/app.py b/src/app.py
+index 1111111..2222222 100644
+--- a/src/app.py
++++ b/src/app.py
+@@ -2,0 +3,2 @@ def add(a, b):
++def sub(a, b):
++    return a - b
+@@ -10 +12 @@ def mul(a, b):
+-    return a*b
++    return a * b
+@@ -20,3 +22,0 @@ def div(a, b):
+-x = 1
+-y = 2
+-z = 3
+diff --git a/old.py b/old.py
+deleted file mode 100644
+--- a/old.py
++++ /dev/null
+@@ -1 +0,0 @@
+-print("old")
+"""
+
+
+def git(repo, *args):
+    subprocess.run(["git", *args], cwd=repo, check=True, capture_output=True)
+
+
+@pytest.fixture
+def repo(tmp_path):
+    git(tmp_path, "init", "-q", "-b", "main")
+    git(tmp_path, "config", "user.email", "dev@example.com")
+    git(tmp_path, "config", "user.name", "dev")
+    (tmp_path / "app.py").write_text("def add(a, b):\n    return a + b\n")
+    git(tmp_path, "add", "app.py")
+    git(tmp_path, "commit", "-q", "-m", "base")
+    git(tmp_path, "checkout", "-q", "-b", "feature")
+    return tmp_path
+
+
+class TestDiffCoverageEngine:
+    def test_parse_diff(self):
+        changed = DiffCoverageEngine.parse_diff(DIFF)
+        assert changed == {"src/app.py": (1 << 3) | (1 << 4) | (1 << 12)}
+
+    def test_changed_lines_include_committed_and_uncommitted_changes(self, repo):
+        (repo / "app.py").write_text("def add(a, b):\n    return a + b\n\n\ndef sub(a, b):\n    return a - b\n")
+        git(repo, "commit", "-q", "-am", "sub")
+        # Unstaged change of a line of the base branch
+        (repo / "app.py").write_text("def add(a, b):\n    return b + a\n\n\ndef sub(a, b):\n    return a - b\n")
+
+        engine = DiffCoverageEngine(str(repo), "main")
+
+        # Line 2 was modified, lines 3 to 6 were added
+        assert engine.changed_lines() == {os.path.realpath(repo / "app.py"): sum(1 << line for line in range(2, 7))}
+
+    def test_changed_lines_are_computed_once(self, repo, mocker):
+        engine = DiffCoverageEngine(str(repo), "main")
+        spy = mocker.spy(Runner, "run_command")
+        engine.changed_lines()
+        engine.changed_lines()
+        assert spy.call_count == 3
+
+    def test_unknown_branch(self, repo):
+        engine = DiffCoverageEngine(str(repo), "no-such-branch")
+        with pytest.raises(AssertionError, match="no-such-branch"):
+            engine.changed_lines()
+
+    def test_diff_coverage(self, repo, mocker):
+        engine = DiffCoverageEngine(str(repo), "main")
+        mocker.patch.object(engine, "changed_lines", return_value={os.path.realpath(repo / "app.py"): (1 << 2) | (1 << 5) | (1 << 6)})
+
+        assert engine.diff_coverage(str(repo / "app.py"), [1, 2, 5], [6]) == ([2, 5], [6], 2 / 3)
+        # No changed line is measured
+        assert engine.diff_coverage(str(repo / "other.py"), [1], [2]) == ([], [], 0.0)
+
+    def test_coverage_processor_restricts_coverage_to_changed_lines(self, repo, mocker):
+        engine = DiffCoverageEngine(str(repo), "main")
+        mocker.patch.object(engine, "changed_lines", return_value={os.path.realpath(repo / "app.py"): 1 << 2})
+        mocker.patch.object(CoverageProcessor, "parse_coverage_report_cobertura", return_value=([1], [2], 0.5))
+
+        processor = CoverageProcessor("coverage.xml", str(repo / "app.py"), "cobertura", diff_coverage_engine=engine)
+
+        assert processor.parse_coverage_report() == ([], [2], 0.0)
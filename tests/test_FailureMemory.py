@@ -0,0 +1,93 @@
+from unittest.mock import patch
+
+import pytest
+
+from cover_agent.FailureMemory import FailureMemory
+
+
+class CharacterEncoder:
+    # One token per character, so that the expected limits are easy to compute
+    def encode(self, text):
+        return list(text)
+
+
+@pytest.fixture(autouse=True)
+def encoder():
+    with patch("cover_agent.FailureMemory.TokenEncoder.get_token_encoder", return_value=CharacterEncoder()):
+        yield
+
+
+def failed_test(name, body, error_message="AssertionError: 1 != 2"):
+    return {
+        "code": {"test_name": name, "test_code": f"def {name}():\n    {body}\n"},
+        "error_message": error_message,
+    }
+
+
+class TestFailureMemory:
+    def test_duplicates_are_collapsed(self):
+        memory = FailureMemory.from_failed_test_runs(
+            [
+                failed_test("test_add", "assert add(1, 1) == 3"),
+                failed_test("test_sub", "assert sub(2, 1) == 0"),
+                # Same code under another name, with a comment, and the same error with other numbers
+                failed_test("test_add_again", "assert add(1, 1) == 3  # check", "AssertionError: 2 != 3"),
+            ],
+            language="python",
+        )
+
+        assert len(memory) == 2
+        entries = memory.entries()
+        # The repeated failure became the most recent one, and shows its last occurrence
+        assert entries[0].startswith("Failed Test:\n```\ndef test_sub():")
+        assert entries[1].startswith("Failed Test (2 similar failures):\n```\ndef test_add_again():")
+        assert "AssertionError: 2 != 3" in entries[1]
+
+    def test_other_errors_are_kept_apart(self):
+        memory = FailureMemory.from_failed_test_runs(
+            [
+                failed_test("test_add", "assert add(1, 1) == 3"),
+                failed_test("test_add", "assert add(1, 1) == 3", "Test did not increase code coverage"),
+            ]
+        )
+        assert len(memory) == 2
+
+    def test_comments_within_strings_are_kept(self):
+        memory = FailureMemory.from_failed_test_runs(
+            [
+                failed_test("test_parse", 'assert parse("a#b") == 1'),
+                failed_test("test_parse", 'assert parse("a#c") == 1'),
+                failed_test("test_half", "assert half(7) // 2 == 3"),
+                failed_test("test_half", "assert half(7) // 3 == 2"),
+            ],
+            language="python",
+        )
+        assert len(memory) == 4
+
+    def test_comments_are_kept_in_other_languages(self):
+        memory = FailureMemory.from_failed_test_runs(
+            [
+                failed_test("test_get", 'expect(get("http://a.com")).toBe(1);'),
+                failed_test("test_get", 'expect(get("http://b.com")).toBe(1);'),
+            ],
+            language="javascript",
+        )
+        assert len(memory) == 2
+
+    def test_most_recent_entries_are_kept(self):
+        failed_test_runs = [failed_test(f"test_{i}", f"assert f({i})") for i in range(5)]
+        failed_test_runs.append({"code": {}, "error_message": "Failed to parse the test"})
+
+        memory = FailureMemory.from_failed_test_runs(failed_test_runs, max_entries=3)
+        assert [entry.split("\n")[2] for entry in memory.entries()] == [
+            "def test_2():",
+            "def test_3():",
+            "def test_4():",
+        ]
+
+        # Only the most recent entries that fit in the token limit
+        entry_tokens = len(memory.entries()[-1])
+        memory.max_tokens = 2 * entry_tokens
+        assert [entry.split("\n")[2] for entry in memory.entries()] == ["def test_3():", "def test_4():"]
+        memory.max_tokens = entry_tokens - 1
+        assert memory.summary() == ""
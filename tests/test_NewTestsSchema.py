@@ -0,0 +1,47 @@
+import json
+
+from cover_agent.NewTestsSchema import NewTestsSchema
+
+
+def new_tests(**fields):
+    test = {
+        "test_behavior": "Test adding two numbers",
+        "lines_to_cover": "[3]",
+        "test_name": "test_add",
+        "test_code": "def test_add():\n    assert add(1, 2) == 3\n",
+        "new_imports_code": "",
+        "test_tags": "happy path",
+    }
+    test.update(fields)
+    return {"language": "python", "existing_test_function_signature": "def test_sub():", "new_tests": [test]}
+
+
+class TestNewTestsSchema:
+    def test_response_format(self):
+        response_format = NewTestsSchema.response_format(4)
+        assert response_format["type"] == "json_schema"
+        assert response_format["json_schema"]["strict"] is True
+
+        schema = response_format["json_schema"]["schema"]
+        # Strict mode requires every property, and no other property
+        assert set(schema["required"]) == set(schema["properties"])
+        assert schema["additionalProperties"] is False
+        assert schema["properties"]["new_tests"]["maxItems"] == 4
+        single_test = schema["properties"]["new_tests"]["items"]
+        assert set(single_test["required"]) == set(single_test["properties"])
+        assert single_test["additionalProperties"] is False
+
+    def test_parse(self):
+        response = json.dumps(new_tests())
+        assert NewTestsSchema.parse(response) == new_tests()
+        assert NewTestsSchema.parse(f"```json\n{response}\n```") == new_tests()
+        # lines_to_cover is not asked for every language
+        tests = new_tests()
+        del tests["new_tests"][0]["lines_to_cover"]
+        assert NewTestsSchema.parse(json.dumps(tests)) == tests
+
+    def test_parse_invalid(self):
+        assert NewTestsSchema.parse("language: python\nnew_tests: []\n") is None
+        assert NewTestsSchema.parse(json.dumps({"language": "python"})) is None
+        assert NewTestsSchema.parse(json.dumps(new_tests(test_code=None))) is None
+        assert NewTestsSchema.parse(json.dumps([new_tests()])) is None
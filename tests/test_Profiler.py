@@ -0,0 +1,75 @@
+import asyncio
+import json
+import pytest
+
+from cover_agent.Profiler import Profiler
+
+
+class TestProfiler:
+    @pytest.fixture(autouse=True)
+    def reset_profiler(self):
+        Profiler.reset()
+        yield
+        Profiler.disable()
+        Profiler.reset()
+
+    def test_disabled_profiler_records_nothing(self):
+        @Profiler.timed("phase")
+        def work():
+            return 42
+
+        assert work() == 42
+        with Profiler.span("other"):
+            pass
+        assert Profiler.summary() == {}
+
+    def test_timed_records_sync_and_async_calls(self):
+        Profiler.enable()
+
+        @Profiler.timed("sync")
+        def work(x):
+            return x * 2
+
+        @Profiler.timed("async")
+        async def awork(x):
+            return x + 1
+
+        assert work(2) == 4
+        assert work(3) == 6
+        assert asyncio.run(awork(1)) == 2
+        summary = Profiler.summary()
+        assert summary["sync"]["count"] == 2
+        assert summary["async"]["count"] == 1
+
+    def test_timed_records_failed_calls(self):
+        Profiler.enable()
+
+        @Profiler.timed("failing")
+        def fail():
+            raise ValueError("boom")
+
+        with pytest.raises(ValueError):
+            fail()
+        assert Profiler.summary()["failing"]["count"] == 1
+
+    def test_summary_percentiles_and_order(self):
+        for seconds in range(1, 21):
+            Profiler.record("slow", float(seconds))
+        Profiler.record("fast", 0.5)
+
+        summary = Profiler.summary()
+        assert list(summary) == ["slow", "fast"]
+        assert summary["slow"] == {
+            "count": 20,
+            "total_seconds": 210.0,
+            "p50_seconds": 10.0,
+            "p95_seconds": 19.0,
+            "max_seconds": 20.0,
+        }
+        assert summary["fast"]["p95_seconds"] == 0.5
+
+    def test_write_json(self, tmp_path):
+        Profiler.record("phase", 1.0)
+        output = tmp_path / "profile.json"
+        Profiler.write_json(str(output))
+        assert json.loads(output.read_text())["phase"]["count"] == 1
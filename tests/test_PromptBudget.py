@@ -0,0 +1,62 @@
+from unittest.mock import patch
+
+import pytest
+
+from cover_agent.PromptBudget import PromptBudget
+
+
+class CharacterEncoder:
+    # One token per character, so that the expected budgets are easy to compute
+    def encode(self, text):
+        return list(text)
+
+    def decode(self, tokens):
+        return "".join(tokens)
+
+
+@pytest.fixture
+def budget():
+    with patch("cover_agent.PromptBudget.TokenEncoder.get_token_encoder", return_value=CharacterEncoder()):
+        yield PromptBudget(max_tokens=100)
+
+
+class TestPromptBudget:
+    def test_for_model(self):
+        settings = {
+            "prompt_budget.enabled": True,
+            "prompt_budget.max_prompt_tokens": 1000,
+            "prompt_budget.models": {"small-model": 10},
+        }
+        with patch("cover_agent.PromptBudget.get_settings") as mock_settings, patch(
+            "cover_agent.PromptBudget.TokenEncoder.get_token_encoder", return_value=CharacterEncoder()
+        ):
+            mock_settings.return_value.get.side_effect = lambda key, default=None: settings.get(key, default)
+            assert PromptBudget.for_model("small-model").max_tokens == 10
+            assert PromptBudget.for_model("other-model").max_tokens == 1000
+
+            settings["prompt_budget.enabled"] = False
+            assert PromptBudget.for_model("small-model") is None
+
+    def test_clip(self, budget):
+        assert budget.clip("short", 10) == "short"
+        assert budget.clip("a" * 50, 20) == "aaaaa\n...(truncated)"
+        assert budget.clip("a" * 50, 5) == ""
+
+    def test_keep_recent(self, budget):
+        entries = ["first;", "second;", "third;"]
+        render = lambda kept: "[" + "".join(kept) + "]"
+        assert budget.keep_recent(entries, render, 100) == "[first;second;third;]"
+        assert budget.keep_recent(entries, render, 15) == "[second;third;]"
+        assert budget.keep_recent(entries, render, 3) == ""
+
+    def test_window_lines(self, budget):
+        lines = [f"{number} line" for number in range(1, 11)]
+
+        # Lines around the missed lines 3 and 8, as far as they fit
+        assert budget.window_lines(lines, [3, 8], 40) == "...\n3 line\n...\n8 line\n..."
+        assert budget.window_lines(lines, [3, 8], 60) == "...\n2 line\n3 line\n4 line\n...\n7 line\n8 line\n9 line\n..."
+        assert budget.window_lines(lines, [3, 8], 1000) == "\n".join(lines)
+        # Only the first missed lines fit
+        assert budget.window_lines(lines, [3, 8], 20) == "...\n3 line\n..."
+        # Without missed lines, the beginning of the file is kept
+        assert budget.window_lines(lines, [], 30) == "1 line\n2 line\n3 line\n..."
@@ -2,6 +2,7 @@ import os
 import pytest
 import tempfile
 from unittest.mock import patch, mock_open
+from cover_agent.PromptBudget import PromptBudget
 from cover_agent.PromptBuilder import PromptBuilder
 
 
@@ -73,6 +74,31 @@ class TestPromptBuilder:
         assert "## Additional Includes" in result["user"]
         assert "Included Files Content" in result["user"]
 
+    def test_stable_prefix_comes_first(self, monkeypatch):
+        # Disable the monkeypatch for open within this test
+        monkeypatch.undo()
+        builder = PromptBuilder(
+            source_file_path="source_path",
+            test_file_path="test_path",
+            code_coverage_report="coverage_report",
+            included_files="Included Files Content",
+            failed_test_runs="Failed Test Content",
+        )
+        builder.source_file_numbered = "1 Source Content"
+        builder.test_file = "Test Content"
+        builder.code_coverage_report = "Coverage Report Content"
+
+        result = builder.build_prompt()
+
+        # The source and included files do not change between iterations, the test file, failed tests and coverage do
+        assert "1 Source Content" in result["cache_prefix"]
+        assert "Included Files Content" in result["cache_prefix"]
+        assert "Test Content" not in result["cache_prefix"]
+        assert "Failed Test Content" not in result["cache_prefix"]
+        assert result["user"].startswith(result["cache_prefix"])
+        assert "Coverage Report Content" in result["user"]
+        assert "cache-breakpoint" not in result["user"]
+
     def test_empty_additional_instructions_section_not_in_prompt(self, monkeypatch):
         # Disable the monkeypatch for open within this test
         monkeypatch.undo()
@@ -223,3 +249,96 @@ class TestPromptBuilderEndToEnd:
         result = builder.build_prompt_custom("nonexistent_file")
         assert result == {"system": "", "user": ""}
 
+
+    def test_build_prompt_fits_token_budget(self, monkeypatch, tmp_path):
+        monkeypatch.undo()
+        source_file = tmp_path / "app.py"
+        source_file.write_text("\n".join(f"value_{i} = {i}" for i in range(1, 201)) + "\n")
+        test_file = tmp_path / "test_app.py"
+        test_file.write_text("def test_value():\n    pass\n")
+
+        class CharacterEncoder:
+            def encode(self, text):
+                return list(text)
+
+            def decode(self, tokens):
+                return "".join(tokens)
+
+        builder = PromptBuilder(
+            source_file_path=str(source_file),
+            test_file_path=str(test_file),
+            code_coverage_report="Lines covered: [1, 2]\nLines missed: [150]\nPercentage covered: 1%",
+            included_files="included " * 1000,
+            failed_test_run_entries=["old failure " * 100, "recent failure\n"],
+            project_root=str(tmp_path),
+            model="small-model",
+        )
+        unbounded = builder.build_prompt()
+        unbounded_tokens = len(unbounded["system"]) + len(unbounded["user"])
+
+        budgets = {}
+        monkeypatch.setattr(PromptBudget, "for_model", classmethod(lambda cls, model: budgets.get(model)))
+        with patch("cover_agent.PromptBudget.TokenEncoder.get_token_encoder", return_value=CharacterEncoder()):
+            budgets["small-model"] = PromptBudget(max_tokens=unbounded_tokens - 9500)
+
+        # The included files are clipped, and only the most recent failed test is kept
+        result = builder.build_prompt()
+        assert len(result["system"]) + len(result["user"]) <= budgets["small-model"].max_tokens
+        assert builder.source_file_numbered.strip() in result["user"]
+        assert "recent failure" in result["user"]
+        assert "old failure" not in result["user"]
+        assert 0 < result["user"].count("included ") < 1000
+
+        # The source file does not fit either: it is windowed around the missed line, and the other sections are dropped
+        with patch("cover_agent.PromptBudget.TokenEncoder.get_token_encoder", return_value=CharacterEncoder()):
+            budgets["small-model"] = PromptBudget(max_tokens=unbounded_tokens - 12000)
+        result = builder.build_prompt()
+        assert len(result["system"]) + len(result["user"]) <= budgets["small-model"].max_tokens
+        assert "\n150 value_150 = 150\n" in result["user"]
+        assert "\n1 value_1 = 1\n" not in result["user"]
+        assert "recent failure" not in result["user"]
+        assert "included " not in result["user"]
+
+    def test_source_skeleton(self, monkeypatch, tmp_path):
+        monkeypatch.undo()
+        source_file = tmp_path / "app.py"
+        source_file.write_text(
+            "import os\n"
+            "\n"
+            "\n"
+            "class Calculator:\n"
+            "    def add(self, a, b):\n"
+            "        result = a + b\n"
+            "        return result\n"
+            "\n"
+            "    def sub(self, a,\n"
+            "            b):\n"
+            "        if a > b:\n"
+            "            return a - b\n"
+            "        return b - a\n"
+        )
+        test_file = tmp_path / "test_app.py"
+        test_file.write_text("def test_add():\n    pass\n")
+
+        builder = PromptBuilder(
+            source_file_path=str(source_file),
+            test_file_path=str(test_file),
+            code_coverage_report="Lines covered: [1, 4, 5, 6, 7, 9]\nLines missed: [11, 12, 13]\nPercentage covered: 60%",
+            source_skeleton=True,
+        )
+
+        # The body of add() has no missed lines; the multi-line signature of sub() and its body are kept
+        assert builder.source_file_numbered == (
+            "1 import os\n2 \n3 \n4 class Calculator:\n5     def add(self, a, b):\n...\n8 \n"
+            "9     def sub(self, a,\n10             b):\n11         if a > b:\n12             return a - b\n13         return b - a\n14 "
+        )
+        assert "6         result = a + b" in builder.source_file_numbered_full
+
+        # Without missed lines, the whole source file is sent
+        builder = PromptBuilder(
+            source_file_path=str(source_file),
+            test_file_path=str(test_file),
+            code_coverage_report="coverage report",
+            source_skeleton=True,
+        )
+        assert builder.source_file_numbered == builder.source_file_numbered_full
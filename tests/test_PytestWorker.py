@@ -0,0 +1,115 @@
+import os
+import signal
+import sys
+import time
+
+import pytest
+from unittest.mock import patch
+
+from cover_agent import pytest_worker_server
+from cover_agent.PytestWorker import PytestWorker
+from cover_agent.Runner import Runner
+
+
+class TestPytestWorker:
+    @pytest.fixture(autouse=True)
+    def stop_workers(self):
+        yield
+        PytestWorker.disable()
+
+    def test_parse_command(self):
+        assert PytestWorker.parse_command("pytest --cov=. -q") == (["python"], ["--cov=.", "-q"], False)
+        assert PytestWorker.parse_command("poetry run python -m pytest tests") == (
+            ["poetry", "run", "python"],
+            ["tests"],
+            True,
+        )
+        assert PytestWorker.parse_command(".venv/bin/pytest tests") == ([".venv/bin/python"], ["tests"], False)
+
+    @pytest.mark.parametrize(
+        "command",
+        [
+            "npm test",
+            "coverage run -m pytest",
+            "pytest tests && coverage xml",
+            "PYTHONPATH=src pytest tests",
+            "pytest $TESTS",
+        ],
+    )
+    def test_parse_command_unsupported(self, command):
+        assert PytestWorker.parse_command(command) is None
+
+    def test_run_command_reloads_edited_test_file(self, tmp_path):
+        test_file = tmp_path / "test_sample.py"
+        test_file.write_text("def test_sample():\n    assert True\n")
+        command = f"{sys.executable} -m pytest -p no:cacheprovider test_sample.py"
+
+        stdout, _, exit_code, stats = PytestWorker.run_command(command, cwd=str(tmp_path), timeout=30)
+        assert exit_code == 0
+        assert stats["cpu_time_seconds"] > 0
+        assert "1 passed" in stdout
+
+        # Make sure the modification time changes, even on file systems with a coarse resolution
+        time.sleep(0.01)
+        test_file.write_text("def test_sample():\n    assert False\n\ndef test_other():\n    assert True\n")
+        stat = os.stat(test_file)
+        os.utime(test_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+        stdout, _, exit_code, _ = PytestWorker.run_command(command, cwd=str(tmp_path), timeout=30)
+        assert exit_code == 1
+        assert "1 failed, 1 passed" in stdout
+        assert len(PytestWorker._workers) == 1
+
+    def test_runner_falls_back_to_subprocess(self):
+        PytestWorker.enable()
+        with patch.object(PytestWorker, "run_command", return_value=None) as mock_worker:
+            stdout, _, exit_code, _ = Runner.run_command('echo "Hello"')
+        mock_worker.assert_called_once()
+        assert stdout.strip() == "Hello"
+        assert exit_code == 0
+
+    def test_run_command_timeout_does_not_depend_on_the_alarm(self, tmp_path):
+        # The code under test ignores SIGALRM, and the timeout is below one second
+        (tmp_path / "test_sample.py").write_text(
+            "import signal, time\n\ndef test_sample():\n    signal.signal(signal.SIGALRM, signal.SIG_IGN)\n    time.sleep(30)\n"
+        )
+        command = f"{sys.executable} -m pytest -p no:cacheprovider test_sample.py"
+
+        start = time.monotonic()
+        _, stderr, exit_code, _ = PytestWorker.run_command(command, cwd=str(tmp_path), timeout=0.5)
+        assert time.monotonic() - start < 10
+        assert (stderr, exit_code) == ("Command timed out", -1)
+
+    @pytest.mark.parametrize("code, exit_code", [(None, 0), (0, 0), (5, 5), ("error", 1)])
+    def test_run_pytest_system_exit(self, tmp_path, code, exit_code):
+        # Same exit code as the interpreter
+        with patch("pytest.main", side_effect=SystemExit(code)):
+            response = pytest_worker_server.run_pytest({"args": [], "cwd": str(tmp_path), "timeout": 30}, {})
+        assert response["exit_code"] == exit_code
+        assert not response["timed_out"]
+
+    def test_read_output_is_truncated(self, tmp_path):
+        output_path = tmp_path / "stdout"
+        output_path.write_bytes(b"start" + b"x" * 100000 + b"end\r\n")
+        output, truncated_bytes = pytest_worker_server.read_output(str(output_path), max_bytes=1000)
+        assert truncated_bytes == 100010 - 1000
+        assert output.startswith("start") and output.endswith("end\n")
+        assert f"[{truncated_bytes} bytes of output truncated]" in output
+
+        assert pytest_worker_server.read_output(str(output_path)) == ("start" + "x" * 100000 + "end\n", 0)
+
+    def test_unresponsive_worker_is_killed_and_restarted(self, tmp_path):
+        (tmp_path / "test_sample.py").write_text("def test_sample():\n    assert True\n")
+        command = f"{sys.executable} -m pytest -p no:cacheprovider test_sample.py"
+        PytestWorker.run_command(command, cwd=str(tmp_path), timeout=30)
+        worker = next(iter(PytestWorker._workers.values()))
+
+        # A server that does not answer in time
+        with patch.object(PytestWorker, "TIMEOUT_GRACE_SECONDS", 0.1):
+            os.kill(worker.process.pid, signal.SIGSTOP)
+            result = PytestWorker.run_command(command, cwd=str(tmp_path), timeout=0.1)
+        assert result == ("", "Command timed out", -1, {})
+        assert not worker.is_alive()
+
+        _, _, exit_code, _ = PytestWorker.run_command(command, cwd=str(tmp_path), timeout=30)
+        assert exit_code == 0
+        assert next(iter(PytestWorker._workers.values())) is not worker
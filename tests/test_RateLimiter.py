@@ -0,0 +1,116 @@
+import asyncio
+import json
+from unittest.mock import AsyncMock, Mock, patch
+
+import httpx
+import pytest
+
+from cover_agent.AICaller import retry_after_seconds, wait_before_retry
+from cover_agent.RateLimiter import RateLimiter
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    clock = FakeClock()
+    with patch("cover_agent.RateLimiter.time.time", side_effect=clock.time):
+        yield clock
+
+
+class TestRateLimiter:
+    def test_requests_per_minute(self, clock):
+        limiter = RateLimiter(requests_per_minute=60)
+
+        # A full bucket lets a minute of requests through, then each request waits for its turn
+        assert [limiter._reserve(0) for _ in range(60)] == [0.0] * 60
+        assert limiter._reserve(0) == pytest.approx(1.0)
+        assert limiter._reserve(0) == pytest.approx(2.0)
+
+        clock.now += 10
+        assert limiter._reserve(0) == pytest.approx(0.0)
+        assert limiter.requests == 63
+        assert limiter.delayed_requests == 2
+        assert limiter.total_wait_seconds == pytest.approx(3.0)
+
+    def test_tokens_per_minute_and_settle(self, clock):
+        limiter = RateLimiter(tokens_per_minute=6000)
+
+        assert limiter._reserve(5000) == 0.0
+        # The call used fewer tokens than estimated
+        limiter.settle(5000, 3000)
+        assert limiter._reserve(3000) == 0.0
+        # 1000 tokens of debt, refilled at 100 tokens per second
+        assert limiter._reserve(1000) == pytest.approx(10.0)
+        # A call larger than the limit waits for a full bucket only
+        clock.now += 70
+        assert limiter._reserve(10000) == 0.0
+
+    def test_settle_does_not_overfill_the_bucket(self, clock):
+        limiter = RateLimiter(tokens_per_minute=6000)
+
+        assert limiter._reserve(1000) == 0.0
+        # The call used no token at all: the bucket is full again, but not more than full
+        limiter.settle(1000, 0)
+        assert limiter._state["tokens"] == 6000
+        assert limiter._reserve(6000) == 0.0
+        assert limiter._reserve(100) == pytest.approx(1.0)
+
+    def test_acquire_async_waits(self, clock):
+        limiter = RateLimiter(requests_per_minute=60)
+        limiter._state["requests"] = 0
+        with patch("cover_agent.RateLimiter.asyncio.sleep", new_callable=AsyncMock) as mock_sleep:
+            assert asyncio.run(limiter.acquire_async(0)) == pytest.approx(1.0)
+        mock_sleep.assert_awaited_once_with(pytest.approx(1.0))
+
+    def test_limits_are_shared_through_the_state_file(self, clock, tmp_path):
+        state_file = str(tmp_path / "rate_limit.json")
+        first = RateLimiter(requests_per_minute=2, state_file=state_file)
+        second = RateLimiter(requests_per_minute=2, state_file=state_file)
+
+        assert first._reserve(0) == 0.0
+        assert second._reserve(0) == 0.0
+        assert first._reserve(0) == pytest.approx(30.0)
+
+    def test_corrupt_state_file_is_reset(self, clock, tmp_path):
+        state_file = tmp_path / "rate_limit.json"
+        state_file.write_text('{"requests": 1.5, "tok')
+        limiter = RateLimiter(requests_per_minute=2, state_file=str(state_file))
+
+        assert limiter._reserve(0) == 0.0
+        assert json.loads(state_file.read_text())["requests"] == 1
+
+    def test_no_limits(self):
+        with patch("cover_agent.RateLimiter.get_settings") as mock_settings, patch.object(RateLimiter, "_instance", None):
+            mock_settings.return_value.get.side_effect = lambda key, default=None: default
+            assert RateLimiter.get_rate_limiter() is None
+
+
+class TestRetryAfter:
+    def make_error(self, headers):
+        error = Exception("Rate limit reached")
+        error.response = httpx.Response(429, headers=headers)
+        return error
+
+    def test_retry_after_seconds(self):
+        assert retry_after_seconds(self.make_error({"retry-after": "7"})) == 7.0
+        assert retry_after_seconds(self.make_error({"retry-after-ms": "1500"})) == 1.5
+        assert retry_after_seconds(self.make_error({"retry-after": "Wed, 21 Oct 2015 07:28:00 GMT"})) == 0.0
+        assert retry_after_seconds(self.make_error({})) is None
+        assert retry_after_seconds(Exception("Connection reset")) is None
+
+    def test_wait_before_retry(self):
+        def retry_state(error, attempt_number=1):
+            return Mock(outcome=Mock(exception=Mock(return_value=error)), attempt_number=attempt_number)
+
+        assert wait_before_retry(retry_state(self.make_error({"retry-after": "7"}))) == 7.0
+        # Capped by llm.retry_max_wait_seconds
+        assert wait_before_retry(retry_state(self.make_error({"retry-after": "3600"}))) == 60
+        # Exponential backoff with up to one second of jitter
+        assert 4 <= wait_before_retry(retry_state(Exception("Connection reset"), attempt_number=3)) <= 5
@@ -0,0 +1,72 @@
+import asyncio
+import json
+from argparse import Namespace
+from unittest.mock import MagicMock, patch
+
+from cover_agent.RepoScheduler import RepoScheduler
+
+
+class FakeContextHelper:
+    async def find_test_file_context(self, test_file):
+        return [test_file.replace("test_", "")]
+
+    async def analyze_context(self, test_file, context_files, ai_caller):
+        if "test_helpers" in test_file:
+            return None, context_files
+        return context_files[0], []
+
+
+class FakeCoverAgent:
+    instances = []
+
+    def __init__(self, args):
+        self.args = args
+        self.response_cache = MagicMock()
+        FakeCoverAgent.instances.append(self)
+        self.test_gen = MagicMock(total_input_token_count=10, total_output_token_count=5)
+        self.test_gen.ai_caller.total_cached_prompt_tokens = 4
+        self.test_validator = MagicMock(total_input_token_count=1, total_output_token_count=1, current_coverage=0.9)
+        self.test_validator.ai_caller.total_cached_prompt_tokens = 0
+
+    def run(self):
+        with open(self.args.test_file_path, "a") as f:
+            f.write(f"# extended in {self.args.project_root}\n")
+
+
+class TestRepoScheduler:
+    def test_run_in_sandboxes(self, tmp_path):
+        project = tmp_path / "project"
+        project.mkdir()
+        for name in ["app", "calc", "helpers"]:
+            (project / f"{name}.py").write_text("x = 1\n")
+            (project / f"test_{name}.py").write_text("import pytest\n")
+        args = Namespace(
+            project_root=str(project),
+            test_file_output_path="",
+            code_coverage_report_path=str(project / "coverage.xml"),
+            test_command=f"pytest --cov={project}",
+            log_db_path=str(tmp_path / "runs.db"),
+            report_filepath=str(tmp_path / "report.html"),
+        )
+        test_files = [str(project / f"test_{name}.py") for name in ["app", "calc", "helpers"]]
+
+        scheduler = RepoScheduler(args, FakeContextHelper(), MagicMock(), max_concurrent_agents=2)
+        with patch("cover_agent.RepoScheduler.CoverAgent", FakeCoverAgent):
+            summary = asyncio.run(scheduler.run(test_files))
+
+        assert [result["status"] for result in summary["results"]] == ["completed", "completed", "skipped"]
+        assert summary["total_input_tokens"] == 22
+        assert summary["total_cached_input_tokens"] == 8
+        # Agents ran in sandboxes, and their test files were copied back to the project
+        for name in ["app", "calc"]:
+            content = (project / f"test_{name}.py").read_text()
+            assert content.startswith("import pytest\n# extended in ")
+            assert str(project) not in content
+        assert (project / "test_helpers.py").read_text() == "import pytest\n"
+        assert (tmp_path / "report.html").exists()
+        # The response cache of every agent is closed once the agent is done
+        assert all(agent.response_cache.close.called for agent in FakeCoverAgent.instances)
+
+        summary_path = tmp_path / "summary.json"
+        RepoScheduler.write_summary(summary, str(summary_path))
+        assert json.loads(summary_path.read_text())["completed"] == 2
@@ -56,3 +56,26 @@ class TestReportGeneration:
 
 
         # Additional validation can be added based on specific content if required
+
+    def test_generate_report_with_profile(self, sample_results, tmp_path):
+        report_path = tmp_path / "test_report.html"
+        profile = {
+            "llm.call_model": {
+                "count": 3,
+                "total_seconds": 12.5,
+                "p50_seconds": 4.0,
+                "p95_seconds": 5.5,
+                "max_seconds": 5.5,
+            }
+        }
+        ReportGenerator.generate_report(sample_results, str(report_path), profile=profile)
+
+        content = report_path.read_text()
+        assert "<h2>Profile</h2>" in content
+        assert "llm.call_model" in content
+        assert "12.5" in content
+
+    def test_generate_report_without_profile(self, sample_results, tmp_path):
+        report_path = tmp_path / "test_report.html"
+        ReportGenerator.generate_report(sample_results, str(report_path))
+        assert "<h2>Profile</h2>" not in report_path.read_text()
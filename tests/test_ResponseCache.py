@@ -0,0 +1,57 @@
+import time
+
+import pytest
+
+from cover_agent.ResponseCache import ResponseCache
+
+
+class TestResponseCache:
+    def test_key_depends_on_content_not_streaming(self):
+        params = {"model": "gpt-4o", "messages": [{"role": "user", "content": "Hi"}], "temperature": 0.2, "stream": True}
+        same_params_not_streamed = dict(params, stream=False)
+        other_temperature = dict(params, temperature=1)
+
+        assert ResponseCache.make_key(params) == ResponseCache.make_key(same_params_not_streamed)
+        assert ResponseCache.make_key(params) != ResponseCache.make_key(other_temperature)
+
+    def test_put_and_get_records_token_counts(self, tmp_path):
+        cache = ResponseCache(str(tmp_path / "cache.db"))
+        assert cache.get("key") is None
+
+        cache.put("key", "gpt-4o", "response", 10, 20)
+
+        assert cache.get("key") == ("response", 10, 20)
+        assert (cache.hits, cache.misses) == (1, 1)
+        assert (cache.cached_prompt_tokens, cache.cached_completion_tokens) == (10, 20)
+
+    def test_read_only_and_bypass_modes(self, tmp_path):
+        db_path = str(tmp_path / "cache.db")
+        ResponseCache(db_path).put("key", "gpt-4o", "response", 1, 1)
+
+        read_only_cache = ResponseCache(db_path, mode="read-only")
+        read_only_cache.put("other", "gpt-4o", "other response", 1, 1)
+        assert read_only_cache.get("key") == ("response", 1, 1)
+        assert read_only_cache.get("other") is None
+
+        assert ResponseCache(db_path, mode="bypass").get("key") is None
+        with pytest.raises(ValueError):
+            ResponseCache(db_path, mode="write-only")
+
+    def test_evicts_least_recently_used_entries(self, tmp_path):
+        cache = ResponseCache(str(tmp_path / "cache.db"), max_entries=2)
+        cache.put("first", "gpt-4o", "1", 1, 1)
+        time.sleep(0.01)
+        cache.put("second", "gpt-4o", "2", 1, 1)
+        time.sleep(0.01)
+        cache.get("first")
+        time.sleep(0.01)
+        cache.put("third", "gpt-4o", "3", 1, 1)
+
+        assert cache.get("second") is None
+        assert cache.get("first") is not None
+        assert cache.get("third") is not None
+
+    def test_expired_entries_are_ignored(self, tmp_path):
+        cache = ResponseCache(str(tmp_path / "cache.db"), max_age_days=0)
+        cache.put("key", "gpt-4o", "response", 1, 1)
+        assert cache.get("key") is None
@@ -1,4 +1,5 @@
 import pytest
+import time
 from unittest.mock import patch
 from cover_agent.Runner import Runner  # Adjust the import path as necessary
 
@@ -31,3 +32,48 @@ class TestRunner:
             or "command_that_does_not_exist: command not found" in stderr
         )
         assert exit_code != 0
+
+    def test_run_command_records_stats(self):
+        """Test that the resources used by the last command are recorded."""
+        Runner.run_command("python -c 'sum(range(10**6))'")
+        stats = Runner.get_last_run_stats()
+        assert stats["cpu_time_seconds"] > 0
+        assert stats["peak_memory_mb"] > 0
+        assert stats["timed_out"] is False
+        assert stats["truncated_output_bytes"] == 0
+
+    def test_run_command_truncates_large_output(self):
+        """Test that only the head and tail of a large output are kept."""
+        with patch("cover_agent.Runner.get_settings") as mock_settings:
+            mock_settings.return_value.get.side_effect = lambda key, default=None: 1000 if key == "tests.max_output_bytes" else default
+            stdout, _, exit_code, _ = Runner.run_command("echo start; seq 1 100000; echo end")
+        assert exit_code == 0
+        assert stdout.startswith("start\n1\n2\n")
+        assert stdout.endswith("99999\n100000\nend\n")
+        assert "bytes of output truncated" in stdout
+        assert len(stdout) < 1100
+        assert Runner.get_last_run_stats()["truncated_output_bytes"] > 0
+
+    def test_run_command_timeout_kills_process_group(self, tmp_path):
+        """Test that a timeout kills the command and the processes it started."""
+        marker = tmp_path / "marker"
+        command = f"(sleep 2; touch {marker}) & sleep 10"
+        with patch("cover_agent.Runner.get_settings") as mock_settings:
+            mock_settings.return_value.get.side_effect = lambda key, default=None: 0.5 if key == "tests.max_allowed_runtime_seconds" else default
+            stdout, stderr, exit_code, _ = Runner.run_command(command)
+        assert (stdout, stderr, exit_code) == ("", "Command timed out", -1)
+        assert Runner.get_last_run_stats()["timed_out"] is True
+        time.sleep(2.5)
+        assert not marker.exists()
+
+    def test_adaptive_timeout(self):
+        """Test the timeout derived from the recent durations of a command."""
+        settings = {"tests.timeout_factor": 3, "tests.timeout_slack_seconds": 5, "tests.adaptive_timeout_max_seconds": 100}
+        with patch("cover_agent.Runner.get_settings") as mock_settings:
+            mock_settings.return_value.get.side_effect = lambda key, default=None: settings.get(key, default)
+            assert Runner.adaptive_timeout([1.0, 2.0]) == 11.0
+            # The static timeout applies until a duration is known
+            assert Runner.adaptive_timeout([]) is None
+            assert Runner.adaptive_timeout([60.0]) == 100
+            settings["tests.adaptive_timeout"] = False
+            assert Runner.adaptive_timeout([1.0]) is None
@@ -0,0 +1,43 @@
+import os
+
+from cover_agent.SandboxPool import SandboxPool
+
+
+class TestSandboxPool:
+    def test_sandboxes_are_isolated_copies(self, tmp_path):
+        (tmp_path / "test_app.py").write_text("original")
+        (tmp_path / ".git").mkdir()
+
+        with SandboxPool(str(tmp_path), size=2, ignore_patterns=[".git"]) as pool:
+            assert len(pool.sandboxes) == 2
+            sandbox_root = pool.acquire()
+            sandbox_test_file = pool.map_path(str(tmp_path / "test_app.py"), sandbox_root)
+            assert sandbox_test_file.startswith(sandbox_root)
+            assert not os.path.exists(os.path.join(sandbox_root, ".git"))
+
+            pool.write_file(sandbox_test_file, "modified")
+            pool.release(sandbox_root)
+
+        assert (tmp_path / "test_app.py").read_text() == "original"
+        assert not os.path.exists(sandbox_root)
+
+    def test_hardlink_mode_does_not_modify_private_paths(self, tmp_path):
+        (tmp_path / "test_app.py").write_text("original")
+        (tmp_path / "coverage.xml").write_text("<coverage/>")
+
+        with SandboxPool(
+            str(tmp_path), size=1, link_mode="hardlink", private_paths=[str(tmp_path / "coverage.xml")]
+        ) as pool:
+            sandbox_root = pool.acquire()
+            with open(pool.map_path(str(tmp_path / "coverage.xml"), sandbox_root), "w") as f:
+                f.write("<coverage>new</coverage>")
+            pool.write_file(pool.map_path(str(tmp_path / "test_app.py"), sandbox_root), "modified")
+
+        assert (tmp_path / "coverage.xml").read_text() == "<coverage/>"
+        assert (tmp_path / "test_app.py").read_text() == "original"
+
+    def test_map_command_and_contains(self, tmp_path):
+        pool = SandboxPool(str(tmp_path), size=1)
+        assert pool.contains(str(tmp_path / "src" / "app.py"))
+        assert not pool.contains("/somewhere/else.py")
+        assert pool.map_command(f"pytest --cov={tmp_path}", "/sandbox") == "pytest --cov=/sandbox"
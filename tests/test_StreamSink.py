@@ -0,0 +1,46 @@
+import io
+
+import pytest
+from unittest.mock import patch
+
+from cover_agent.StreamSink import CallbackStreamSink, NullStreamSink, TerminalStreamSink, get_stream_sink
+
+
+class TestStreamSink:
+    def test_terminal_sink_throttles_flushes(self):
+        stream = io.StringIO()
+        sink = TerminalStreamSink(stream=stream, min_interval=3600)
+        sink.start()
+        sink.write("Hello, ")
+        sink.write("world!")
+        # Nothing is rendered until the flush interval elapses or the response ends
+        assert stream.getvalue() == "Streaming results from LLM model...\n"
+
+        sink.end()
+        assert stream.getvalue() == "Streaming results from LLM model...\nHello, world!\n\n"
+
+    def test_terminal_sink_without_throttling(self):
+        stream = io.StringIO()
+        sink = TerminalStreamSink(stream=stream, min_interval=0)
+        sink.start()
+        sink.write("Hello")
+        assert stream.getvalue().endswith("Hello")
+
+    def test_callback_sink(self):
+        chunks, events = [], []
+        sink = CallbackStreamSink(chunks.append, on_start=lambda: events.append("start"), on_end=lambda: events.append("end"))
+        sink.start()
+        sink.write("a")
+        sink.write("")
+        sink.write("b")
+        sink.end()
+        assert chunks == ["a", "b"]
+        assert events == ["start", "end"]
+
+    def test_get_stream_sink(self):
+        assert isinstance(get_stream_sink("none"), NullStreamSink)
+        assert isinstance(get_stream_sink("terminal"), TerminalStreamSink)
+        with patch("cover_agent.StreamSink.sys.stdout.isatty", return_value=False):
+            assert isinstance(get_stream_sink("auto"), NullStreamSink)
+        with pytest.raises(ValueError):
+            get_stream_sink("unknown")
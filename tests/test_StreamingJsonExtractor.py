@@ -0,0 +1,39 @@
+import json
+
+from cover_agent.StreamingJsonExtractor import StreamingJsonExtractor
+
+
+def feed_by_character(extractor, text):
+    completed = []
+    for position, character in enumerate(text):
+        completed.extend((position, index, item) for index, item in extractor.feed(character))
+    return completed
+
+
+class TestStreamingJsonExtractor:
+    def test_items_complete_with_their_closing_brace(self):
+        tests = [
+            {"test_name": "test_a", "test_code": "def test_a():\n    assert f('}') == \"{\"\n"},
+            {"test_name": "test_b", "test_code": "def test_b():\n    assert g([1, {2: 3}])\n"},
+        ]
+        response = json.dumps({"language": "python", "new_tests": tests, "existing_test_function_signature": "def f():"})
+        extractor = StreamingJsonExtractor()
+
+        completed = feed_by_character(extractor, response)
+
+        assert [(index, item) for _, index, item in completed] == [(0, tests[0]), (1, tests[1])]
+        # The first test is complete before the second one is generated
+        first_position = completed[0][0]
+        assert response[first_position] == "}"
+        assert first_position < response.index("test_b")
+        assert extractor.finish() == []
+
+    def test_incomplete_item(self):
+        extractor = StreamingJsonExtractor()
+        assert extractor.feed('{"new_tests": [{"test_name": "test_a", "test_co') == []
+        assert extractor.finish() == [(0, None)]
+
+    def test_yaml_response(self):
+        extractor = StreamingJsonExtractor()
+        assert extractor.feed("new_tests:\n- test_name: test_a\n  test_code: pass\n") == []
+        assert extractor.finish() == []
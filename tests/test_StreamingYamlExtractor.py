@@ -0,0 +1,62 @@
+from cover_agent.StreamingYamlExtractor import StreamingYamlExtractor
+
+RESPONSE = """```yaml
+language: python
+existing_test_function_signature: |
+  def test_add():
+new_tests:
+- test_behavior: |
+    Add two numbers
+  test_name: test_add_numbers
+  test_code: |
+    def test_add_numbers():
+        # Items of a block are not items of the list
+        - 1
+
+        assert add(1, 2) == 3
+  new_imports_code: ""
+  test_tags: happy path
+- test_behavior: Subtract two numbers
+  test_name: test_sub_numbers
+  test_code: |
+    def test_sub_numbers():
+        assert sub(2, 1) == 1
+  new_imports_code: ""
+  test_tags: edge case
+```
+"""
+
+
+def extract(response, chunk_size):
+    extractor = StreamingYamlExtractor()
+    completed = []
+    for start in range(0, len(response), chunk_size):
+        chunk = response[start:start + chunk_size]
+        completed.extend((start + len(chunk), index, item) for index, item in extractor.feed(chunk))
+    completed.extend((len(response), index, item) for index, item in extractor.finish())
+    return completed
+
+
+class TestStreamingYamlExtractor:
+    def test_items_are_complete_when_the_next_one_starts(self):
+        for chunk_size in [1, 7, len(RESPONSE)]:
+            completed = extract(RESPONSE, chunk_size)
+
+            assert [(index, item["test_name"]) for _, index, item in completed] == [
+                (0, "test_add_numbers"),
+                (1, "test_sub_numbers"),
+            ]
+            # The first test is complete once the first line of the second one is
+            assert completed[0][0] <= RESPONSE.index("  test_name: test_sub_numbers") + chunk_size
+            assert completed[0][2]["test_code"] == (
+                "def test_add_numbers():\n    # Items of a block are not items of the list\n    - 1\n\n    assert add(1, 2) == 3\n"
+            )
+
+    def test_indented_list_ended_by_a_key(self):
+        response = "new_tests:\n  - test_name: test_a\n    test_code: pass\n  - test_name: [\nsummary: done\n"
+        completed = [(index, item) for _, index, item in extract(response, 5)]
+        # An item that does not parse on its own is returned as None
+        assert completed == [(0, {"test_name": "test_a", "test_code": "pass"}), (1, None)]
+
+    def test_no_list(self):
+        assert extract("language: python\nnew_tests: []\n", 4) == []
@@ -0,0 +1,42 @@
+from cover_agent.SuiteAnalyzer import PythonSuiteAnalyzer
+
+
+class TestPythonSuiteAnalyzer:
+    def test_pytest_functions(self):
+        content = "import pytest\nfrom app import add\n\n\ndef test_add():\n    assert add(1, 2) == 3\n\n\ndef test_sub():\n    assert add(1, -1) == 0\n"
+        assert PythonSuiteAnalyzer(content).analyze() == {
+            "test_headers_indentation": 0,
+            "relevant_line_number_to_insert_tests_after": 10,
+            "relevant_line_number_to_insert_imports_after": 2,
+            "testing_framework": "pytest",
+        }
+
+    def test_unittest_class(self):
+        content = (
+            "import unittest\n"
+            "\n"
+            "class TestApp(unittest.TestCase):\n"
+            "    def setUp(self):\n"
+            "        self.value = 1\n"
+            "\n"
+            "    def test_value(self):\n"
+            "        self.assertEqual(self.value, 1)\n"
+            "\n"
+            "if __name__ == '__main__':\n"
+            "    unittest.main()\n"
+        )
+        assert PythonSuiteAnalyzer(content).analyze() == {
+            "test_headers_indentation": 4,
+            "relevant_line_number_to_insert_tests_after": 8,
+            "relevant_line_number_to_insert_imports_after": 1,
+            "testing_framework": "unittest",
+        }
+
+    def test_ambiguous_layouts_are_left_to_the_llm(self):
+        mixed_styles = "import pytest\n\ndef test_a():\n    pass\n\nclass TestB:\n    def test_b(self):\n        pass\n"
+        custom_base_class = "from base import BaseTest\n\nclass TestB(BaseTest):\n    def test_b(self):\n        pass\n"
+        no_imports = "def test_a():\n    pass\n"
+        assert PythonSuiteAnalyzer(mixed_styles).analyze() is None
+        assert PythonSuiteAnalyzer(custom_base_class).analyze() is None
+        assert PythonSuiteAnalyzer(no_imports).analyze() is None
+        assert PythonSuiteAnalyzer("def test_a(:\n").analyze() is None
@@ -1,5 +1,6 @@
 import pytest
 import os
+import sqlite3
 from datetime import datetime, timedelta
 from cover_agent.UnitTestDB import dump_to_report_cli
 from cover_agent.UnitTestDB import dump_to_report
@@ -60,6 +61,33 @@ class TestUnitTestDB:
         assert attempt.original_test_file == "sample test code"
         assert attempt.processed_test_file == "sample new test code"
 
+    def test_insert_and_get_test_suite_analysis(self, unit_test_db):
+        analysis = {
+            "test_headers_indentation": 4,
+            "relevant_line_number_to_insert_tests_after": 42,
+            "relevant_line_number_to_insert_imports_after": 3,
+            "testing_framework": "unittest",
+        }
+
+        unit_test_db.insert_test_suite_analysis("abc123", "gpt-4o", analysis)
+
+        assert unit_test_db.get_test_suite_analysis("abc123", "gpt-4o") == analysis
+        assert unit_test_db.get_test_suite_analysis("abc123", "other-model") is None
+        assert unit_test_db.get_test_suite_analysis("def456", "gpt-4o") is None
+
+    def test_save_get_and_delete_checkpoint(self, unit_test_db):
+        unit_test_db.save_checkpoint("run", 1, {"current_coverage": 0.5}, "test content v1")
+        unit_test_db.save_checkpoint("run", 2, {"current_coverage": 0.7}, "test content v2")
+
+        assert unit_test_db.get_checkpoint("run") == {
+            "iteration_count": 2,
+            "state": {"current_coverage": 0.7},
+            "test_file_content": "test content v2",
+        }
+
+        unit_test_db.delete_checkpoint("run")
+        assert unit_test_db.get_checkpoint("run") is None
+
     def test_dump_to_report(self, unit_test_db, tmp_path):
         test_result = {
             "status": "success",
@@ -111,3 +139,35 @@ class TestUnitTestDB:
         report_filepath = tmp_path / "default_report.html"
         dump_to_report(report_filepath=str(report_filepath))
         assert os.path.exists(report_filepath)
+
+    def test_insert_attempt_with_run_stats(self, unit_test_db):
+        attempt_id = unit_test_db.insert_attempt(
+            {"status": "PASS", "test": {}, "run_stats": {"cpu_time_seconds": 1.5, "peak_memory_mb": 42.0}}
+        )
+        with unit_test_db.Session() as session:
+            attempt = session.query(UnitTestGenerationAttempt).filter_by(id=attempt_id).one()
+        assert attempt.cpu_time_seconds == 1.5
+        assert attempt.peak_memory_mb == 42.0
+
+    def test_add_missing_columns_to_existing_database(self, tmp_path):
+        db_path = tmp_path / "old.db"
+        connection = sqlite3.connect(db_path)
+        connection.execute(
+            "CREATE TABLE unit_test_generation_attempts (id INTEGER PRIMARY KEY, status VARCHAR, reason TEXT)"
+        )
+        connection.commit()
+        connection.close()
+
+        db = UnitTestDB(f"sqlite:///{db_path}")
+        attempt_id = db.insert_attempt({"status": "PASS", "test": {}, "run_stats": {"cpu_time_seconds": 0.5}})
+        with db.Session() as session:
+            assert session.query(UnitTestGenerationAttempt).filter_by(id=attempt_id).one().cpu_time_seconds == 0.5
+        db.engine.dispose()
+
+    def test_command_durations_history(self, unit_test_db):
+        for duration in [1.0, 2.0, 3.0, 4.0]:
+            unit_test_db.insert_command_duration("/project", "pytest", duration, history_size=3)
+        unit_test_db.insert_command_duration("/other", "pytest", 10.0)
+        assert unit_test_db.get_command_durations("/project", "pytest") == [4.0, 3.0, 2.0]
+        assert unit_test_db.get_command_durations("/project", "pytest", limit=1) == [4.0]
+        assert unit_test_db.get_command_durations("/project", "npm test") == []
@@ -7,6 +7,7 @@ import datetime
 import os
 import pytest
 import tempfile
+import threading
 
 from unittest.mock import MagicMock
 class TestUnitTestGenerator:
@@ -64,6 +65,23 @@ class TestUnitTestGenerator:
             prompt = generator.build_prompt(failed_test_runs, language, test_framework, code_coverage_report)
             assert "Failed Test:" in prompt['user']
 
+    def test_build_prompt_for_the_routed_model(self):
+        with tempfile.NamedTemporaryFile(suffix=".py", delete=False) as temp_source_file:
+            generator = UnitTestGenerator(
+                source_file_path=temp_source_file.name,
+                test_file_path="test_test.py",
+                code_coverage_report_path="coverage.xml",
+                test_command="pytest",
+                llm_model="gpt-3"
+            )
+            routing = {"model": "small-model"}
+            with patch("cover_agent.AICaller.AICaller._route", return_value=routing), \
+                    patch("cover_agent.UnitTestGenerator.PromptBuilder") as mock_prompt_builder:
+                generator.build_prompt([], "python", "pytest", "")
+
+            # The prompt is fitted to the budget of the model it is sent to
+            assert mock_prompt_builder.call_args.kwargs["model"] == "small-model"
+
 
     def test_generate_tests_invalid_yaml(self):
         with tempfile.NamedTemporaryFile(suffix=".py", delete=False) as temp_source_file:
@@ -85,4 +103,146 @@ class TestUnitTestGenerator:
                 # While this is not a valid YAML, the function will return the original string (for better or for worse).
                 assert result =="This is not YAML"
 
-                
\ No newline at end of file
+                
+    def test_generate_tests_structured_output(self):
+        with tempfile.NamedTemporaryFile(suffix=".py", delete=False) as temp_source_file:
+            generator = UnitTestGenerator(
+                source_file_path=temp_source_file.name,
+                test_file_path="test_test.py",
+                code_coverage_report_path="coverage.xml",
+                test_command="pytest",
+                llm_model="gpt-4o",
+                structured_output=True,
+            )
+            generator.build_prompt = lambda x, y, z, w: "Test prompt"
+            response = '{"language": "python", "existing_test_function_signature": "def test_a():", "new_tests": [{"test_behavior": "b", "test_name": "test_b", "test_code": "def test_b():\\n    assert True", "new_imports_code": "", "test_tags": "other"}]}'
+            with patch.object(generator.ai_caller, 'call_model', return_value=(response, 10, 10)) as mock_call_model:
+                result = generator.generate_tests([], "python", "pytest", "")
+
+            assert mock_call_model.call_args.kwargs["response_format"]["json_schema"]["name"] == "NewTests"
+            assert result["new_tests"][0]["test_code"] == "def test_b():\n    assert True"
+
+            # A response that is not structured is parsed as YAML
+            with patch.object(generator.ai_caller, 'call_model', return_value=("language: python\nnew_tests: []\n", 10, 10)):
+                assert generator.generate_tests([], "python", "pytest", "") == {"language": "python", "new_tests": []}
+
+    def test_generate_tests_streaming_yields_tests_before_the_response_ends(self):
+        with tempfile.NamedTemporaryFile(suffix=".py", delete=False) as temp_source_file:
+            generator = UnitTestGenerator(
+                source_file_path=temp_source_file.name,
+                test_file_path="test_test.py",
+                code_coverage_report_path="coverage.xml",
+                test_command="pytest",
+                llm_model="gpt-3"
+            )
+        generator.build_prompt = lambda x, y, z, w: {"system": "", "user": "Test prompt"}
+        first_test = "new_tests:\n- test_name: test_a\n  test_code: assert a()\n"
+        second_test = "- test_name: test_b\n  test_code: assert b()\n"
+        first_test_yielded = threading.Event()
+
+        def call_model(prompt, stream_sink, response_format=None):
+            stream_sink.start()
+            stream_sink.write(first_test)
+            stream_sink.write(second_test[:5])
+            # The rest of the response is only generated once the first test was received
+            assert first_test_yielded.wait(timeout=5)
+            stream_sink.write(second_test[5:])
+            stream_sink.end()
+            return first_test + second_test, 10, 20
+
+        with patch.object(generator.ai_caller, "call_model", side_effect=call_model):
+            tests = generator.generate_tests_streaming([], "python", "pytest", "")
+            assert next(tests) == {"test_name": "test_a", "test_code": "assert a()"}
+            first_test_yielded.set()
+            assert list(tests) == [{"test_name": "test_b", "test_code": "assert b()"}]
+
+        assert generator.total_input_token_count == 10
+        assert generator.total_output_token_count == 20
+
+    def test_generate_tests_streaming_structured_output(self):
+        with tempfile.NamedTemporaryFile(suffix=".py", delete=False) as temp_source_file:
+            generator = UnitTestGenerator(
+                source_file_path=temp_source_file.name,
+                test_file_path="test_test.py",
+                code_coverage_report_path="coverage.xml",
+                test_command="pytest",
+                llm_model="gpt-4o",
+                structured_output=True,
+            )
+        generator.build_prompt = lambda x, y, z, w: {"system": "", "user": "Test prompt"}
+        first_test = '{"language": "python", "new_tests": [{"test_name": "test_a", "test_code": "assert a()"}'
+        second_test = ', {"test_name": "test_b", "test_code": "assert b()"}]}'
+        first_test_yielded = threading.Event()
+
+        def call_model(prompt, stream_sink, response_format=None):
+            stream_sink.start()
+            stream_sink.write(first_test)
+            # The rest of the response is only generated once the first test was received
+            assert first_test_yielded.wait(timeout=5)
+            stream_sink.write(second_test)
+            stream_sink.end()
+            return first_test + second_test, 10, 20
+
+        with patch.object(generator.ai_caller, "call_model", side_effect=call_model):
+            tests = generator.generate_tests_streaming([], "python", "pytest", "")
+            assert next(tests) == {"test_name": "test_a", "test_code": "assert a()"}
+            first_test_yielded.set()
+            assert list(tests) == [{"test_name": "test_b", "test_code": "assert b()"}]
+
+    def test_generate_tests_streaming_retry_yields_the_new_tests(self):
+        with tempfile.NamedTemporaryFile(suffix=".py", delete=False) as temp_source_file:
+            generator = UnitTestGenerator(
+                source_file_path=temp_source_file.name,
+                test_file_path="test_test.py",
+                code_coverage_report_path="coverage.xml",
+                test_command="pytest",
+                llm_model="gpt-3"
+            )
+        generator.build_prompt = lambda x, y, z, w: {"system": "", "user": "Test prompt"}
+        first_attempt = "new_tests:\n- test_name: test_a\n  test_code: assert a()\n- test_name: test_b\n"
+        # The retried call generates other tests, and the first test again under another name
+        second_attempt = (
+            "new_tests:\n- test_name: test_c\n  test_code: assert c()\n"
+            "- test_name: test_a_again\n  test_code: assert  a()\n"
+            "- test_name: test_d\n  test_code: assert d()\n"
+        )
+
+        def call_model(prompt, stream_sink, response_format=None):
+            stream_sink.start()
+            stream_sink.write(first_attempt)
+            # The first attempt fails, and is retried
+            stream_sink.start()
+            stream_sink.write(second_attempt)
+            stream_sink.end()
+            return second_attempt, 10, 20
+
+        with patch.object(generator.ai_caller, "call_model", side_effect=call_model):
+            tests = list(generator.generate_tests_streaming([], "python", "pytest", ""))
+
+        assert [test["test_name"] for test in tests] == ["test_a", "test_c", "test_d"]
+
+    def test_generate_tests_streaming_keeps_tests_that_differ_after_a_hash(self):
+        with tempfile.NamedTemporaryFile(suffix=".py", delete=False) as temp_source_file:
+            generator = UnitTestGenerator(
+                source_file_path=temp_source_file.name,
+                test_file_path="test_test.py",
+                code_coverage_report_path="coverage.xml",
+                test_command="pytest",
+                llm_model="gpt-3"
+            )
+        generator.build_prompt = lambda x, y, z, w: {"system": "", "user": "Test prompt"}
+        response = (
+            "new_tests:\n- test_name: test_x1\n  test_code: assert parse(\"x#1\") == 1\n"
+            "- test_name: test_x2\n  test_code: assert parse(\"x#2\") == 2\n"
+        )
+
+        def call_model(prompt, stream_sink, response_format=None):
+            stream_sink.start()
+            stream_sink.write(response)
+            stream_sink.end()
+            return response, 10, 20
+
+        with patch.object(generator.ai_caller, "call_model", side_effect=call_model):
+            tests = list(generator.generate_tests_streaming([], "python", "pytest", ""))
+
+        assert [test["test_name"] for test in tests] == ["test_x1", "test_x2"]
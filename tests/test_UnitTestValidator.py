@@ -7,6 +7,7 @@ from unittest.mock import MagicMock
 
 import datetime
 import os
+import re
 import pytest
 import tempfile
 
@@ -139,6 +140,33 @@ class TestUnitValidator:
                 assert generator.relevant_line_number_to_insert_imports_after == 10
                 assert generator.testing_framework == "pytest"
 
+    def test_initial_test_suite_analysis_reuses_stored_analysis(self, tmp_path):
+        test_file = tmp_path / "test_app.js"
+        test_file.write_text("const app = require('./app');\ntest('works', () => {});\n")
+        (tmp_path / "app.js").write_text("module.exports = {};\n")
+        generator = UnitTestValidator(
+            source_file_path=str(tmp_path / "app.js"),
+            test_file_path=str(test_file),
+            code_coverage_report_path="coverage.xml",
+            test_command="npm test",
+            llm_model="gpt-3"
+        )
+        test_db = MagicMock()
+        test_db.get_test_suite_analysis.return_value = {
+            "test_headers_indentation": 0,
+            "relevant_line_number_to_insert_tests_after": 2,
+            "relevant_line_number_to_insert_imports_after": 1,
+            "testing_framework": "jest",
+        }
+
+        with patch.object(generator.ai_caller, 'call_model') as mock_call:
+            generator.initial_test_suite_analysis(test_db=test_db)
+
+        mock_call.assert_not_called()
+        test_db.insert_test_suite_analysis.assert_not_called()
+        assert generator.relevant_line_number_to_insert_tests_after == 2
+        assert generator.testing_framework == "jest"
+
     
     def test_post_process_coverage_report_with_report_coverage_flag(self):
         with tempfile.NamedTemporaryFile(suffix=".py", delete=False) as temp_source_file:
@@ -195,4 +223,309 @@ class TestUnitValidator:
             )
             with patch.object(Runner, 'run_command', return_value=("", "", 0, datetime.datetime.now())):
                 generator.generate_diff_coverage_report()
-                assert generator.diff_cover_report_path.endswith("diff-cover-report.json")
\ No newline at end of file
+                assert generator.diff_cover_report_path.endswith("diff-cover-report.json")
+
+    def test_validate_tests_in_sandboxes(self, tmp_path):
+        source_file = tmp_path / "app.py"
+        source_file.write_text("def foo():\n    return 1\n")
+        test_file = tmp_path / "test_app.py"
+        test_file.write_text("import app\n\ndef test_foo():\n    assert app.foo() == 1\n")
+        generator = UnitTestValidator(
+            source_file_path=str(source_file),
+            test_file_path=str(test_file),
+            code_coverage_report_path=str(tmp_path / "coverage.xml"),
+            test_command="pytest",
+            test_command_dir=str(tmp_path),
+            project_root=str(tmp_path),
+            llm_model="gpt-3"
+        )
+        generator.current_coverage = 0.5
+        generator.last_coverage_percentages = {"app.py": 0.5}
+        generator.test_headers_indentation = 0
+        generator.relevant_line_number_to_insert_tests_after = 4
+        generator.relevant_line_number_to_insert_imports_after = 1
+
+        def run_command(command, cwd=None, timeout=None):
+            # Fail whenever the test file in the working directory contains the bad test
+            with open(os.path.join(cwd, "test_app.py")) as f:
+                exit_code = 1 if "test_bad" in f.read() else 0
+            return "", "", exit_code, 0
+
+        tests_to_validate = [
+            {"test_code": "def test_bad():\n    assert False", "new_imports_code": ""},
+            {"test_code": "def test_good():\n    assert True", "new_imports_code": ""},
+        ]
+        with patch.object(Runner, "run_command", side_effect=run_command) as mock_run, \
+                patch.object(CoverageProcessor, "process_coverage_report", return_value=([], [], 0.6)), \
+                patch.object(generator, "extract_error_messages", return_value=["error"]):
+            results = generator.validate_tests_in_sandboxes(tests_to_validate, num_workers=2)
+
+        assert [result["status"] for result in results] == ["FAIL", "PASS"]
+        assert results[0]["reason"] == "Test failed"
+        assert generator.failed_test_runs == [{"code": tests_to_validate[0], "error_message": "error"}]
+        assert "def test_good()" in test_file.read_text()
+        assert "def test_bad()" not in test_file.read_text()
+        # The sandbox run of the only accepted test is reused, without running the test suite again
+        assert mock_run.call_count == 2
+        assert generator.current_coverage == 0.6
+        assert generator.last_coverage_percentages == {}
+        # The sandboxes are kept for the next iterations
+        sandbox_pool = generator.sandbox_pool
+        assert len(sandbox_pool.sandboxes) == 2
+        generator.cleanup_sandboxes()
+        assert sandbox_pool.sandboxes == [] and generator.sandbox_pool is None
+
+    def test_validate_tests_in_sandboxes_confirms_accepted_tests_together(self, tmp_path):
+        source_file = tmp_path / "app.py"
+        source_file.write_text("def foo(x):\n    if x:\n        return 1\n    return 2\n")
+        test_file = tmp_path / "test_app.py"
+        test_file.write_text("import app\n\ndef test_foo():\n    assert app.foo(1) == 1\n")
+        generator = UnitTestValidator(
+            source_file_path=str(source_file),
+            test_file_path=str(test_file),
+            code_coverage_report_path=str(tmp_path / "coverage.xml"),
+            test_command="pytest",
+            test_command_dir=str(tmp_path),
+            project_root=str(tmp_path),
+            llm_model="gpt-3"
+        )
+        generator.current_coverage = 0.6
+        generator.test_headers_indentation = 0
+        generator.relevant_line_number_to_insert_tests_after = 4
+        generator.relevant_line_number_to_insert_imports_after = 1
+        lines_by_test = {"test_foo": {1, 2, 3}, "test_false": {4}, "test_none": {4}, "test_other": {5}}
+
+        def process_coverage_report(self, time_of_test_command):
+            # The lines covered by the tests of the test file next to the source file (in the project, or in a sandbox)
+            with open(os.path.join(os.path.dirname(self.src_file_path), "test_app.py")) as f:
+                content = f.read()
+            lines = sorted(set().union(*(lines for name, lines in lines_by_test.items() if f"def {name}(" in content)))
+            return lines, [], len(lines) / 5
+
+        tests_to_validate = [
+            {"test_code": "def test_false():\n    assert app.foo(False) == 2", "new_imports_code": ""},
+            {"test_code": "def test_none():\n    assert app.foo(None) == 2", "new_imports_code": ""},
+            {"test_code": "def test_other():\n    assert True", "new_imports_code": ""},
+        ]
+        with patch.object(Runner, "run_command", return_value=("", "", 0, 0)) as mock_run, \
+                patch.object(CoverageProcessor, "process_coverage_report", autospec=True, side_effect=process_coverage_report):
+            results = generator.validate_tests_in_sandboxes(tests_to_validate, num_workers=3)
+        generator.cleanup_sandboxes()
+
+        # test_none covers no line that test_false does not
+        assert [result["status"] for result in results] == ["PASS", "FAIL", "PASS"]
+        assert generator.failed_test_runs == [{"code": tests_to_validate[1], "error_message": "Test did not increase code coverage"}]
+        # One run per sandbox, and a single confirming run of the accepted tests
+        assert mock_run.call_count == 4
+        assert generator.current_coverage == 1.0
+        assert "def test_false()" in test_file.read_text()
+        assert "def test_other()" in test_file.read_text()
+        assert "def test_none()" not in test_file.read_text()
+
+    def test_extract_error_messages_batch(self):
+        with tempfile.NamedTemporaryFile(suffix=".py", delete=False) as temp_source_file:
+            generator = UnitTestValidator(
+                source_file_path=temp_source_file.name,
+                test_file_path="test_test.py",
+                code_coverage_report_path="coverage.xml",
+                test_command="pytest",
+                llm_model="gpt-3"
+            )
+            generator.prompt_builder = MagicMock()
+            generator.prompt_builder.build_prompt_custom.return_value = {"system": "", "user": "test prompt"}
+            fail_details = {"stderr": "stderr content", "stdout": "stdout content", "processed_test_file": ""}
+
+            with patch.object(
+                generator.ai_caller, "call_model_batch", return_value=[(" first error ", 10, 5), Exception("Mock exception")]
+            ) as mock_batch:
+                error_messages = generator.extract_error_messages([fail_details, fail_details])
+
+            assert error_messages == ["first error", ""]
+            assert len(mock_batch.call_args.args[0]) == 2
+            assert generator.total_input_token_count == 10
+            assert generator.total_output_token_count == 5
+
+    def test_validate_test_per_test_coverage(self, tmp_path):
+        source_file = tmp_path / "app.py"
+        source_file.write_text("def foo():\n    return 1\n\ndef bar():\n    return 2\n")
+        test_file = tmp_path / "test_app.py"
+        test_file.write_text("import app\n\ndef test_foo():\n    assert app.foo() == 1\n")
+        generator = UnitTestValidator(
+            source_file_path=str(source_file),
+            test_file_path=str(test_file),
+            code_coverage_report_path=str(tmp_path / "coverage.xml"),
+            test_command="python -m pytest --cov=. --cov-report=xml",
+            test_command_dir=str(tmp_path),
+            llm_model="gpt-3",
+            per_test_coverage=True,
+        )
+        generator.test_headers_indentation = 0
+        generator.relevant_line_number_to_insert_tests_after = 4
+        generator.relevant_line_number_to_insert_imports_after = 1
+        generator.coverage_processor.set_coverage_baseline([1, 2, 4], [5])
+        generator.current_coverage = 0.75
+
+        redundant_test = {"test_code": "def test_foo_again():\n    assert app.foo() == 1", "new_imports_code": ""}
+        useful_test = {"test_code": "def test_bar():\n    assert app.bar() == 2", "new_imports_code": ""}
+        with patch.object(Runner, 'run_command', return_value=("", "", 0, datetime.datetime.now())) as mock_run, \
+                patch.object(CoverageProcessor, 'process_coverage_report', side_effect=[([1, 2, 4], [5], 0.75), ([1, 4, 5], [2], 0.75)]):
+            redundant_result = generator.validate_test(redundant_test)
+            useful_result = generator.validate_test(useful_test)
+
+        assert mock_run.call_args_list[0].kwargs["command"] == "python -m pytest -k test_foo_again --cov=. --cov-report=xml"
+        # The accepted test is run with the whole test suite once
+        assert [call.kwargs["command"] for call in mock_run.call_args_list[1:]] == [
+            "python -m pytest -k test_bar --cov=. --cov-report=xml",
+            "python -m pytest --cov=. --cov-report=xml",
+        ]
+        assert redundant_result["status"] == "FAIL"
+        assert useful_result["status"] == "PASS"
+        assert generator.current_coverage == 1.0
+        assert "Lines missed: []" in generator.code_coverage_report
+
+    def test_validate_test_per_test_coverage_checks_the_test_suite(self, tmp_path):
+        source_file = tmp_path / "app.py"
+        source_file.write_text("def foo():\n    return 1\n\ndef bar():\n    return 2\n")
+        test_file = tmp_path / "test_app.py"
+        original_content = "import app\n\ndef test_foo():\n    assert app.foo() == 1\n"
+        test_file.write_text(original_content)
+        generator = UnitTestValidator(
+            source_file_path=str(source_file),
+            test_file_path=str(test_file),
+            code_coverage_report_path=str(tmp_path / "coverage.xml"),
+            test_command="python -m pytest --cov=. --cov-report=xml",
+            test_command_dir=str(tmp_path),
+            llm_model="gpt-3",
+            per_test_coverage=True,
+        )
+        generator.test_headers_indentation = 0
+        generator.relevant_line_number_to_insert_tests_after = 4
+        generator.relevant_line_number_to_insert_imports_after = 1
+        generator.coverage_processor.set_coverage_baseline([1, 2, 4], [5])
+        generator.current_coverage = 0.75
+
+        # A test that redefines an existing test is validated with the whole test suite
+        shadowing_test = {"test_code": "def test_foo():\n    assert app.bar() == 2", "new_imports_code": ""}
+        assert generator._get_single_test_command(shadowing_test, original_content) is None
+
+        # A test that passes on its own but breaks the test suite is rolled back
+        breaking_test = {"test_code": "def test_bar():\n    app.foo = None", "new_imports_code": ""}
+        with patch.object(Runner, 'run_command', side_effect=[("", "", 0, datetime.datetime.now()), ("", "failed", 1, datetime.datetime.now())]), \
+                patch.object(CoverageProcessor, 'process_coverage_report', return_value=([1, 4, 5], [2], 0.75)), \
+                patch.object(generator, 'extract_error_message', return_value="error"):
+            result = generator.validate_test(breaking_test)
+
+        assert result["status"] == "FAIL"
+        assert result["reason"] == "Test failed"
+        assert test_file.read_text() == original_content
+        assert generator.current_coverage == 0.75
+        assert generator.coverage_processor.baseline_coverage() == ([1, 2, 4], [5], 0.75)
+
+    def test_validate_tests_in_batch_matches_serial_validation(self, tmp_path):
+        source_file = tmp_path / "app.py"
+        source_file.write_text("def foo():\n    return 1\n")
+        test_file = tmp_path / "test_app.py"
+        original_content = "import app\n\ndef test_foo():\n    assert app.foo() == 1\n"
+        lines_by_test = {"test_foo": {1}, "test_a": {2}, "test_b": {2}, "test_c": {3}}
+
+        def run_command(command, cwd=None, timeout=None):
+            # A fake test suite: test_bad* tests fail, test_broken breaks the collection of the whole file
+            names = re.findall(r"def (test\w+)", test_file.read_text())
+            junit_match = re.search(r"--junitxml=(\S+)", command)
+            if "test_broken" in names:
+                return "", "collection error", 2, 0
+            if junit_match:
+                testcases = "".join(
+                    f'<testcase name="{name}">{"<failure/>" if name.startswith("test_bad") else ""}</testcase>'
+                    for name in names
+                )
+                with open(junit_match.group(1), "w") as f:
+                    f.write(f"<testsuites><testsuite>{testcases}</testsuite></testsuites>")
+            covered_lines = set().union(*(lines_by_test.get(name, set()) for name in names))
+            state["percentage_covered"] = len(covered_lines) / 4
+            return "", "", 1 if any(name.startswith("test_bad") for name in names) else 0, 0
+
+        def make_validator():
+            test_file.write_text(original_content)
+            validator = UnitTestValidator(
+                source_file_path=str(source_file),
+                test_file_path=str(test_file),
+                code_coverage_report_path=str(tmp_path / "coverage.xml"),
+                test_command="pytest --cov=. --cov-report=xml",
+                test_command_dir=str(tmp_path),
+                llm_model="gpt-3",
+            )
+            validator.current_coverage = 0.25
+            validator.last_coverage_percentages = {}
+            validator.test_headers_indentation = 0
+            validator.relevant_line_number_to_insert_tests_after = 4
+            validator.relevant_line_number_to_insert_imports_after = 1
+            validator.extract_error_message = MagicMock(return_value="error")
+            validator.extract_error_messages = MagicMock(side_effect=lambda failed: ["error"] * len(failed))
+            return validator
+
+        tests_to_validate = [
+            {"test_code": "def test_a():\n    assert True", "new_imports_code": "import os"},
+            {"test_code": "def test_bad():\n    assert False", "new_imports_code": ""},
+            {"test_code": "def test_b():\n    assert True", "new_imports_code": ""},
+            {"test_code": "def test_broken(:\n    pass", "new_imports_code": ""},
+            {"test_code": "def test_c():\n    assert True", "new_imports_code": "import sys"},
+            {"test_code": "def test_d():\n    assert True", "new_imports_code": ""},
+        ]
+        state = {}
+        with patch.object(Runner, "run_command", side_effect=run_command), \
+                patch.object(CoverageProcessor, "process_coverage_report",
+                             side_effect=lambda time_of_test_command: ([], [], state["percentage_covered"])):
+            serial_validator = make_validator()
+            serial_results = [serial_validator.validate_test(test) for test in tests_to_validate]
+            serial_content = test_file.read_text()
+
+            batch_validator = make_validator()
+            batch_results = batch_validator.validate_tests_in_batch(tests_to_validate)
+            batch_content = test_file.read_text()
+
+        assert [result["status"] for result in batch_results] == ["PASS", "FAIL", "FAIL", "FAIL", "PASS", "FAIL"]
+        for serial_result, batch_result in zip(serial_results, batch_results):
+            for key in ("status", "reason", "original_test_file", "processed_test_file"):
+                assert batch_result[key] == serial_result[key]
+        assert batch_content == serial_content
+        assert batch_validator.current_coverage == serial_validator.current_coverage == 0.75
+        assert batch_validator.relevant_line_number_to_insert_tests_after == serial_validator.relevant_line_number_to_insert_tests_after
+        assert batch_validator.failed_test_runs == serial_validator.failed_test_runs
+
+    def test_read_failed_tests_from_junit_report(self, tmp_path):
+        junit_path = tmp_path / "junit.xml"
+        junit_path.write_text(
+            '<testsuites><testsuite>'
+            '<testcase classname="test_app" name="test_ok"/>'
+            '<testcase classname="test_app" name="test_fail"><failure message="assert False"/></testcase>'
+            '<testcase classname="test_app" name="test_param[1]"><error message="fixture"/></testcase>'
+            '</testsuite></testsuites>'
+        )
+        assert UnitTestValidator._read_failed_tests(str(junit_path)) == {"test_fail", "test_param"}
+        assert UnitTestValidator._read_failed_tests(str(tmp_path / "missing.xml")) == set()
+
+    def test_run_coverage_adapts_test_timeout(self, tmp_path):
+        source_file = tmp_path / "app.py"
+        source_file.write_text("def foo():\n    return 1\n")
+        test_db = MagicMock()
+        test_db.get_command_durations.return_value = [2.0]
+        validator = UnitTestValidator(
+            source_file_path=str(source_file),
+            test_file_path=str(tmp_path / "test_app.py"),
+            code_coverage_report_path=str(tmp_path / "coverage.xml"),
+            test_command="pytest",
+            test_command_dir=str(tmp_path),
+            llm_model="gpt-3",
+            test_db=test_db,
+        )
+        with patch.object(Runner, "run_command", return_value=("", "", 0, 0)) as mock_run, \
+                patch.object(Runner, "get_last_run_stats", return_value={"wall_time_seconds": 4.0}), \
+                patch.object(validator, "post_process_coverage_report", return_value=(0.5, {})):
+            validator.run_coverage()
+
+        # The baseline run is bounded by the durations of previous runs, the next runs by its own duration too
+        assert mock_run.call_args.kwargs["timeout"] == 2.0 * 3 + 5
+        test_db.insert_command_duration.assert_called_once_with(str(tmp_path), "pytest", 4.0, 10)
+        assert validator.baseline_durations == [4.0, 2.0]
+        assert validator._get_test_timeout() == 4.0 * 3 + 5